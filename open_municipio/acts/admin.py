@@ -4,6 +4,7 @@ from django.db import models
 from django.contrib.admin.widgets import FilteredSelectMultiple
 
 from open_municipio.acts.models import *
+from open_municipio.people.statistics import UpdateStatisticsMixin
 
 
 def transition_form_factory(act):
@@ -63,7 +64,7 @@ class TransitionInline(admin.TabularInline):
         return super(TransitionInline, self).get_formset(request, obj, **kwargs)
 
 
-class ActAdmin(admin.ModelAdmin):
+class ActAdmin(UpdateStatisticsMixin, admin.ModelAdmin):
     search_fields = ('idnum', 'title',)
 
     # genial hack to allow users with no permissions to show
@@ -1,15 +1,16 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import logging
+import os
 from datetime import date
 from django.core.exceptions import ObjectDoesNotExist
 from south.modelsinspector import add_ignored_fields
-from django.conf import settings
-from django.contrib.sites.models import Site
 from django.db import models
-from django.template.context import Context
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.contenttypes import generic
 from django.contrib.contenttypes.models import ContentType
+from django.core.files import File
+from django.core.files.storage import default_storage
 
 from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
@@ -20,6 +21,7 @@ from model_utils.models import TimeStampedModel
 from model_utils.fields import StatusField
 
 from open_municipio.newscache.models import News, NewsTargetMixin
+from open_municipio.newscache.deferred import generate_news, discard_news
 
 from open_municipio.people.models import Institution, InstitutionCharge, Person
 from open_municipio.taxonomy.managers import TopicableManager
@@ -601,6 +603,19 @@ class Transition(models.Model):
 # Documents
 #
 
+def compute_content_hash(f, chunk_size=File.DEFAULT_CHUNK_SIZE):
+    """
+    Returns the SHA1 hex digest of a file's content, read in chunks;
+    the file is rewinded, before and after reading.
+    """
+    sha1 = hashlib.sha1()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(chunk_size), ''):
+        sha1.update(chunk)
+    f.seek(0)
+    return sha1.hexdigest()
+
+
 class Document(TimeStampedModel):
     """
     An abstract base class for all complex documents. 
@@ -622,10 +637,49 @@ class Document(TimeStampedModel):
     text_url = models.URLField(blank=True)
     file_url = models.URLField(blank=True)
     file = models.FileField(upload_to="attached_documents/%Y%m%d", blank=True, max_length=255)
-    
+    # SHA1 of the file's content, for files stored through ``store_file``
+    content_hash = models.CharField(max_length=40, blank=True, db_index=True, editable=False)
+
+    # where content-addressed files are stored
+    BLOBS_DIR = "attached_documents/blobs"
+
     class Meta:
         abstract = True
 
+    def store_file(self, f, content_hash=None, extension=''):
+        """
+        Stores the content of the file ``f`` (a python or Django file object)
+        at a path derived from its hash, so that identical files
+        are stored only once, and shared among documents.
+
+        The content is copied in chunks, only if no file with the same hash
+        has been stored before. The document itself is not saved.
+
+        Returns False if the document already pointed to the same content, True otherwise.
+
+        Files stored before content addressing belong to a single document, and are
+        removed when superseded; blobs may be shared, and are left in place.
+        """
+        if content_hash is None:
+            content_hash = compute_content_hash(f)
+        if content_hash == self.content_hash and self.file:
+            return False
+        old_name = self.file.name if self.file else None
+
+        blob_name = os.path.join(self.BLOBS_DIR, content_hash[0:2], content_hash[2:4],
+                                 content_hash + extension.lower())
+        if not default_storage.exists(blob_name):
+            f.seek(0)
+            blob_name = default_storage.save(blob_name, File(f))
+
+        self.file.name = blob_name
+        self.content_hash = content_hash
+        self.document_size = default_storage.size(blob_name)
+
+        if old_name and old_name != blob_name and not old_name.startswith(self.BLOBS_DIR + '/'):
+            default_storage.delete(old_name)
+        return True
+
 
 class Attach(Document):
     """
@@ -731,8 +785,7 @@ def new_signature(**kwargs):
         act = signature.act.downcast()
         signer = signature.charge
         # define context for textual representation of the news
-        ctx = Context({ 'current_site': Site.objects.get(id=settings.SITE_ID),
-                        'signature': signature, 'act': act, 'signer': signer })
+        ctx = { 'signature': signature, 'act': act, 'signer': signer }
 
         # force convertion into strings of two date
         try:
@@ -747,31 +800,20 @@ def new_signature(**kwargs):
 
         # generate new signature after presentation, for the act
         if signature.support_date > act.presentation_date:
-            created = False
-            news, created = News.objects.get_or_create(
-                generating_object_pk=signature.pk,
-                generating_content_type=ContentType.objects.get_for_model(signature),
-                related_object_pk=act.pk,
-                related_content_type=ContentType.objects.get_for_model(act),
-                priority=3,
-                text=News.get_text_for_news(ctx, 'newscache/act_signed_after_presentation.html')
-            )
-            if created:
+            news, created = generate_news(signature, act, 3,
+                                          'newscache/act_signed_after_presentation.html', ctx)
+            if news is None:
+                logger.debug("  act was signed after presentation news queued")
+            elif created:
                 logger.debug("  act was signed after presentation news created")
             else:
                 logger.debug("  act was signed after presentation news found")
 
         # generate signature news, for the politician
-        created = False
-        news, created = News.objects.get_or_create(
-            generating_object_pk=signature.pk,
-            generating_content_type=ContentType.objects.get_for_model(signature),
-            related_object_pk=signer.pk,
-            related_content_type=ContentType.objects.get_for_model(signer),
-            priority=2,
-            text=News.get_text_for_news(ctx, 'newscache/person_signed.html')
-        )
-        if created:
+        news, created = generate_news(signature, signer, 2, 'newscache/person_signed.html', ctx)
+        if news is None:
+            logger.debug("  user signed act news queued")
+        elif created:
             logger.debug("  user signed act news created")
         else:
             logger.debug("  user signed act news found")
@@ -784,6 +826,7 @@ def delete_signature(**kwargs):
     """
     if not kwargs.get('raw', False):
         signature = kwargs['instance']
+        discard_news(signature)
         news = News.objects.filter(
             generating_object_pk=signature.pk,
             generating_content_type=ContentType.objects.get_for_model(signature),
@@ -811,37 +854,24 @@ def new_transition(**kwargs):
                 act.act_ptr.save()
 
         # generate news
-        ctx = Context({ 'current_site': Site.objects.get(id=settings.SITE_ID),
-                        'transition': transition, 'act': act })
+        ctx = { 'transition': transition, 'act': act }
 
         # handle presentation and other transitions differently,
         # to shorten acts' presentations, with signatures
         if transition.final_status == 'PRESENTED':
-            created = False
-            news, created = News.objects.get_or_create(
-                generating_object_pk=transition.pk,
-                generating_content_type=ContentType.objects.get_for_model(transition),
-                related_object_pk=act.pk,
-                related_content_type=ContentType.objects.get_for_model(act),
-                priority=1,
-                text=News.get_text_for_news(ctx, 'newscache/act_presented.html')
-            )
-            if created:
+            news, created = generate_news(transition, act, 1, 'newscache/act_presented.html', ctx)
+            if news is None:
+                logger.debug("  act presentation news queued")
+            elif created:
                 logger.debug("  act presentation news created")
             else:
                 logger.debug("  act presentation news found")
 
         else:
-            created = False
-            news, created = News.objects.get_or_create(
-                generating_object_pk=transition.pk,
-                generating_content_type=ContentType.objects.get_for_model(transition),
-                related_object_pk=act.pk,
-                related_content_type=ContentType.objects.get_for_model(act),
-                priority=1,
-                text=News.get_text_for_news(ctx, 'newscache/act_changed_status.html')
-            )
-            if created:
+            news, created = generate_news(transition, act, 1, 'newscache/act_changed_status.html', ctx)
+            if news is None:
+                logger.debug("  act changed status news queued")
+            elif created:
                 logger.debug("  act changed status news created")
             else:
                 logger.debug("  act changed status news found")
@@ -853,6 +883,7 @@ def pre_delete_transition(**kwargs):
     """
     if not kwargs.get('raw', False):
         t = kwargs['instance']
+        discard_news(t)
         news = News.objects.filter(
             generating_object_pk=t.pk,
             generating_content_type=ContentType.objects.get_for_model(t),
@@ -7,6 +7,12 @@ class FileImportAdmin(admin.ModelAdmin):
     list_filter = ('import_type', 'import_started_at')
     search_fields = ('file_path',)
 
+class ImportedElementAdmin(admin.ModelAdmin):
+    list_display = ('element_type', 'element_key', 'content_hash', 'imported_at')
+    list_filter = ('element_type', 'imported_at')
+    search_fields = ('element_key',)
+
 
 admin.site.register(FileImport, FileImportAdmin)
+admin.site.register(ImportedElement, ImportedElementAdmin)
 
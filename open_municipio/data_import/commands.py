@@ -1,22 +1,35 @@
 # -*- coding: utf-8 -*-
 from optparse import make_option
+import functools
 import os
 import re
+import threading
+import traceback
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.core.management.base import LabelCommand, CommandError, BaseCommand
-from django.core.files import File
+from django.db import connections
 
-from lxml import etree, html
+from lxml import etree
 from os import path
 
-from haystack.backends.solr_backend import SolrSearchBackend
-from pysolr import SolrError
 from open_municipio.people.models import Person, municipality
 from open_municipio.acts.models import *
 
 import logging
 
 from open_municipio.data_import import conf
+from open_municipio.data_import.utils import iterparse_elements, PeopleIndex, file_sha1
+from open_municipio.data_import.lib import ImportJournal, element_hash
+from open_municipio.data_import.models import ImportedElement
+from open_municipio.data_import.profiling import profiler
+from open_municipio.data_import.extraction import ExtractionPool
+from open_municipio.data_import.votations.lib import DBVotationWriter, recompute_counters
+from open_municipio.votations.caches import DirtyCounters
+from open_municipio.people.statistics import update_statistics
+from open_municipio.newscache.models import News
+from open_municipio.newscache.deferred import deferred_news, get_news_queue
+
+from multiprocessing import Pool
 
 # configure xml namespaces
 NS = {
@@ -27,6 +40,34 @@ NS = {
 XLINK_NAMESPACE = NS['xlink']
 XLINK = "{%s}" % XLINK_NAMESPACE
 
+
+# the command run by worker processes, inherited from the parent when forking
+_worker_command = None
+
+def _import_votations_label(args):
+    """
+    Imports a single file within a worker process, and returns the ids of
+    the charges and votations whose cached counters must be recomputed,
+    along with the profiling measures (if profiling is enabled) and the
+    traceback of the error that stopped the import, if any.
+
+    Errors are returned, instead of raised, so that the counters of the sittings
+    committed before the error still reach the parent process.
+    """
+    label, options = args
+    DBVotationWriter.deferred_counters = DirtyCounters()
+    if profiler.enabled:
+        profiler.reset()
+    error = None
+    try:
+        with profiler.stage('file', label):
+            _worker_command.handle_label(label, **options)
+    except Exception:
+        error = traceback.format_exc()
+    counters = DBVotationWriter.deferred_counters
+    profile = profiler.summary() if profiler.enabled else None
+    return label, list(counters.charge_ids), list(counters.votation_ids), profile, error
+
 class ImportVotationsCommand(LabelCommand):
     option_list = BaseCommand.option_list + (
         make_option('--people-file',
@@ -40,6 +81,30 @@ class ImportVotationsCommand(LabelCommand):
                     default=False,
                     help='Execute without actually writing into the DB'
         ),
+        make_option('--bulk',
+                    action='store_true',
+                    dest='bulk',
+                    default=False,
+                    help='Write the votes of each ballot with batched statements (faster)'
+        ),
+        make_option('--workers',
+                    type='int',
+                    dest='workers',
+                    default=1,
+                    help='Number of processes importing files in parallel'
+        ),
+        make_option('--full',
+                    action='store_true',
+                    dest='full',
+                    default=False,
+                    help='Import all sittings and ballots, even those unchanged since the last import'
+        ),
+        make_option('--profile',
+                    dest='profile',
+                    default=None,
+                    metavar='FILE',
+                    help='Profile the import stages, and write a JSON summary into FILE (- for stdout)'
+        ),
     )
 
     args = "<filename filename ...>"
@@ -51,6 +116,7 @@ class ImportVotationsCommand(LabelCommand):
     logger = logging.getLogger('import')
 
     people_tree = None
+    people_index = None
 
     def handle_label(self, filename, **options):
         raise Exception("Not implemented")
@@ -59,12 +125,13 @@ class ImportVotationsCommand(LabelCommand):
         if not labels:
             raise CommandError('Enter at least one %s.' % self.label)
 
-        # parse people xml file into an lxml.etree
+        # index people xml file (or read its cached index)
         people_file = options['people_file']
         if not path.isfile(people_file):
             raise IOError("File %s does not exist" % people_file)
 
-        self.people_tree = etree.parse(people_file)
+        # people_tree is kept as an alias, for callers of ChargeSeekerMixin.lookupCharge
+        self.people_tree = self.people_index = PeopleIndex.load(people_file)
 
         self.dry_run = options['dry_run']
 
@@ -80,11 +147,62 @@ class ImportVotationsCommand(LabelCommand):
             self.logger.setLevel(logging.DEBUG)
 
 
-        # parse passed votations
-        for label in labels:
-            self.handle_label(label, **options)
+        if options['profile']:
+            profiler.enable()
+
+        try:
+            # parse passed votations
+            workers = min(options['workers'], len(labels))
+            if workers > 1:
+                self.handle_labels_parallel(labels, workers, **options)
+            else:
+                for label in labels:
+                    with profiler.stage('file', label):
+                        self.handle_label(label, **options)
+
+            profiler.report(options['profile'])
+        finally:
+            profiler.disable()
         return 'done'
 
+    def handle_labels_parallel(self, labels, workers, **options):
+        """
+        Spreads the import of the passed files over a pool of worker processes.
+
+        Every worker writes its sittings in their own transactions, while
+        cached counters are collected from all workers, and recomputed once, at the end,
+        even if some of the imports failed.
+        """
+        global _worker_command
+        _worker_command = self
+
+        # connections must not be shared with forked processes
+        for conn in connections.all():
+            conn.close()
+
+        counters = DirtyCounters()
+        failed_labels = []
+        pool = Pool(processes=workers)
+        try:
+            for label, charge_ids, votation_ids, profile, error in pool.imap_unordered(
+                    _import_votations_label, [(label, options) for label in labels]):
+                counters.charge_ids.update(charge_ids)
+                counters.votation_ids.update(votation_ids)
+                if profile is not None:
+                    profiler.merge(profile)
+                if error is not None:
+                    self.logger.error("import of %s failed:\n%s" % (label, error))
+                    failed_labels.append(label)
+        finally:
+            pool.close()
+            pool.join()
+            # committed sittings are journaled, and would be skipped by the next run,
+            # so their counters are recomputed whatever happened
+            recompute_counters(counters)
+
+        if failed_labels:
+            raise CommandError("import of %d files failed: %s" % (len(failed_labels), ", ".join(failed_labels)))
+
 
 class ImportActsCommand(LabelCommand):
     option_list = BaseCommand.option_list + (
@@ -116,6 +234,24 @@ class ImportActsCommand(LabelCommand):
                     default=False,
                     help="Remove act's presenters before importing."
         ),
+        make_option('--full',
+                    action='store_true',
+                    dest='full',
+                    default=False,
+                    help='Import all acts and attachments, even those unchanged since the last import'
+        ),
+        make_option('--extraction-workers',
+                    type='int',
+                    dest='extraction_workers',
+                    default=2,
+                    help="Number of threads extracting attachments' text (0 to extract synchronously)"
+        ),
+        make_option('--profile',
+                    dest='profile',
+                    default=None,
+                    metavar='FILE',
+                    help='Profile the import stages, and write a JSON summary into FILE (- for stdout)'
+        ),
     )
 
     args = "<filename filename ...>"
@@ -127,6 +263,10 @@ class ImportActsCommand(LabelCommand):
     logger = logging.getLogger('import')
 
     people_tree = None
+    people_index = None
+
+    # number of news written for the file being imported
+    n_news = 0
 
     def lookupCharge(self, xml_chargexref, institution=None, moment=None):
         """
@@ -135,16 +275,13 @@ class ImportActsCommand(LabelCommand):
         """
         try:
             file, charge_id = xml_chargexref.get(XLINK+"href").split("#")
-            people_charges = self.people_tree.xpath(
-                '//om:Person[@id="%s"]' % charge_id,
-                namespaces=NS
-            )
-            if len(people_charges):
-                om_id = people_charges[0].get('om_id')
+            person_entry = self.people_index.get(charge_id, moment)
+            if person_entry is not None:
+                om_id = person_entry.om_id
                 if om_id is None:
                     self.logger.warning("charge with id %s has no om_id (past charge?). Skipping." % charge_id)
                     return None
-                charge_type = people_charges[0].get('charge')
+                charge_type = person_entry.charge
                 if charge_type is None:
                     self.logger.warning("charge with id %s has no charge attribute. Skipping." % charge_id)
                     return None
@@ -198,7 +335,8 @@ class ImportActsCommand(LabelCommand):
             if support_date is None:
                 support_date = str(om_act.presentation_date)
             chargexref = xml_support.xpath("./om:ChargeXRef", namespaces=NS)[0]
-            om_charge = self.lookupCharge(chargexref, charge_lookup_institution, moment=support_date)
+            with profiler.stage('charge_lookup'):
+                om_charge = self.lookupCharge(chargexref, charge_lookup_institution, moment=support_date)
             if om_charge is None:
                 continue
 
@@ -214,6 +352,22 @@ class ImportActsCommand(LabelCommand):
 
             if not self.dry_run:
                 om_as.save()
+                self.signer_charge_ids.add(om_charge.pk)
+
+    def get_act_hash(self, filename, xml_act):
+        """
+        Returns a hash of the act's content, including the content of its attachment files,
+        used to tell whether the act changed since the last import.
+        """
+        attach_hashes = []
+        for xml_attach in xml_act.xpath("./om:Attachment", namespaces=NS):
+            attach_href = xml_attach.get(XLINK+"href")
+            if attach_href is None:
+                continue
+            attach_file = path.join(path.dirname(filename), attach_href).encode('utf8')
+            if path.isfile(attach_file):
+                attach_hashes.append(file_sha1(attach_file))
+        return element_hash(xml_act, *attach_hashes)
 
     def fetch_attachments(self, filename, om_act, xml_act):
         """
@@ -240,7 +394,6 @@ class ImportActsCommand(LabelCommand):
                 )
                 continue
 
-            attach_dir = attach_href.split('/')[-2]
             attach_file = path.join(path.dirname(filename), attach_href).encode('utf8')
             if not path.isfile(attach_file):
                 self.stderr.write("File %s does not exist. Skipping!\n" % attach_file)
@@ -251,101 +404,104 @@ class ImportActsCommand(LabelCommand):
                 act=om_act,
                 title=attach_title
             )
-            om_att.document_date = om_act.presentation_date
-            if not self.dry_run:
-                om_att.save()
 
-            # remove old attach file to avoid _1 files whenb rewriting
-            if not self.dry_run:
-                try:
-                    old_attach_file = om_att.file.file
-                    os.remove(old_attach_file.name)
-                except ValueError:
-                    pass
-                except IOError:
-                    pass
-
-            # overwrite attach file and save it under media (/uploads)
+            # skip files unchanged since the last import
+            attach_key = "%s/%s" % (om_act.pk, attach_title)
+            attach_hash = file_sha1(attach_file)
+            if not created and self.attachment_journal.is_unchanged(attach_key, attach_hash):
+                self.logger.info(" %s unchanged since last import. Skipping." % attach_file)
+                continue
+
+            om_att.document_date = om_act.presentation_date
             attach_filename = path.basename(attach_file)
-            attach_f = open(attach_file, 'r')
+            attach_ext = os.path.splitext(attach_filename)[1]
+            om_att.document_type = attach_ext[1:]
+
+            # files are stored by content (see Document.store_file), so that identical files
+            # are stored once, and unchanged files are neither copied nor extracted again
+            changed = attach_hash != om_att.content_hash or not om_att.file
+            if changed and not self.dry_run:
+                with open(attach_file, 'rb') as attach_f:
+                    om_att.store_file(attach_f, content_hash=attach_hash, extension=attach_ext)
+            self.logger.info(" will attach %s" % (attach_file, ))
 
-            if not self.dry_run:
-                try:
-                    om_att.file.save("%s_%s" % (attach_dir, attach_filename.decode('utf8')), File(attach_f))
-                except UnicodeDecodeError:
-                    self.logger.error("Could not save attachment with unicode characters: %s. Skipping." % (attach_filename,))
+            # text extraction, for proposals and discussions, when the content changed,
+            # or when no text could be extracted before
+            is_proposal = 'testoproposta' in attach_filename.lower()
+            needs_extraction = False
+            if (changed or not om_att.text) and (is_proposal or 'testodiscussione' in attach_filename.lower()):
+                # text already extracted from the same content, for another document
+                shared_text = Attach.objects.filter(content_hash=attach_hash).exclude(pk=om_att.pk).\
+                    exclude(text='').values_list('text', flat=True)[:1]
+                if shared_text:
+                    self.logger.info("  textual content shared with identical attachments")
+                    om_att.text = shared_text[0]
+                    # for proposale, text content goes into act's content field
+                    if is_proposal:
+                        om_act.text = shared_text[0]
+                        if not self.dry_run:
+                            om_act.save()
+                else:
+                    needs_extraction = True
 
-            om_att.document_type = os.path.splitext(attach_filename)[1][1:]
-            om_att.document_size = File(attach_f).size
-            self.logger.info(" will attach %s" % (attach_file, ))
             if not self.dry_run:
                 om_att.save()
 
-            # text extraction (using tika inside solr)
-            if 'testoproposta' in attach_filename.lower() or\
-               'testodiscussione' in attach_filename.lower():
-
-                """
-                Streamlines content extraction from a doc (pdf, or other format file, as specified in Tika) within a solr request.
-                Requires Haystack 2.0.0.
-                Handles unicode characters, as well.
-
-                In settings, define this hash:
-                HAYSTACK_CONNECTIONS = {
-                    'default': {
-                        'ENGINE': 'haystack.backends.solr_backend.SolrEngine',
-                        'URL': 'http://127.0.0.1:8983/solr',
-                        'TIMEOUT': 60 * 5,
-                        'BATCH_SIZE': 100,
-                        'SEARCH_RESULTS_PER_PAGE': 10,
-                    }
-                }
-
-
-                from django.conf import settings
-                from haystack.backends.solr_backend import SolrSearchBackend
-                from lxml import html
-
-                file_path = '/Users/guglielmo/Workspace/open_municipio/test_data/acts/20120622_ATTI_2008/DC_2008401100013/TestoProposta.doc'
-                solr_backend = SolrSearchBackend('default', **settings.HAYSTACK_CONNECTIONS['default'])
-
-                attach_f = open(file_path)
-                file_content = solr_backend.extract_file_contents(attach_f)
-                html_content = html.fromstring(file_content['contents'].encode('utf-8'))
-                document_text = html_content.cssselect('body')[0].text_content()
-
-                print document_text
-                """
-
-
-                # reset attach file pointer
-                attach_f.seek(0)
-
-                # text extraction, through haystack-solr and lxml.html
-                solr_backend = SolrSearchBackend('default', **settings.HAYSTACK_CONNECTIONS['default'])
+                # carried out asynchronously by the extraction pool;
+                # the attachment is recorded into the journal once its text has been extracted
+                if needs_extraction:
+                    self.pending_extractions.append((attach_file, om_att.pk, om_act.pk if is_proposal else None,
+                                                     attach_key, attach_hash))
+                    continue
 
-                try:
-                    file_content = solr_backend.extract_file_contents(attach_f)
-                    html_content = html.fromstring(file_content['contents'].encode('utf-8'))
-                    document_text = html_content.cssselect('body')[0].text_content()
+            self.attachment_journal.record(attach_key, attach_hash, om_att)
 
-                    self.logger.info("  textual content extracted from file")
+    def write_news(self):
+        """
+        Writes the news queued so far, if news are deferred.
+        """
+        queue = get_news_queue()
+        if queue is None:
+            return
+        with profiler.stage('news'):
+            n_news = queue.flush()
+            profiler.add_rows(News, n_news)
+        self.n_news += n_news
 
-                    # text content saved into attachment's text
-                    om_att.text = document_text
-                    if not self.dry_run:
-                        om_att.save()
+    def record_act(self, act_key, act_hash, om_act):
+        """
+        Writes the news queued for the act, submits the pending text extractions
+        to the extraction pool, and records the act into the import journal,
+        once all of them succeeded;
+        must be called once the act has been saved for the last time,
+        so that extracted text is not overwritten.
+
+        Acts and attachments whose text could not be extracted (i.e. an extractor failed,
+        or the import stopped before the extraction) are not recorded,
+        so that the next run imports them again.
+        """
+        # news are written before the act is recorded, so that they are not lost if a later act fails
+        self.write_news()
 
-                    # for proposale, text content goes into act's content field
-                    if 'testoproposta' in attach_filename.lower():
-                        self.logger.info("  textual version of proposal added to act")
-                        om_act.text = document_text
-                        if not self.dry_run:
-                            om_act.save()
-                except SolrError:
-                    self.logger.warning("  could not extract textual content with solr-tika")
+        jobs, self.pending_extractions = self.pending_extractions, []
+        if not jobs:
+            self.act_journal.record(act_key, act_hash, om_act)
+            return
 
-                attach_f.close()
+        # called by the extraction pool, for each extracted attachment
+        remaining = [len(jobs)]
+        lock = threading.Lock()
+        def extracted(attach_key, attach_hash, attach_pk):
+            self.attachment_journal.record(attach_key, attach_hash, Attach(pk=attach_pk))
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            self.act_journal.record(act_key, act_hash, om_act)
+
+        for attach_file, attach_pk, act_pk, attach_key, attach_hash in jobs:
+            self.extraction_pool.submit(attach_file, attach_pk, act_pk=act_pk,
+                                        callback=functools.partial(extracted, attach_key, attach_hash, attach_pk))
 
     def remove_news(self, act):
         """
@@ -356,17 +512,18 @@ class ImportActsCommand(LabelCommand):
            ActSupport with s in act.actsupport_set.all()
         """
 
-        # remove news related to om_act
-        act.related_news.delete()
-        self.logger.debug("  news related to act removed")
+        with profiler.stage('news_removal'):
+            # remove news related to om_act
+            act.related_news.delete()
+            self.logger.debug("  news related to act removed")
 
-        # remove news generated by ActSupport originated by om_act
-        # this removes the news regarding the politician
-        News.objects.filter(
-            generating_object_pk__in=act.actsupport_set.values('id'),
-            generating_content_type=ContentType.objects.get_for_model(ActSupport)
-        ).delete()
-        self.logger.debug("  news generated by ActSupport removed")
+            # remove news generated by ActSupport originated by om_act
+            # this removes the news regarding the politician
+            News.objects.filter(
+                generating_object_pk__in=act.actsupport_set.values('id'),
+                generating_content_type=ContentType.objects.get_for_model(ActSupport)
+            ).delete()
+            self.logger.debug("  news generated by ActSupport removed")
 
     def handle_deliberation(self, filename, **options):
         """
@@ -376,25 +533,19 @@ class ImportActsCommand(LabelCommand):
         # get act type: CouncilDeliberation or CGDeliberation
         act_type = options['act_type']
         if act_type == 'CouncilDeliberation':
-            deliberation_tag = "/om:CouncilDeliberation"
+            deliberation_tag = "CouncilDeliberation"
             initiative_types = Deliberation.INITIATIVE_TYPES
             deliberation_manager = Deliberation.objects
             emitting_institution = municipality.council.as_institution
         else:
-            deliberation_tag = "/om:CityGovernmentDeliberation"
+            deliberation_tag = "CityGovernmentDeliberation"
             initiative_types = CGDeliberation.INITIATIVE_TYPES
             deliberation_manager = CGDeliberation.objects
             emitting_institution = municipality.gov.as_institution
 
-        try:
-            tree = etree.parse(filename)
-        except etree.XMLSyntaxError:
-            self.logger.error("Syntax error while parsing %s. Skipping." % (filename,))
-            return
-
-        acts = tree.xpath(deliberation_tag, namespaces=NS)
-        self.logger.info("%d Deliberation to import" % len(acts))
-        for xml_act in acts:
+        self.logger.info("importing %s acts from %s" % (deliberation_tag, filename))
+        for xml_act in profiler.iterate('act', iterparse_elements(filename, deliberation_tag),
+                                        unit=lambda el: el.get("id"), parse_stage='parse'):
 
             # get important attributes
             id = xml_act.get("id")
@@ -404,6 +555,13 @@ class ImportActsCommand(LabelCommand):
                 )
                 continue
 
+            # skip acts unchanged since the last import
+            act_key = "%s/%s" % (deliberation_tag, id)
+            act_hash = self.get_act_hash(filename, xml_act)
+            if self.act_journal.is_unchanged(act_key, act_hash):
+                self.logger.info("%s unchanged since last import. Skipping." % act_key)
+                continue
+
             initiative = conf.XML_TO_OM_INITIATIVE[xml_act.get("initiative")]
             if initiative is None:
                 self.logger.error(
@@ -535,7 +693,8 @@ class ImportActsCommand(LabelCommand):
 
 
 
-            self.fetch_attachments(filename, om_act, xml_act)
+            with profiler.stage('attachments'):
+                self.fetch_attachments(filename, om_act, xml_act)
 
             # call parent class save to trigger
             # real-time search index update
@@ -543,17 +702,13 @@ class ImportActsCommand(LabelCommand):
             if not self.dry_run:
                 om_act.act_ptr.save()
 
-    def handle_interrogation(self, filename, **options):
+            self.record_act(act_key, act_hash, om_act)
 
-        try:
-            tree = etree.parse(filename)
-        except etree.XMLSyntaxError:
-            self.logger.error("Syntax error while parsing %s. Skipping." % (filename,))
-            return
+    def handle_interrogation(self, filename, **options):
 
-        acts = tree.xpath("/om:Interrogation",namespaces=NS)
-        self.logger.info("%d Interrogations/Interpellations to import" % len(acts))
-        for xml_act in acts:
+        self.logger.info("importing Interrogations/Interpellations from %s" % filename)
+        for xml_act in profiler.iterate('act', iterparse_elements(filename, "Interrogation"),
+                                        unit=lambda el: el.get("id"), parse_stage='parse'):
 
             # get important attributes
             id = xml_act.get("id")
@@ -563,6 +718,13 @@ class ImportActsCommand(LabelCommand):
                 )
                 continue
 
+            # skip acts unchanged since the last import
+            act_key = "Interrogation/%s" % id
+            act_hash = self.get_act_hash(filename, xml_act)
+            if self.act_journal.is_unchanged(act_key, act_hash):
+                self.logger.info("%s unchanged since last import. Skipping." % act_key)
+                continue
+
             presentation_date = xml_act.get("presentation_date")
             if presentation_date is None:
                 self.stderr.write(
@@ -674,7 +836,8 @@ class ImportActsCommand(LabelCommand):
             else:
                 logger.debug("  presentation transition can't be added, no presentation_date")
 
-            self.fetch_attachments(filename, om_act, xml_act)
+            with profiler.stage('attachments'):
+                self.fetch_attachments(filename, om_act, xml_act)
 
             # call parent class save to trigger
             # real-time search index update
@@ -682,17 +845,13 @@ class ImportActsCommand(LabelCommand):
             if not self.dry_run:
                 om_act.act_ptr.save()
 
-    def handle_motion(self, filename, **options):
+            self.record_act(act_key, act_hash, om_act)
 
-        try:
-            tree = etree.parse(filename)
-        except etree.XMLSyntaxError:
-            self.logger.error("Syntax error while parsing %s. Skipping." % (filename,))
-            return
+    def handle_motion(self, filename, **options):
 
-        acts = tree.xpath("/om:Motion",namespaces=NS)
-        self.logger.info("%d Motions to import" % len(acts))
-        for xml_act in acts:
+        self.logger.info("importing Motions from %s" % filename)
+        for xml_act in profiler.iterate('act', iterparse_elements(filename, "Motion"),
+                                        unit=lambda el: el.get("id"), parse_stage='parse'):
 
             # get important attributes
             id = xml_act.get("id")
@@ -702,6 +861,13 @@ class ImportActsCommand(LabelCommand):
                 )
                 continue
 
+            # skip acts unchanged since the last import
+            act_key = "Motion/%s" % id
+            act_hash = self.get_act_hash(filename, xml_act)
+            if self.act_journal.is_unchanged(act_key, act_hash):
+                self.logger.info("%s unchanged since last import. Skipping." % act_key)
+                continue
+
             presentation_date = xml_act.get("presentation_date")
             if presentation_date is None:
                 self.stderr.write(
@@ -780,7 +946,8 @@ class ImportActsCommand(LabelCommand):
             else:
                 logger.debug("  presentation transition can't be added, no presentation_date")
 
-            self.fetch_attachments(filename, om_act, xml_act)
+            with profiler.stage('attachments'):
+                self.fetch_attachments(filename, om_act, xml_act)
 
             # call parent class save to trigger
             # real-time search index update
@@ -788,6 +955,8 @@ class ImportActsCommand(LabelCommand):
             if not self.dry_run:
                 om_act.act_ptr.save()
 
+            self.record_act(act_key, act_hash, om_act)
+
     def handle_label(self, filename, **options):
         if not path.isfile(filename):
             raise IOError("File %s does not exist" % filename)
@@ -807,7 +976,7 @@ class ImportActsCommand(LabelCommand):
         if not labels:
             raise CommandError('Enter at least one %s.' % self.label)
 
-        # parse people xml file into an lxml.etree
+        # index people xml file (or read its cached index)
         people_file = options['people_file']
         if not path.isfile(people_file):
             raise IOError("File %s does not exist" % people_file)
@@ -815,10 +984,17 @@ class ImportActsCommand(LabelCommand):
         if options['refresh_news'] and options['dry_run']:
             raise CommandError("refresh-news and dry-run cannot be specified together")
 
-        self.people_tree = etree.parse(people_file)
+        # people_tree is kept as an alias, for callers of ChargeSeekerMixin.lookupCharge
+        self.people_tree = self.people_index = PeopleIndex.load(people_file)
 
         self.dry_run = options['dry_run']
 
+        # journals of the previous imports; acts are re-imported when news or signatures are rewritten
+        force = options['full'] or options['refresh_news'] or options['rewrite_signatures']
+        self.act_journal = ImportJournal(ImportedElement.ELEMENT_TYPE.act, force=force, dry_run=self.dry_run)
+        self.attachment_journal = ImportJournal(ImportedElement.ELEMENT_TYPE.attachment,
+                                                force=options['full'], dry_run=self.dry_run)
+
         # fix logger level according to verbosity
         verbosity = options['verbosity']
         if verbosity == '0':
@@ -830,8 +1006,52 @@ class ImportActsCommand(LabelCommand):
         elif verbosity == '3':
             self.logger.setLevel(logging.DEBUG)
 
-        # parse passed acts
-        for label in labels:
-            self.handle_label(label, **options)
+        if options['profile']:
+            profiler.enable()
+
+        try:
+            # attachments' text is extracted while acts are being imported (dry runs extract nothing)
+            self.extraction_pool = None
+            if not self.dry_run:
+                self.extraction_pool = ExtractionPool(workers=options['extraction_workers'])
+            self.pending_extractions = []
+
+            # charges whose statistics must be recomputed
+            self.signer_charge_ids = set()
+
+            # parse passed acts; news generated by signatures and transitions
+            # are queued and written in bulk, once per act
+            failed_labels = []
+            try:
+                for label in labels:
+                    with profiler.stage('file', label):
+                        self.n_news = 0
+                        try:
+                            with deferred_news():
+                                self.handle_label(label, **options)
+                                self.write_news()
+                        except etree.XMLSyntaxError, e:
+                            # acts read before the error have already been imported (and journaled)
+                            self.logger.error("Syntax error while parsing %s: %s. Skipping the rest of the file." %
+                                              (label, e))
+                            failed_labels.append(label)
+                        self.logger.info("%s news generated" % self.n_news)
+            finally:
+                # extractions of the acts imported so far are completed, even if the import fails
+                if self.extraction_pool is not None:
+                    with profiler.stage('text_extraction'):
+                        self.extraction_pool.join()
+
+            # council statistics count acts, so they are recomputed even if no act was signed
+            if not self.dry_run:
+                with profiler.stage('statistics'):
+                    update_statistics(self.signer_charge_ids)
+
+            profiler.report(options['profile'])
+        finally:
+            profiler.disable()
+
+        if failed_labels:
+            raise CommandError("import of %d files failed: %s" % (len(failed_labels), ", ".join(failed_labels)))
         return 'done\n'
 
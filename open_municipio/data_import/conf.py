@@ -18,6 +18,19 @@ MDB_COMPONENT_FNAME = 'UdinC%(current_legislature)s.Mdb' % {'current_legislature
 XML_ROOT_DIR = os.path.join(settings.REPO_ROOT, 'test_data/votations/xml')
 
 ACTS_PEOPLE_FILE = os.path.join(settings.REPO_ROOT, 'test_data/acts/people.xml')
+# where indexes of the people files are cached; must not be writable by other users
+PEOPLE_INDEX_CACHE_DIR = getattr(settings, 'PEOPLE_INDEX_CACHE_DIR', os.path.join(settings.REPO_ROOT, 'cache/people_index'))
+
+# extractors of attachments' text, tried in order, until one succeeds;
+# PDF and DOC extractors require pdftotext (poppler-utils) and antiword,
+# solr-tika is the fallback for other formats, or when they fail;
+# extractors that cannot work (i.e. missing tools, no Solr) are left out, with a warning
+ATTACH_TEXT_EXTRACTORS = (
+    'open_municipio.data_import.extraction.ODTExtractor',
+    'open_municipio.data_import.extraction.PDFExtractor',
+    'open_municipio.data_import.extraction.DOCExtractor',
+    'open_municipio.data_import.extraction.SolrExtractor',
+)
 
 
 # Django settings specific for the data import features
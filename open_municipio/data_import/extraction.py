@@ -0,0 +1,284 @@
+"""
+Extraction of the textual content of attachments.
+
+Extractors are pluggable: ``conf.ATTACH_TEXT_EXTRACTORS`` lists (as dotted paths)
+the extractor classes tried, in order, for each file; extractors not accepting
+the file's extension, or failing, are skipped, so that the last ones act as fallbacks.
+
+The ODT extractor works in-process; PDF and DOC extractors run ``pdftotext``
+(poppler-utils) and ``antiword``, which must be installed on the system;
+``SolrExtractor`` sends files to Tika, through Solr, as the acts importer used to do.
+Extractors are checked when loaded, so that missing tools are reported
+before the import starts: extractors that cannot work are left out, with a warning,
+and the import stops only if none of them can work.
+
+Extraction is carried out by an ``ExtractionPool``, whose worker threads drain
+a queue of files, and write back the extracted text into the DB, so that imports
+do not have to wait for it.
+"""
+import logging
+import os
+import Queue
+import subprocess
+import threading
+import zipfile
+
+from lxml import etree, html
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.utils.importlib import import_module
+
+from open_municipio.acts.models import Act, Attach
+from open_municipio.data_import import conf
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class BaseExtractor(object):
+    """
+    Extracts the textual content of files having one of the given ``extensions``.
+    """
+    extensions = ()
+
+    def check(self):
+        """
+        Raises ``ImproperlyConfigured`` if the extractor cannot work in this environment.
+        """
+        pass
+
+    def can_extract(self, filename):
+        return os.path.splitext(filename)[1].lower() in self.extensions
+
+    def extract(self, filename):
+        """
+        Returns the textual content of the file, as a unicode string.
+        """
+        raise NotImplementedError
+
+
+class ODTExtractor(BaseExtractor):
+    """
+    Reads the paragraphs and headings of an OpenDocument text, in-process.
+    """
+    extensions = ('.odt',)
+
+    TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+
+    def extract(self, filename):
+        try:
+            with zipfile.ZipFile(filename) as odt:
+                content = etree.fromstring(odt.read('content.xml'))
+        except (zipfile.BadZipfile, KeyError, etree.XMLSyntaxError), e:
+            raise ExtractionError("could not read %s: %s" % (filename, e))
+        return u"\n".join(
+            el.xpath('string()') for el in content.iter('{%s}p' % self.TEXT_NS, '{%s}h' % self.TEXT_NS)
+        )
+
+
+class CommandExtractor(BaseExtractor):
+    """
+    Runs an external command printing the file's text (UTF-8 encoded) on the standard output.
+    """
+    command = ()
+
+    def get_args(self, filename):
+        return list(self.command) + [filename]
+
+    def check(self):
+        for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+            if os.access(os.path.join(directory, self.command[0]), os.X_OK):
+                return
+        raise ImproperlyConfigured("%s requires %s, which was not found in the PATH" %
+                                   (self.__class__.__name__, self.command[0]))
+
+    def extract(self, filename):
+        try:
+            process = subprocess.Popen(self.get_args(filename), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError, e:
+            raise ExtractionError("could not run %s: %s" % (self.command[0], e))
+        out, err = process.communicate()
+        if process.returncode != 0:
+            raise ExtractionError("%s failed on %s: %s" % (self.command[0], filename, err.strip()))
+        return out.decode('utf-8', 'replace')
+
+
+class PDFExtractor(CommandExtractor):
+    """
+    Extracts text from PDF files, with ``pdftotext`` (poppler-utils).
+    """
+    extensions = ('.pdf',)
+    command = ('pdftotext', '-enc', 'UTF-8', '-q')
+
+    def get_args(self, filename):
+        # pdftotext writes to the standard output when the output file is '-'
+        return list(self.command) + [filename, '-']
+
+
+class DOCExtractor(CommandExtractor):
+    """
+    Extracts text from MS Word (.doc) files, with ``antiword``.
+    """
+    extensions = ('.doc',)
+    command = ('antiword', '-m', 'UTF-8.txt')
+
+
+class SolrExtractor(BaseExtractor):
+    """
+    Extracts text from any file through Tika, inside Solr (requires Haystack 2.0.0).
+    """
+    def can_extract(self, filename):
+        return True
+
+    def check(self):
+        try:
+            from haystack.backends.solr_backend import SolrSearchBackend
+        except ImportError, e:
+            raise ImproperlyConfigured("SolrExtractor requires haystack and pysolr: %s" % e)
+        if 'default' not in getattr(settings, 'HAYSTACK_CONNECTIONS', {}):
+            raise ImproperlyConfigured("SolrExtractor requires a 'default' entry in HAYSTACK_CONNECTIONS")
+
+    def extract(self, filename):
+        from haystack.backends.solr_backend import SolrSearchBackend
+        from pysolr import SolrError
+
+        solr_backend = SolrSearchBackend('default', **settings.HAYSTACK_CONNECTIONS['default'])
+        try:
+            with open(filename) as f:
+                file_content = solr_backend.extract_file_contents(f)
+        except SolrError, e:
+            raise ExtractionError("could not extract textual content with solr-tika: %s" % e)
+        html_content = html.fromstring(file_content['contents'].encode('utf-8'))
+        return html_content.cssselect('body')[0].text_content()
+
+
+def get_extractors():
+    """
+    Returns instances of the extractors listed in ``conf.ATTACH_TEXT_EXTRACTORS``,
+    leaving out (with a warning) those that cannot work in this environment;
+    raises ``ImproperlyConfigured`` if any of them cannot be loaded, or if none of them can work.
+    """
+    logger = logging.getLogger('import')
+    extractors = []
+    for path in conf.ATTACH_TEXT_EXTRACTORS:
+        module_name, class_name = path.rsplit('.', 1)
+        try:
+            extractor = getattr(import_module(module_name), class_name)()
+        except (ImportError, AttributeError), e:
+            raise ImproperlyConfigured("Error loading text extractor %s: %s" % (path, e))
+        try:
+            extractor.check()
+        except ImproperlyConfigured, e:
+            logger.warning("text extractor %s disabled: %s" % (path, e))
+            continue
+        extractors.append(extractor)
+    if not extractors:
+        raise ImproperlyConfigured("None of the text extractors in ATTACH_TEXT_EXTRACTORS can work")
+    return extractors
+
+
+def extract_text(filename, extractors):
+    """
+    Returns the text extracted from the file by the first extractor accepting it,
+    and not failing, or None if no extractor accepts it.
+
+    If all the extractors accepting the file fail, the last error is raised.
+    """
+    error = None
+    for extractor in extractors:
+        if extractor.can_extract(filename):
+            try:
+                return extractor.extract(filename)
+            except ExtractionError, e:
+                error = e
+    if error is not None:
+        raise error
+    return None
+
+
+class ExtractionPool(object):
+    """
+    A pool of threads extracting the text of attachment files,
+    and writing it into ``Attach.text`` and, for proposals, into ``Act.text``.
+
+    With no workers, files are processed synchronously, when submitted.
+    An optional callback is called (in the worker thread) once the extracted
+    text has been written, and only then.
+
+    Usage::
+
+        pool = ExtractionPool(workers=2)
+        pool.submit(attach_file, om_att.pk, act_pk=om_act.pk, callback=extracted)
+        ...
+        pool.join()
+    """
+    logger = logging.getLogger('import')
+
+    def __init__(self, workers=2, extractors=None):
+        self.extractors = extractors if extractors is not None else get_extractors()
+        self.queue = Queue.Queue()
+        self.threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name="extraction-%d" % i)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, filename, attach_pk, act_pk=None, callback=None):
+        """
+        Schedules the extraction of a file, whose text goes to the given attach (and act).
+        """
+        if self.threads:
+            self.queue.put((filename, attach_pk, act_pk, callback))
+        else:
+            self.process(filename, attach_pk, act_pk, callback)
+
+    def process(self, filename, attach_pk, act_pk=None, callback=None):
+        try:
+            text = extract_text(filename, self.extractors)
+        except ExtractionError, e:
+            self.logger.warning("  %s" % e)
+            return
+        if text is None:
+            self.logger.warning("  no text extractor for %s" % filename)
+            return
+
+        Attach.objects.filter(pk=attach_pk).update(text=text)
+        self.logger.info("  textual content extracted from %s" % filename)
+        if act_pk is not None:
+            # saved (not updated) to trigger real-time search index update
+            act = Act.objects.get(pk=act_pk)
+            act.text = text
+            act.save()
+            self.logger.info("  textual version of proposal added to act")
+
+        if callback is not None:
+            callback()
+
+    def _work(self):
+        try:
+            while True:
+                job = self.queue.get()
+                try:
+                    if job is None:
+                        return
+                    self.process(*job)
+                except Exception, e:
+                    self.logger.error("  text extraction of %s failed: %s" % (job[0], e))
+                finally:
+                    self.queue.task_done()
+        finally:
+            # every thread has its own DB connection
+            connection.close()
+
+    def join(self):
+        """
+        Waits for all submitted files to be processed, and stops the workers.
+        """
+        for t in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
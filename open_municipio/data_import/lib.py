@@ -1,5 +1,10 @@
 from django.utils import simplejson as json
 from django.core.exceptions import ImproperlyConfigured
+from django.contrib.contenttypes.models import ContentType
+from lxml import etree
+import hashlib
+
+from open_municipio.data_import.models import ImportedElement
 
 def valid_XML_char_ordinal(i):
     """
@@ -116,4 +121,62 @@ class XMLWriter(BaseWriter):
             el.set(str(attname), str(attrs[attname]))
 
     def write(self):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+def element_hash(xml_el, *extra):
+    """
+    Returns the SHA1 hex digest of the canonical (C14N) serialization of an XML element,
+    so that irrelevant formatting changes do not alter it.
+
+    Extra strings (i.e. hashes of files referenced by the element) may be passed
+    to be included in the digest.
+    """
+    sha1 = hashlib.sha1(etree.tostring(xml_el, method='c14n'))
+    for e in extra:
+        sha1.update(e)
+    return sha1.hexdigest()
+
+
+class ImportJournal(object):
+    """
+    Gives access to the import journal of a given type of elements,
+    telling which elements did not change since their last import.
+
+    The journal of the element type is read with a single query when built;
+    when ``force`` is True, all elements are reported as changed.
+
+    Usage::
+
+        journal = ImportJournal(ImportedElement.ELEMENT_TYPE.act)
+        h = element_hash(xml_act)
+        if journal.is_unchanged(act_id, h):
+            continue
+        ...
+        journal.record(act_id, h, om_act)
+    """
+    def __init__(self, element_type, force=False, dry_run=False):
+        self.element_type = element_type
+        self.force = force
+        self.dry_run = dry_run
+        self.hashes = dict(
+            ImportedElement.objects.filter(element_type=element_type).values_list('element_key', 'content_hash')
+        )
+
+    def is_unchanged(self, key, content_hash):
+        return not self.force and self.hashes.get(key) == content_hash
+
+    def record(self, key, content_hash, obj=None):
+        """
+        Records the hash of an element, after it has been imported, and the object it produced.
+        """
+        if self.dry_run or self.hashes.get(key) == content_hash:
+            return
+        values = {
+            'content_hash': content_hash,
+            'content_type': ContentType.objects.get_for_model(obj) if obj is not None else None,
+            'object_pk': obj.pk if obj is not None else None,
+        }
+        n = ImportedElement.objects.filter(element_type=self.element_type, element_key=key).update(**values)
+        if not n:
+            ImportedElement.objects.create(element_type=self.element_type, element_key=key, **values)
+        self.hashes[key] = content_hash
@@ -1,5 +1,7 @@
 import datetime
 from django.db import models
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes import generic
 from model_utils import Choices
 from django.utils.translation import ugettext_lazy as _
 
@@ -33,3 +35,40 @@ class FileImport(models.Model):
         verbose_name = _('File import')
         verbose_name_plural = _('Files import')
 
+
+
+class ImportedElement(models.Model):
+    """
+    An entry of the import journal: keeps track of the content hash of a source element
+    (a sitting, a ballot, an act or an attachment file), as of its last import,
+    along with the OpenMunicipio object it produced.
+
+    Importers use it (through ``ImportJournal``) to skip elements that did not change
+    since the last run.
+    """
+    ELEMENT_TYPE = Choices(
+        ('SITTING', 'sitting', _('sitting')),
+        ('BALLOT', 'ballot', _('ballot')),
+        ('ACT', 'act', _('act')),
+        ('ATTACHMENT', 'attachment', _('attachment')),
+    )
+
+    element_type = models.CharField(_('element type'), choices=ELEMENT_TYPE, max_length=10)
+    element_key = models.CharField(_('element key'), max_length=255)
+    content_hash = models.CharField(_('content hash'), max_length=40)
+
+    # the object produced by the import
+    content_type = models.ForeignKey(ContentType, blank=True, null=True)
+    object_pk = models.PositiveIntegerField(blank=True, null=True)
+    content_object = generic.GenericForeignKey(ct_field="content_type", fk_field="object_pk")
+
+    imported_at = models.DateTimeField(_('imported at'), auto_now=True)
+
+    def __unicode__(self):
+        return u"%s %s (%s)" % (self.get_element_type_display(), self.element_key, self.content_hash)
+
+    class Meta:
+        db_table = u'data_import_journal'
+        unique_together = (('element_type', 'element_key'),)
+        verbose_name = _('Imported element')
+        verbose_name_plural = _('Imported elements')
@@ -0,0 +1,227 @@
+"""
+Profiling of the import commands.
+
+The module-level ``profiler`` is disabled by default, so that instrumented code
+costs (almost) nothing; import commands enable it through their ``--profile`` option.
+
+Measures are taken by stages (i.e. parsing, charge lookup, DB writes, cache recomputation),
+each one collecting wall time, number of SQL queries and number of rows written.
+Stages may be nested, and measures are inclusive of nested stages.
+Queries are counted by a cursor wrapper, without recording their SQL,
+so that memory usage is not affected by profiling.
+
+Only the queries of the default connection of the thread enabling the profiler
+(and of the processes it forks) are counted: since every thread has its own DB connections,
+queries run by other threads (i.e. by the ``ExtractionPool`` workers) are not.
+
+Stages may be bound to a *unit* (a sitting, an act, a file), and measures
+are then also reported per unit.
+
+Usage::
+
+    from open_municipio.data_import.profiling import profiler
+
+    profiler.enable()
+    for sitting in profiler.iterate('sitting', sittings, unit=unicode):
+        with profiler.stage('votes'):
+            ...
+            profiler.add_rows(ChargeVote, n)
+    profiler.report('profile.json')
+    profiler.disable()
+"""
+from contextlib import contextmanager
+import logging
+import sys
+import time
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.backends import util
+from django.db.models.signals import post_save
+from django.utils import simplejson as json
+
+
+class CountingCursorWrapper(util.CursorWrapper):
+    """
+    A cursor counting the statements it executes into the profiler
+    (unlike Django's debug cursor, statements are not recorded).
+    """
+    def __init__(self, cursor, db, profiler):
+        super(CountingCursorWrapper, self).__init__(cursor, db)
+        self.profiler = profiler
+
+    def execute(self, sql, params=()):
+        self.set_dirty()
+        self.profiler.n_queries += 1
+        return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.set_dirty()
+        self.profiler.n_queries += 1
+        return self.cursor.executemany(sql, param_list)
+
+
+class ImportProfiler(object):
+
+    logger = logging.getLogger('import')
+
+    def __init__(self):
+        self.enabled = False
+        # the connection whose cursors are replaced, while enabled
+        self.connection = None
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self.stages = {}
+        self.units = []
+        self.rows_by_model = {}
+        # number of queries executed since the last reset
+        self.n_queries = 0
+        # stack of the active stages, as [name, unit, started_at, n_queries, n_rows] lists
+        self._active = []
+
+    def enable(self):
+        """
+        Starts collecting measures; queries are counted by the DB connection from now on.
+        """
+        if self.enabled:
+            self.disable()
+        self.enabled = True
+        self.reset()
+        # the debug cursor of the connection (the actual wrapper of this thread,
+        # not the ``django.db.connection`` proxy) is replaced by a counting one
+        self.connection = connection = connections[DEFAULT_DB_ALIAS]
+        self._use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        connection.make_debug_cursor = lambda cursor: CountingCursorWrapper(cursor, connection, self)
+        post_save.connect(self._count_saved_row, dispatch_uid='import_profiler')
+
+    def disable(self):
+        """
+        Stops collecting measures, giving the DB connection its own cursors back.
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.connection.use_debug_cursor = self._use_debug_cursor
+        del self.connection.make_debug_cursor
+        self.connection = None
+        post_save.disconnect(dispatch_uid='import_profiler')
+
+    def _count_saved_row(self, sender, created=False, raw=False, **kwargs):
+        if created:
+            self.add_rows(sender, 1)
+
+    def add_rows(self, model, n):
+        """
+        Counts rows written for the given model, in all the active stages
+        (rows saved through the ORM are counted automatically; bulk inserts and
+        updates must be counted explicitly).
+        """
+        if not self.enabled or not n:
+            return
+        label = model._meta.db_table
+        self.rows_by_model[label] = self.rows_by_model.get(label, 0) + n
+        for active in self._active:
+            active[4] += n
+
+    @contextmanager
+    def stage(self, name, unit=None):
+        """
+        Measures the wrapped block as a (possibly nested) stage.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        active = [name, unit, time.time(), self.n_queries, 0]
+        self._active.append(active)
+        try:
+            yield
+        finally:
+            self._active.pop()
+            elapsed = time.time() - active[2]
+            n_queries = self.n_queries - active[3]
+            n_rows = active[4]
+
+            totals = self.stages.setdefault(name, {'calls': 0, 'time': 0.0, 'queries': 0, 'rows': 0})
+            totals['calls'] += 1
+            totals['time'] += elapsed
+            totals['queries'] += n_queries
+            totals['rows'] += n_rows
+            if unit is not None:
+                self.units.append({
+                    'stage': name, 'unit': unicode(unit),
+                    'time': elapsed, 'queries': n_queries, 'rows': n_rows,
+                })
+
+    def iterate(self, name, iterable, unit=None, parse_stage=None):
+        """
+        Wraps an iterable, so that the processing of each item is measured
+        as a ``name`` stage, bound to the unit ``unit(item)``.
+
+        If ``parse_stage`` is given, the time spent fetching each item
+        (i.e. incrementally parsing a file) is measured as a stage, as well.
+        """
+        it = iter(iterable)
+        while True:
+            if parse_stage is not None:
+                with self.stage(parse_stage):
+                    try:
+                        item = it.next()
+                    except StopIteration:
+                        return
+            else:
+                try:
+                    item = it.next()
+                except StopIteration:
+                    return
+
+            with self.stage(name, unit(item) if (unit is not None and self.enabled) else None):
+                yield item
+
+    def summary(self):
+        """
+        Returns the collected measures, as a JSON-serializable dict.
+        """
+        return {
+            'total_time': time.time() - self.started_at,
+            'stages': self.stages,
+            'units': self.units,
+            'rows_by_model': self.rows_by_model,
+        }
+
+    def merge(self, summary):
+        """
+        Merges the measures collected by another profiler (i.e. in a worker process).
+        """
+        for name, totals in summary['stages'].items():
+            own = self.stages.setdefault(name, {'calls': 0, 'time': 0.0, 'queries': 0, 'rows': 0})
+            for k, v in totals.items():
+                own[k] += v
+        self.units.extend(summary['units'])
+        for label, n in summary['rows_by_model'].items():
+            self.rows_by_model[label] = self.rows_by_model.get(label, 0) + n
+
+    def report(self, filename=None):
+        """
+        Logs a per-stage summary and writes all measures as JSON
+        into filename (to the standard output, if filename is '-').
+        """
+        if not self.enabled:
+            return
+        summary = self.summary()
+        self.logger.info("profile (total time: %.2fs)" % summary['total_time'])
+        for name, totals in sorted(self.stages.items(), key=lambda s: -s[1]['time']):
+            self.logger.info("  %-20s %6d calls %10.2fs %8d queries %8d rows" %
+                             (name, totals['calls'], totals['time'], totals['queries'], totals['rows']))
+        if filename == '-':
+            json.dump(summary, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        elif filename:
+            with open(filename, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+
+# the profiler used by the import commands
+profiler = ImportProfiler()
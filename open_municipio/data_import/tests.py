@@ -0,0 +1,293 @@
+from datetime import date
+from io import BytesIO
+import os
+import shutil
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test import TestCase
+from lxml import etree
+
+from open_municipio.data_import import conf
+from open_municipio.data_import.extraction import BaseExtractor, ODTExtractor, get_extractors
+from open_municipio.data_import.lib import ImportJournal
+from open_municipio.data_import.models import ImportedElement
+from open_municipio.data_import.profiling import ImportProfiler
+from open_municipio.data_import.utils import iterparse_elements, PeopleIndex
+from open_municipio.data_import.votations.lib import DBVotationWriter, Sitting, Ballot, Vote
+from open_municipio.people.models import Group, GroupCharge, Institution, InstitutionCharge, Person
+from open_municipio.votations.caches import DirtyCounters
+from open_municipio.votations.models import Votation, ChargeVote
+
+
+class ImportJournalTest(TestCase):
+    def test_skip_and_force(self):
+        """Elements are skipped only if recorded with the same hash, and never when forced"""
+        journal = ImportJournal(ImportedElement.ELEMENT_TYPE.act)
+        self.assertFalse(journal.is_unchanged('2012/1', 'aaa'))
+        journal.record('2012/1', 'aaa')
+        self.assertTrue(journal.is_unchanged('2012/1', 'aaa'))
+        self.assertFalse(journal.is_unchanged('2012/1', 'bbb'))
+
+        # journals are read back from the DB, by element type
+        self.assertTrue(ImportJournal(ImportedElement.ELEMENT_TYPE.act).is_unchanged('2012/1', 'aaa'))
+        self.assertFalse(ImportJournal(ImportedElement.ELEMENT_TYPE.act, force=True).is_unchanged('2012/1', 'aaa'))
+        self.assertFalse(ImportJournal(ImportedElement.ELEMENT_TYPE.sitting).is_unchanged('2012/1', 'aaa'))
+
+    def test_record(self):
+        """Records are updated in place, and not written at all in dry runs"""
+        institution = Institution.objects.create(name='Consiglio comunale', institution_type=Institution.COUNCIL)
+        journal = ImportJournal(ImportedElement.ELEMENT_TYPE.act)
+        journal.record('2012/1', 'aaa', institution)
+        journal.record('2012/1', 'bbb', institution)
+
+        element = ImportedElement.objects.get(element_type=ImportedElement.ELEMENT_TYPE.act)
+        self.assertEqual((element.element_key, element.content_hash), ('2012/1', 'bbb'))
+        self.assertEqual(element.content_object, institution)
+
+        ImportJournal(ImportedElement.ELEMENT_TYPE.act, dry_run=True).record('2012/2', 'ccc')
+        self.assertEqual(ImportedElement.objects.count(), 1)
+
+
+class IterparseElementsTest(TestCase):
+    ACTS = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<om:Acts xmlns:om="http://www.openmunicipio.it">\n'
+            '  <om:Motion id="1"><om:Title>Prima</om:Title></om:Motion>\n'
+            '  <om:Year value="2012">\n'
+            '    <om:Motion id="2"><om:Title>Seconda</om:Title></om:Motion>\n'
+            '  </om:Year>\n'
+            '  <om:Motion id="3"><om:Title>Terza</om:Title></om:Motion>\n'
+            '</om:Acts>\n')
+
+    def test_elements(self):
+        """Elements are yielded complete and in document order, at any depth"""
+        elements = []
+        for elem in iterparse_elements(BytesIO(self.ACTS), 'Motion'):
+            self.assertEqual(elem[0].text, ['Prima', 'Seconda', 'Terza'][len(elements)])
+            elements.append((elem, elem.get('id')))
+        self.assertEqual([id for elem, id in elements], ['1', '2', '3'])
+
+        single = '<om:Motion xmlns:om="http://www.openmunicipio.it" id="4"/>'
+        self.assertEqual([e.get('id') for e in iterparse_elements(BytesIO(single), 'Motion')], ['4'])
+
+    def test_clear(self):
+        """Processed elements are cleared, and removed from their parents"""
+        elements = list(iterparse_elements(BytesIO(self.ACTS), 'Motion'))
+        for elem in elements:
+            self.assertEqual((len(elem), elem.get('id')), (0, None))
+        # the root only keeps the last element
+        self.assertEqual(list(elements[-1].getparent()), [elements[-1]])
+
+    def test_syntax_error(self):
+        """Syntax errors are raised, once the elements preceding them have been yielded"""
+        malformed = self.ACTS.replace('</om:Year>', '')
+        ids = []
+        def consume():
+            for elem in iterparse_elements(BytesIO(malformed), 'Motion'):
+                ids.append(elem.get('id'))
+        self.assertRaises(etree.XMLSyntaxError, consume)
+        self.assertEqual(ids, ['1', '2', '3'])
+
+
+class UnavailableExtractor(BaseExtractor):
+    def check(self):
+        raise ImproperlyConfigured("UnavailableExtractor never works")
+
+
+class ExtractorsTest(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, conf, 'ATTACH_TEXT_EXTRACTORS', conf.ATTACH_TEXT_EXTRACTORS)
+
+    def test_unavailable(self):
+        """Extractors that cannot work are left out, and the import stops only if none of them can"""
+        conf.ATTACH_TEXT_EXTRACTORS = ('open_municipio.data_import.tests.UnavailableExtractor',
+                                       'open_municipio.data_import.extraction.ODTExtractor')
+        self.assertEqual([e.__class__ for e in get_extractors()], [ODTExtractor])
+
+        conf.ATTACH_TEXT_EXTRACTORS = ('open_municipio.data_import.tests.UnavailableExtractor',)
+        self.assertRaises(ImproperlyConfigured, get_extractors)
+
+
+class ImportProfilerTest(TestCase):
+    def test_enable_disable(self):
+        """Queries are counted only while enabled, and the connection gets its own cursors back"""
+        connection = connections[DEFAULT_DB_ALIAS]
+        use_debug_cursor = connection.use_debug_cursor
+        profiler = ImportProfiler()
+        profiler.enable()
+        self.addCleanup(profiler.disable)
+        with profiler.stage('count'):
+            Person.objects.count()
+        self.assertEqual(profiler.stages['count']['queries'], 1)
+
+        profiler.disable()
+        self.assertFalse('make_debug_cursor' in connection.__dict__)
+        self.assertEqual(connection.use_debug_cursor, use_debug_cursor)
+        Person.objects.count()
+        self.assertEqual(profiler.n_queries, 1)
+
+
+class PeopleIndexTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.people_file = os.path.join(self.tmp_dir, 'people.xml')
+        with open(self.people_file, 'w') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<om:People xmlns:om="http://www.openmunicipio.it">\n'
+                    '  <om:Person id="C1" om_id="12" charge="counselor" end_date="2010-12-31"/>\n'
+                    '  <om:Person id="C1" om_id="13" charge="counselor" start_date="2011-01-01"/>\n'
+                    '  <om:Person id="C2" charge="counselor"/>\n'
+                    '</om:People>\n')
+
+    def test_load(self):
+        """People files are indexed by id (at a given moment) and by om_id, and cached as JSON"""
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        index = PeopleIndex.load(self.people_file, cache_dir=cache_dir)
+        self.assertEqual(index.get('C1', '2010-12-31').om_id, '12')
+        self.assertEqual(index.get('C1', '2011-01-01').om_id, '13')
+        self.assertEqual(index.get('C2').om_id, None)
+        self.assertEqual(index.get('C3'), None)
+        self.assertEqual([e.id for e in index.get_by_om_id(13)], ['C1'])
+
+        cache_files = os.listdir(cache_dir)
+        self.assertEqual(len(cache_files), 1)
+        self.assertTrue(cache_files[0].endswith('.json'))
+        self.assertEqual(PeopleIndex.load(self.people_file, cache_dir=cache_dir).entries, index.entries)
+
+
+class VotationTestConf(object):
+    XML_TO_OM_INST = {'SCN': 'Consiglio comunale'}
+
+
+class VotationTestWriter(DBVotationWriter):
+    """
+    A DB writer mapping voters through the given people index, and
+    passing dirty counters to the test, in ``deferred_counters``.
+    """
+    dry_run = False
+
+    def __init__(self, sittings, people_index, **options):
+        super(VotationTestWriter, self).__init__(sittings, **options)
+        self._people_file_index = people_index
+        self.deferred_counters = DirtyCounters()
+
+    def setup(self):
+        self.conf = VotationTestConf
+
+
+class VotationImportTest(TestCase):
+    def setUp(self):
+        self.council = Institution.objects.create(name='Consiglio comunale', institution_type=Institution.COUNCIL)
+        self.charges = []
+        for i in range(3):
+            person = Person.objects.create(first_name='Nome%d' % i, last_name='Cognome',
+                                           birth_date=date(1960, 1, 1), sex=Person.MALE_SEX)
+            self.charges.append(InstitutionCharge.objects.create(person=person, institution=self.council,
+                                                                 start_date=date(2008, 1, 1)))
+        self.people_index = PeopleIndex.from_entries(
+            [['C%d' % i, str(c.person_id), 'counselor', None, None] for i, c in enumerate(self.charges)]
+        )
+
+    def make_sitting(self, choices, seq_n='1', site='SCN'):
+        """
+        Returns a sitting with a single ballot, in which the i-th charge votes the i-th choice.
+        """
+        sitting = Sitting(call='1', date=date(2012, 3, 21), seq_n=seq_n, site=site)
+        sitting._id = '%s-%s' % (site, seq_n)
+        ballot = Ballot(sitting, seq_n='1', subj='Ordine del giorno', n_presents='2', n_partecipants='2',
+                        n_majority='2', n_yes='1', n_no='1', n_abst='0', n_legal='2', outcome='1')
+        ballot.votes = [Vote(ballot, cardID=str(i), componentID='C%d' % i, choice=choice)
+                        for i, choice in enumerate(choices)]
+        sitting.ballots = [ballot]
+        return sitting
+
+    def write(self, sittings, **options):
+        writer = VotationTestWriter(sittings, self.people_index, bulk=True, **options)
+        writer.write()
+        return writer
+
+    def get_votes(self):
+        return dict(ChargeVote.objects.values_list('charge', 'vote'))
+
+    def test_bulk_write(self):
+        """Votes are mapped to charges, missing voters are marked absent, touched counters are dirty"""
+        writer = self.write([self.make_sitting(['FAV', 'CON'])])
+        votation = Votation.objects.get()
+        self.assertEqual(self.get_votes(), {
+            self.charges[0].pk: ChargeVote.VOTES.yes,
+            self.charges[1].pk: ChargeVote.VOTES.no,
+            self.charges[2].pk: ChargeVote.VOTES.absent,
+        })
+        self.assertEqual(votation.n_absents, 1)
+        self.assertEqual(writer.deferred_counters.charge_ids, set(c.pk for c in self.charges))
+        self.assertEqual(writer.deferred_counters.votation_ids, set([votation.pk]))
+
+    def test_skipped_votes(self):
+        """Unmapped choices and unknown voters are skipped"""
+        sitting = self.make_sitting(['FAV', '___', 'XXX'])
+        ballot = sitting.ballots[0]
+        ballot.votes.append(Vote(ballot, cardID='9', componentID='C9', choice='FAV'))
+        self.write([sitting])
+        self.assertEqual(self.get_votes(), {
+            self.charges[0].pk: ChargeVote.VOTES.yes,
+            self.charges[1].pk: ChargeVote.VOTES.absent,
+            self.charges[2].pk: ChargeVote.VOTES.absent,
+        })
+
+    def test_rewrite(self):
+        """Changed sittings are re-imported, updating votes in place"""
+        self.write([self.make_sitting(['FAV', 'CON'])])
+        vote_ids = set(ChargeVote.objects.values_list('pk', flat=True))
+        self.write([self.make_sitting(['CON', 'CON', 'FAV'])])
+        self.assertEqual(set(ChargeVote.objects.values_list('pk', flat=True)), vote_ids)
+        self.assertEqual(self.get_votes(), {
+            self.charges[0].pk: ChargeVote.VOTES.no,
+            self.charges[1].pk: ChargeVote.VOTES.no,
+            self.charges[2].pk: ChargeVote.VOTES.yes,
+        })
+        self.assertEqual(Votation.objects.count(), 1)
+
+    def test_journal(self):
+        """Unchanged sittings are skipped, unless the full option is set"""
+        self.write([self.make_sitting(['FAV', 'CON'])])
+        self.assertEqual(ImportedElement.objects.count(), 2)
+
+        writer = self.write([self.make_sitting(['FAV', 'CON'])])
+        self.assertFalse(writer.deferred_counters.is_dirty)
+
+        writer = self.write([self.make_sitting(['FAV', 'CON'])], full=True)
+        self.assertTrue(writer.deferred_counters.is_dirty)
+        self.assertEqual(ChargeVote.objects.count(), 3)
+        self.assertEqual(ImportedElement.objects.count(), 2)
+
+    def test_counters(self):
+        """Dirty counters are recomputed out of the charges' votes"""
+        writer = self.write([self.make_sitting(['FAV', 'CON'])])
+        writer.deferred_counters.recompute()
+        charges = InstitutionCharge.objects.in_bulk([c.pk for c in self.charges])
+        self.assertEqual([(charges[c.pk].n_present_votations, charges[c.pk].n_absent_votations)
+                          for c in self.charges], [(1, 0), (1, 0), (0, 1)])
+        self.assertFalse(writer.deferred_counters.is_dirty)
+
+    def test_rebel_counters(self):
+        """Charges voting against their group are marked as rebels, and counted as such"""
+        group = Group.objects.create(name='Gruppo', acronym='G', slug='gruppo')
+        for charge in self.charges:
+            GroupCharge.objects.create(group=group, charge=charge, start_date=date(2008, 1, 1))
+
+        writer = self.write([self.make_sitting(['FAV', 'FAV', 'CON'])])
+        writer.deferred_counters.recompute()
+        charges = InstitutionCharge.objects.in_bulk([c.pk for c in self.charges])
+        self.assertEqual([charges[c.pk].n_rebel_votations for c in self.charges], [0, 0, 1])
+        self.assertEqual(Votation.objects.get().n_rebels, 1)
+
+    def test_failure(self):
+        """Failed sittings are not journaled, and counters of those written before still reach the caller"""
+        # the second sitting refers to an unknown institution
+        sittings = [self.make_sitting(['FAV', 'CON']), self.make_sitting(['FAV'], seq_n='2', site='XXX')]
+        writer = VotationTestWriter(sittings, self.people_index, bulk=True)
+        self.assertRaises(KeyError, writer.write)
+        self.assertEqual(writer.deferred_counters.votation_ids, set([Votation.objects.get().pk]))
+        self.assertEqual(sorted(ImportedElement.objects.values_list('element_key', flat=True)), ['SCN-1', 'SCN-1/1'])
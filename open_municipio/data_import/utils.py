@@ -2,8 +2,15 @@
 A misc set of utilities useful in the data-import domain.
 """
 import logging
+import os
+import hashlib
+import tempfile
+from collections import namedtuple
+from lxml import etree
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.utils import simplejson as json
 from open_municipio.people.models import Person, municipality
+from open_municipio.data_import import conf
 
 import socket
 
@@ -17,29 +24,206 @@ XLINK_NAMESPACE = NS['xlink']
 XLINK = "{%s}" % XLINK_NAMESPACE
 
 
+def iterparse_elements(source, tag, namespace=NS['om']):
+    """
+    Incrementally parses an XML file (a filename or a file-like object),
+    yielding the elements with the given tag (i.e. 'Sitting', 'Motion')
+    one at a time, as soon as they have been completely read.
+
+    Elements can be found at any depth, so that single-element files
+    and multi-element dumps are handled the same way.
+
+    Once the consumer is done with an element, its subtree is cleared,
+    and the already processed siblings are removed from the parent,
+    so that memory usage does not grow with the size of the file.
+
+    Since elements are yielded while the file is being read, a syntax error
+    is only found once the elements preceding it have been processed:
+    ``etree.XMLSyntaxError`` is then raised to the consumer, which must treat
+    the file as failed (the elements already processed are not rolled back).
+    """
+    context = etree.iterparse(source, events=('end',), tag='{%s}%s' % (namespace, tag), huge_tree=True)
+    try:
+        for event, elem in context:
+            yield elem
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    finally:
+        del context
+
+
+def file_sha1(filename, chunk_size=1024 * 1024):
+    """
+    Returns the SHA1 hex digest of a file's content, read in chunks.
+    """
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+# a ``Person`` element of the people file;
+# start_date and end_date are optional (YYYY-MM-DD strings)
+PersonEntry = namedtuple('PersonEntry', 'id om_id charge start_date end_date')
+
+
+class PeopleIndex(object):
+    """
+    An in-memory index of the people file, mapping both the data provider's ids
+    (``id`` attribute) and OpenMunicipio's ids (``om_id`` attribute) to the
+    ``Person`` entries having them, in document order.
+
+    Entries may be restricted to a time range, through the optional ``start_date``
+    and ``end_date`` attributes, so that the same id may be mapped differently
+    in different moments.
+
+    Since building the index requires a full parse of the people file,
+    ``load`` caches it on disk (as a JSON list of entries, in a directory
+    owned by the project), keyed by the SHA1 of the file's content.
+
+    Usage::
+
+        people = PeopleIndex.load(people_file)
+        entry = people.get('IVLE', moment='2012-03-21')
+        if entry is not None:
+            om_id, charge_type = entry.om_id, entry.charge
+    """
+    # change this whenever the cached structure changes
+    version = 2
+
+    def __init__(self):
+        self.entries = []
+        self.by_id = {}
+        self.by_om_id = {}
+
+    def add(self, person_el):
+        self.add_entry(PersonEntry(person_el.get('id'), person_el.get('om_id'), person_el.get('charge'),
+                                   person_el.get('start_date'), person_el.get('end_date')))
+
+    def add_entry(self, entry):
+        self.entries.append(entry)
+        if entry.id is not None:
+            self.by_id.setdefault(entry.id, []).append(entry)
+        if entry.om_id is not None:
+            self.by_om_id.setdefault(entry.om_id, []).append(entry)
+
+    @classmethod
+    def from_tree(cls, tree):
+        """
+        Builds the index from an already parsed people file (lxml.etree).
+        """
+        index = cls()
+        for person_el in tree.iter('{%s}Person' % NS['om']):
+            index.add(person_el)
+        return index
+
+    @classmethod
+    def from_file(cls, filename):
+        """
+        Builds the index streaming through the people file.
+        """
+        index = cls()
+        for person_el in iterparse_elements(filename, 'Person'):
+            index.add(person_el)
+        return index
+
+    @classmethod
+    def from_entries(cls, entries):
+        """
+        Builds the index from a list of entries, as (id, om_id, charge, start_date, end_date) lists.
+        """
+        index = cls()
+        for entry in entries:
+            index.add_entry(PersonEntry(*entry))
+        return index
+
+    @classmethod
+    def load(cls, filename, cache_dir=None):
+        """
+        Returns the index of the given people file, from the on-disk cache if available,
+        building (and caching) it otherwise.
+        """
+        logger = logging.getLogger('import')
+        cache_dir = cache_dir or conf.PEOPLE_INDEX_CACHE_DIR
+        cache_file = os.path.join(cache_dir, "people-index-v%d-%s.json" % (cls.version, file_sha1(filename)))
+        try:
+            with open(cache_file, 'rb') as f:
+                index = cls.from_entries(json.load(f))
+            logger.debug("people index read from %s" % cache_file)
+            return index
+        except (IOError, ValueError, TypeError):
+            pass
+
+        index = cls.from_file(filename)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, 0700)
+            # write to a temporary file first, so that concurrent imports never read a partial index
+            fd, tmp_file = tempfile.mkstemp(dir=cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                json.dump(index.entries, f)
+            os.rename(tmp_file, cache_file)
+            logger.debug("people index cached in %s" % cache_file)
+        except (IOError, OSError), e:
+            logger.warning("could not cache the people index in %s: %s" % (cache_dir, e))
+        return index
+
+    def _select(self, entries, moment=None):
+        if not entries or moment is None:
+            return entries or []
+        moment = str(moment)[0:10]
+        return [e for e in entries
+                if (e.start_date is None or e.start_date[0:10] <= moment) and
+                   (e.end_date is None or e.end_date[0:10] >= moment)]
+
+    def get(self, id, moment=None):
+        """
+        Returns the entry for the data provider's id (at the given moment), or None.
+        """
+        entries = self._select(self.by_id.get(id), moment)
+        return entries[0] if entries else None
+
+    def get_by_om_id(self, om_id, moment=None):
+        """
+        Returns the list of entries for the OpenMunicipio id (at the given moment).
+        """
+        return self._select(self.by_om_id.get(str(om_id)), moment)
+
+
 class ChargeSeekerMixin:
     logger = logging.getLogger('import')
 
+    def get_people_index(self, people):
+        """
+        Returns a ``PeopleIndex`` for the passed people mapping, that may be
+        an index already, or a parsed people file (lxml.etree), indexed only once.
+        """
+        if isinstance(people, PeopleIndex):
+            return people
+        if getattr(self, '_people_index_tree', None) is not people:
+            self._people_index = PeopleIndex.from_tree(people)
+            self._people_index_tree = people
+        return self._people_index
+
     def lookupCharge(self, people_tree, ds_charge_id, institution=None, moment=None):
         """
         look for the correct open municipio charge, or return None
         starting from an internal, domain-specific, charge id
-        using the mapping in people_tree (lxml.etree)
+        using the mapping in people_tree (a ``PeopleIndex``, or a lxml.etree)
         if the moment parameter is not passed, then current charges are looked up
         """
         try:
-            people_charges = people_tree.xpath(
-                '//om:Person[@id="%s"]' % ds_charge_id,
-                namespaces=NS
-            )
-            if len(people_charges):
-                om_id = people_charges[0].get('om_id')
+            person_entry = self.get_people_index(people_tree).get(ds_charge_id, moment)
+            if person_entry is not None:
+                om_id = person_entry.om_id
                 if om_id is None:
                     self.logger.warning("charge with id %s has no om_id (past charge?). Skipping." % ds_charge_id)
                     return None
 
                 if institution is None:
-                    charge_type = people_charges[0].get('charge')
+                    charge_type = person_entry.charge
                     if charge_type is None:
                         self.logger.warning("charge with id %s has no charge attribute. Skipping." % ds_charge_id)
                         return None
@@ -1,20 +1,52 @@
-from django.core.exceptions import ObjectDoesNotExist
+from datetime import datetime
+from django.db import connection, transaction
 from django.utils import simplejson as json
+import hashlib
 import re
+import sys
+import time
 from open_municipio.acts.models import Act
-from open_municipio.data_import.lib import DataSource, BaseReader, BaseWriter, JSONWriter, XMLWriter, valid_XML_char_ordinal
+from open_municipio.data_import import conf as default_conf
+from open_municipio.data_import.lib import DataSource, BaseReader, BaseWriter, JSONWriter, XMLWriter, valid_XML_char_ordinal, ImportJournal
+from open_municipio.data_import.utils import ChargeSeekerMixin, PeopleIndex
+from open_municipio.data_import.models import ImportedElement
+from open_municipio.data_import.profiling import profiler
 # import OM-XML language tags
 from open_municipio.data_import.om_xml import *
 # import models used in DBVotationWriter
 from open_municipio.people.models import Institution
+from open_municipio.people.indexes import MembershipIndex
+from open_municipio.people.statistics import update_statistics
 from open_municipio.votations.models import Sitting as DBSitting, GroupVote
 from open_municipio.votations.models import Votation as DBBallot
 from open_municipio.votations.models import ChargeVote
+from open_municipio.votations.caches import DirtyCounters
 
 from lxml import etree
 
 import logging
 
+
+# a ballot's description refers to an act when it starts with "<act idnum>-"
+ACT_DESCR_RE = re.compile(r"(.+?)-(.+)")
+
+
+def recompute_counters(counters):
+    """
+    Recomputes the dirty counters (a ``DirtyCounters`` instance), and the statistics
+    of the charges they refer to.
+    """
+    if not counters.is_dirty:
+        return
+    logging.getLogger('import').info("updating cached counters of %d charges and %d votations" %
+                                     (len(counters.charge_ids), len(counters.votation_ids)))
+    charge_ids = counters.charge_ids
+    with profiler.stage('counters'):
+        counters.recompute()
+    if charge_ids:
+        with profiler.stage('statistics'):
+            update_statistics(charge_ids)
+
  
 class VotationDataSource(DataSource):
     """
@@ -149,44 +181,171 @@ class JSONVotationWriter(BaseVotationWriter, JSONWriter):
     def write(self):
         return json.dumps(self.sittings)
 
-class DBVotationWriter(BaseVotationWriter):
+class DBVotationWriter(BaseVotationWriter, ChargeSeekerMixin):
+    """
+    A writer class which stores votations data into the OpenMunicipio DB.
+
+    Cached counters (rebellions and presences) are not updated ballot by ballot:
+    touched charges and votations are tracked in ``self.counters`` and
+    recomputed once, at the end of ``write``. Each sitting is written in its own transaction;
+    if a sitting fails, counters of the sittings already committed are recomputed
+    before the error is raised, since the journal would skip them on the next run.
+
+    Sittings and ballots are recorded in the import journal (``ImportedElement``),
+    along with a hash of their content, so that unchanged ones are skipped
+    by later runs, unless the writer is built with the ``full`` option.
+
+    Votes are written one at a time, through ``write_vote``, unless the writer
+    is built with the ``bulk`` option; in that case, the votes of each ballot are
+    collected in memory (through ``get_charge_vote``) and written with batched
+    INSERT/UPDATE statements. Both modes are idempotent on re-import.
+
+    The default ``get_charge_vote`` maps votes through the people file
+    (the ``people_file`` option) and ``conf.XML_TO_OM_VOTE``; writers whose
+    data sources use other mappings override it, as they do with ``write_vote``.
+    """
 
     logger = logging.getLogger('import')
 
+    # max number of rows inserted by a single statement
+    bulk_batch_size = 500
+
+    # number of rows written during the last run
+    n_written_rows = 0
+
+    # when set to a ``DirtyCounters`` instance, cached counters are not recomputed
+    # at the end of ``write``, but merged into it, so that the caller can recompute
+    # them once for many writers (i.e. for many files, imported in parallel)
+    deferred_counters = None
+
     def setup(self):
         self.conf = None
 
+    # in-memory index of groups and institutions membership, built once per run
+    _membership = None
+
+    @property
+    def bulk(self):
+        return self.options.get('bulk', False)
+
+    @property
+    def membership(self):
+        if self._membership is None:
+            self._membership = MembershipIndex().build()
+        return self._membership
+
+    # map of acts' idnums, built once per run
+    _act_map = None
+
+    @property
+    def act_map(self):
+        """
+        A dict mapping acts' idnums to ``(act pk, concrete act model)`` tuples;
+        idnums shared by more than one act map to None.
+
+        Built with one query for the acts, plus one query per ``Act`` subclass, at any depth.
+        """
+        if self._act_map is None:
+            models = {}
+            # subclasses are walked parents first, so that acts map to their most derived model
+            subclasses = Act.__subclasses__()
+            while subclasses:
+                subclass = subclasses.pop(0)
+                if not subclass._meta.abstract and not subclass._meta.proxy:
+                    models.update((pk, subclass) for pk in subclass.objects.values_list('pk', flat=True))
+                subclasses.extend(subclass.__subclasses__())
+            self._act_map = {}
+            for pk, idnum in Act.objects.values_list('pk', 'idnum'):
+                if idnum in self._act_map:
+                    self._act_map[idnum] = None
+                else:
+                    self._act_map[idnum] = (pk, models.get(pk, Act))
+        return self._act_map
+
+    def resolve_act_link(self, db_ballot, act_links):
+        """
+        Looks up the act referred by the ballot's description in ``act_map``,
+        and adds the link to ``act_links`` (a dict of act pks, keyed by ballot pk),
+        if the ballot is not linked to it yet.
+
+        Descriptors that cannot be resolved are added to ``unresolved_acts``.
+        """
+        act_descr = db_ballot.act_descr.strip()
+        self.logger.debug("act_descr: %s" % act_descr)
+        m = ACT_DESCR_RE.match(act_descr)
+        if not m:
+            return
+        act_idnum = m.group(1)
+        act = self.act_map.get(act_idnum)
+        if act is None:
+            reason = "more than one act" if act_idnum in self.act_map else "no act"
+            self.unresolved_acts.append((unicode(db_ballot), act_descr, reason))
+            self.logger.info("act was not linked: %s with idnum %s" % (reason, act_idnum))
+            return
+
+        act_pk, act_model = act
+        if db_ballot.act_id != act_pk:
+            act_links[db_ballot.pk] = act_pk
+            self.logger.info("act will be linked: %s %s" % (act_model.__name__, act_idnum))
+
+    def link_ballots(self, act_links):
+        """
+        Links ballots to acts, given a dict of act pks keyed by ballot pk,
+        with a single UPDATE statement per batch of ballots.
+        """
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        ballot_ids = act_links.keys()
+        for i in range(0, len(ballot_ids), self.bulk_batch_size):
+            batch = ballot_ids[i:i + self.bulk_batch_size]
+            params = []
+            for ballot_id in batch:
+                params.extend([ballot_id, act_links[ballot_id]])
+            params.extend(batch)
+            cursor.execute("UPDATE %(table)s SET %(act_id)s = CASE %(id)s %(whens)s END WHERE %(id)s IN (%(ids)s)" % {
+                'table': qn(DBBallot._meta.db_table), 'act_id': qn('act_id'), 'id': qn('id'),
+                'whens': " ".join(["WHEN %s THEN %s"] * len(batch)),
+                'ids': ", ".join(["%s"] * len(batch)),
+            }, params)
+        transaction.commit_unless_managed()
+        self.n_written_rows += len(ballot_ids)
+        profiler.add_rows(DBBallot, len(ballot_ids))
+
+    def get_charge_group(self, charge_vote, votation):
+        """
+        Returns the group the voting charge was in at the date of the votation
+        (same as ``ChargeVote.charge_group_at_vote_date``, but without queries).
+        """
+        return self.membership.get_group(charge_vote.charge_id, votation.sitting.date)
+
     def compute_absences(self, votation):
         """
         A charge is considered absent if she is a member of
         the Institution where the Votation took place,
         at the moment when the Votation took place,
         and her ChargeVote is not among the associate chargevote_set
+
+        Members at the votation date are looked up in the membership index,
+        and diffed against the charges that voted; all missing ABSENT votes
+        are then inserted at once.
         """
-        votation_moment = votation.sitting.date.strftime('%Y-%m-%d')
-        charges = votation.sitting.institution.get_current_charges(moment=votation_moment)
-        for c in charges:
-            try:
-                cv = votation.chargevote_set.get(charge__pk=c.pk)
-            except ObjectDoesNotExist:
-                # get or create absence ChargeVote in OpenMunicipio DB
-                cv, created = ChargeVote.objects.get_or_create(
-                    charge=c,
-                    votation=votation,
-                    vote=ChargeVote.VOTES.absent
-                )
+        charge_votes = dict(votation.chargevote_set.values_list('charge_id', 'vote'))
+        members = self.membership.get_charges(votation.sitting.institution_id, votation.sitting.date)
+
+        absent_ids = members.difference(charge_votes)
+        self._bulk_create(ChargeVote, [
+            ChargeVote(charge_id=charge_id, votation=votation, vote=ChargeVote.VOTES.absent)
+            for charge_id in absent_ids
+        ])
 
         # update n_absents for the whole votation
-        votation.n_absents = votation.charge_votes.filter(vote=ChargeVote.VOTES.absent).count()
-        votation.save()
+        n_absents = len(absent_ids) + charge_votes.values().count(ChargeVote.VOTES.absent)
+        DBBallot.objects.filter(pk=votation.pk).update(n_absents=n_absents)
+        votation.n_absents = n_absents
 
-    def update_rebel_caches(self, votation):
+    def update_rebel_caches(self, votation, group_votes=None):
         """
-        Computes and update caches for the passed votation.
-
-        Firstly, the group votes are computed and stored,
-        then the rebel votes, and presence data are cached,
-        both for the votation and the charge.
+        Marks the rebel charge votes of the passed votation.
 
         A ChargeVote must be marked as ``rebel`` when her vote is different
         from that of her group.
@@ -196,40 +355,31 @@ class DBVotationWriter(BaseVotationWriter):
 
         This is only valid for council votations.
 
-        After a rebel vote has been set, the following *caches* should be updated:
+        ``group_votes`` are the GroupVotes computed by ``compute_group_votes``,
+        as a dict keyed by group id; they are read from the DB if not passed.
 
-        * Votation.n_rebels - counts the total number of rebels for that votation
+        Rebel flags are written with (at most) two UPDATE statements; cached counters
+        (``Votation.n_rebels``, ``InstitutionCharge.n_rebel_votations``) are not
+        updated here, but marked as dirty, and recomputed at the end of the import.
         """
+        if group_votes is None:
+            group_votes = dict((gv.group_id, gv) for gv in votation.groupvote_set.all())
 
+        rebel_ids = []
+        for cv_id, charge_id, charge_vote in votation.chargevote_set.values_list('id', 'charge_id', 'vote'):
+            if charge_vote not in (ChargeVote.VOTES.yes, ChargeVote.VOTES.no, ChargeVote.VOTES.abstained):
+                continue
+            gv = group_votes.get(self.membership.get_group_id(charge_id, votation.sitting.date))
+            # check rebellion: if charge_vote is different from a significative group_vote
+            if gv is not None and gv.vote != GroupVote.VOTES.noncomputable and gv.vote != charge_vote:
+                rebel_ids.append(cv_id)
 
-        # compute rebel caches for each voting charge
-        for vc in votation.charge_votes:
-            group = vc.charge_group_at_vote_date
-            if group is not None:
-                charge_vote = vc.vote
-                try:
-                    group_vote = group.groupvote_set.get(votation=votation).vote
-                    # check rebellion: if charge_vote is different from a significative group_vote
-                    if charge_vote == ChargeVote.VOTES.yes or\
-                       charge_vote == ChargeVote.VOTES.no or\
-                       charge_vote == ChargeVote.VOTES.abstained:
-                        if group_vote != GroupVote.VOTES.noncomputable and group_vote != charge_vote:
-                            # add rebel status to ChargeVote
-                            vc.is_rebel = True
-                            vc.save()
-
-                            # there's a new rebellion!
-                            # votation and charge caches must be updated
-
-                            # update charge cache
-                            vc.charge.update_rebellion_cache()
-
-                            # update votation cache
-                            votation.n_rebels = votation.charge_votes.filter(is_rebel=True).count()
-                            votation.save()
-                except ObjectDoesNotExist:
-                    pass
+        # flags are reset first, so that re-imports do not leave stale rebels around
+        votation.chargevote_set.filter(is_rebel=True).exclude(pk__in=rebel_ids).update(is_rebel=False)
+        if rebel_ids:
+            ChargeVote.objects.filter(pk__in=rebel_ids).update(is_rebel=True)
 
+        self.counters.add_votation(votation.pk)
 
     def compute_group_votes(self, votation):
         """
@@ -247,25 +397,29 @@ class DBVotationWriter(BaseVotationWriter):
         * n_abst
         * n_rebels
         * n_absents
+
+        Votes are counted in a single pass over the votation's charge votes,
+        then all GroupVotes are written with one INSERT.
+
+        Returns the computed GroupVotes, as a dict keyed by group id.
         """
 
         # reset: remove all GroupVotes for this votation,
         # so that group votes are never counted more than once
         votation.group_votes.delete()
 
-        for cv in votation.charge_votes:
-            g = cv.charge_group_at_vote_date
-            v = cv.vote
+        # count the votes of each group, in a single pass over the charge votes
+        group_votes = {}
+        for charge_id, v in votation.chargevote_set.values_list('charge_id', 'vote'):
+            g = self.membership.get_group(charge_id, votation.sitting.date)
 
             if g is None:
-                self.logger.warning(u"no group found for charge vote %s" % cv)
+                self.logger.warning(u"no group found for charge %s in %s" % (charge_id, votation))
                 continue
 
-            # get or create group votation
-            gv, created = GroupVote.objects.get_or_create(
-                votation=votation, group=g,
-                defaults={'vote':GroupVote.VOTES.noncomputable}
-            )
+            gv = group_votes.get(g.pk)
+            if gv is None:
+                gv = group_votes[g.pk] = GroupVote(votation=votation, group=g, vote=GroupVote.VOTES.noncomputable)
 
             if v == ChargeVote.VOTES.yes:
                 gv.n_yes += 1
@@ -287,9 +441,7 @@ class DBVotationWriter(BaseVotationWriter):
             else:
                 pass
 
-            gv.save()
-
-        for gv in votation.group_votes:
+        for gv in group_votes.values():
             # compute group vote and n of rebels
             if gv.n_yes > gv.n_no and gv.n_yes > gv.n_abst:
                 gv.vote = GroupVote.VOTES.yes
@@ -303,112 +455,339 @@ class DBVotationWriter(BaseVotationWriter):
                 gv.vote = GroupVote.VOTES.abstained
                 gv.n_rebels = gv.n_no + gv.n_yes
 
-            # save updates
-            gv.save()
+        # all group votes are written at once
+        self._bulk_create(GroupVote, group_votes.values())
+
+        return group_votes
 
 
 
     def write_vote(self, vote, db_ballot=None):
         raise Exception("Not implemented")
 
-    def write(self):
-        self.setup()
+    def get_charge_vote(self, vote, db_ballot):
+        """
+        Maps a ``Vote`` into an unsaved ``ChargeVote`` instance for the given ballot,
+        or returns None if the vote must be skipped.
 
-        for sitting in self.sittings:
-            self.logger.info("processing %s in Mdb" % sitting)
-            inst = Institution.objects.get(name=self.conf.XML_TO_OM_INST[sitting.site])
+        Used in bulk mode, in place of ``write_vote``.
 
-            if not self.dry_run:
-                s, created = DBSitting.objects.get_or_create(
-                    idnum=sitting._id,
-                    defaults={
-                        'number':      sitting.seq_n,
-                        'date':        sitting.date,
-                        'call':        sitting.call,
-                        'institution': inst,
-                        }
-                )
-                if created:
-                    self.logger.info("%s created in DB" % s)
-                else:
-                    self.logger.debug("%s found in DB" % s)
+        The vote's ``componentID`` is looked up in the people file, and mapped to
+        the voter's charge in the sitting's institution, at the sitting's date;
+        the vote's ``choice`` is mapped through ``XML_TO_OM_VOTE``.
+        """
+        vote_map = getattr(self.conf, 'XML_TO_OM_VOTE', default_conf.XML_TO_OM_VOTE)
+        if vote.choice not in vote_map:
+            self.logger.warning("unknown vote type %s in %s. Skipping." % (vote.choice, vote))
+            return None
+        vote_type = vote_map[vote.choice]
+        if vote_type is None:
+            return None
+
+        charge_id = self.get_charge_id(vote.componentID, db_ballot.sitting)
+        if charge_id is None:
+            return None
+        return ChargeVote(votation=db_ballot, charge_id=charge_id, vote=vote_type)
+
+    # people file index and charges already looked up, built once per run
+    _people_file_index = None
+    _charge_ids = None
+
+    def get_charge_id(self, component_id, db_sitting):
+        """
+        Returns the id of the charge held by the given component in the sitting's institution,
+        at the sitting's date, or None; each component is looked up once per sitting.
+        """
+        if self._people_file_index is None:
+            self._people_file_index = PeopleIndex.load(self.options['people_file'])
+        if self._charge_ids is None:
+            self._charge_ids = {}
+
+        # charges are looked up by date string (see ``TimeFramedQuerySet.current``)
+        moment = str(db_sitting.date)[0:10]
+        key = (component_id, db_sitting.institution_id, moment)
+        if key not in self._charge_ids:
+            charge = self.lookupCharge(self._people_file_index, component_id,
+                                       institution=db_sitting.institution, moment=moment)
+            self._charge_ids[key] = charge.pk if charge is not None else None
+        return self._charge_ids[key]
+
+    def _bulk_create(self, model, objects):
+        """
+        Inserts the given (unsaved) objects, in batches of ``bulk_batch_size`` rows.
+        """
+        for i in range(0, len(objects), self.bulk_batch_size):
+            model.objects.bulk_create(objects[i:i + self.bulk_batch_size])
+        self.n_written_rows += len(objects)
+        profiler.add_rows(model, len(objects))
+
+    def get_ballot_defaults(self, ballot):
+        """
+        Returns the fields values used when a ballot is created in the DB.
+        """
+        return {
+            'act_descr': ballot.subj or ballot.short_subj or "",
+            'n_legal': int(ballot.n_legal),
+            'n_presents': int(ballot.n_presents),
+            'n_partecipants': int(ballot.n_partecipants),
+            'n_maj': int(ballot.n_majority),
+            'n_yes': int(ballot.n_yes),
+            'n_no': int(ballot.n_no),
+            'n_abst': int(ballot.n_abst),
+            'outcome': int(ballot.outcome),
+        }
+
+    def write_ballots_bulk(self, db_sitting, ballots):
+        """
+        Creates all the ballots of a sitting not yet in the DB, with a single INSERT.
+
+        Returns a dict of the sitting's ballots in the DB, keyed by ``idnum``.
+        """
+        db_ballots = dict((b.idnum, b) for b in DBBallot.objects.filter(sitting=db_sitting))
+
+        new_ballots = []
+        for ballot in ballots:
+            idnum = str(int(ballot.seq_n))
+            if idnum not in db_ballots:
+                new_ballots.append(DBBallot(idnum=idnum, sitting=db_sitting, **self.get_ballot_defaults(ballot)))
+
+        if new_ballots:
+            self._bulk_create(DBBallot, new_ballots)
+            self.logger.debug("%d ballots created in DB" % len(new_ballots))
+            db_ballots = dict((b.idnum, b) for b in DBBallot.objects.filter(sitting=db_sitting))
+
+        return db_ballots
+
+    def write_votes_bulk(self, votes, db_ballot):
+        """
+        Writes all the votes of a ballot with batched statements.
 
-            for ballot in sitting.ballots:
-                self.logger.info("processing %s in Mdb" % ballot)
+        Votes already in the DB are left alone, if unchanged, or updated with one UPDATE
+        statement per vote value; the missing ones are inserted.
+        """
+        charge_votes = {}
+        for vote in votes:
+            cv = self.get_charge_vote(vote, db_ballot)
+            if cv is None:
+                continue
+            charge_votes[cv.charge_id] = cv.vote
+
+        existing_votes = dict(
+            (cv['charge_id'], (cv['id'], cv['vote']))
+            for cv in db_ballot.chargevote_set.values('id', 'charge_id', 'vote')
+        )
+
+        new_votes = []
+        changed_votes = {}
+        for charge_id, vote in charge_votes.items():
+            if charge_id not in existing_votes:
+                new_votes.append(ChargeVote(votation=db_ballot, charge_id=charge_id, vote=vote))
+            else:
+                cv_id, db_vote = existing_votes[charge_id]
+                if db_vote != vote:
+                    changed_votes.setdefault(vote, []).append(cv_id)
+
+        self._bulk_create(ChargeVote, new_votes)
+        for vote, cv_ids in changed_votes.items():
+            ChargeVote.objects.filter(pk__in=cv_ids).update(vote=vote, modified=datetime.now())
+            self.n_written_rows += len(cv_ids)
+            profiler.add_rows(ChargeVote, len(cv_ids))
 
-                if not self.dry_run:
+        self.logger.debug("%d votes created, %d updated in DB" %
+                          (len(new_votes), sum(len(ids) for ids in changed_votes.values())))
+
+    def get_ballot_hash(self, ballot):
+        """
+        Returns a hash of the ballot's content (attributes and votes),
+        used to tell whether it changed since the last import.
+        """
+        sha1 = hashlib.sha1(repr(sorted(self.get_ballot_defaults(ballot).items())))
+        for vote in sorted(ballot.votes, key=lambda v: (v.componentID, v.cardID)):
+            sha1.update(repr((vote.cardID, vote.componentID, vote.groupID, vote.choice)))
+        return sha1.hexdigest()
+
+    def get_sitting_hash(self, sitting, ballot_hashes):
+        """
+        Returns a hash of the sitting's content, given the hashes of its ballots.
+        """
+        sha1 = hashlib.sha1(repr((sitting._id, sitting.seq_n, sitting.date, sitting.call, sitting.site)))
+        for ballot_hash in ballot_hashes:
+            sha1.update(ballot_hash)
+        return sha1.hexdigest()
+
+    def write_sitting(self, sitting):
+        """
+        Writes a sitting, along with its ballots and votes, into the DB.
 
-                    # get or create the ballot in the DB
+        Sittings and ballots that did not change since their last import
+        (according to the import journal) are skipped.
+        """
+        with profiler.stage('hashing'):
+            ballot_hashes = [self.get_ballot_hash(ballot) for ballot in sitting.ballots]
+            sitting_hash = self.get_sitting_hash(sitting, ballot_hashes)
+        if self.sitting_journal.is_unchanged(str(sitting._id), sitting_hash):
+            self.logger.info("%s unchanged since last import. Skipping." % sitting)
+            return
+
+        self.logger.info("processing %s in Mdb" % sitting)
+        inst = Institution.objects.get(name=self.conf.XML_TO_OM_INST[sitting.site])
+
+        if not self.dry_run:
+            s, created = DBSitting.objects.get_or_create(
+                idnum=sitting._id,
+                defaults={
+                    'number':      sitting.seq_n,
+                    'date':        sitting.date,
+                    'call':        sitting.call,
+                    'institution': inst,
+                    }
+            )
+            if created:
+                self.logger.info("%s created in DB" % s)
+            else:
+                self.logger.debug("%s found in DB" % s)
+
+            if self.bulk:
+                db_ballots = self.write_ballots_bulk(s, sitting.ballots)
+
+            # links to acts, as act pks keyed by ballot pk
+            act_links = {}
+
+        for ballot, ballot_hash in zip(sitting.ballots, ballot_hashes):
+            ballot_key = "%s/%s" % (sitting._id, int(ballot.seq_n))
+            if self.ballot_journal.is_unchanged(ballot_key, ballot_hash):
+                self.logger.info("%s unchanged since last import. Skipping." % ballot)
+                continue
+
+            self.logger.info("processing %s in Mdb" % ballot)
+
+            if not self.dry_run:
+
+                # get or create the ballot in the DB
+                if self.bulk:
+                    b, created = db_ballots[str(int(ballot.seq_n))], False
+                else:
                     b, created = DBBallot.objects.get_or_create(
                         idnum=int(ballot.seq_n),
                         sitting=s,
-                        defaults={
-                            'act_descr': ballot.subj or ballot.short_subj or "",
-                            'n_legal': int(ballot.n_legal),
-                            'n_presents': int(ballot.n_presents),
-                            'n_partecipants': int(ballot.n_partecipants),
-                            'n_maj': int(ballot.n_majority),
-                            'n_yes': int(ballot.n_yes),
-                            'n_no': int(ballot.n_no),
-                            'n_abst': int(ballot.n_abst),
-                            'outcome': int(ballot.outcome),
-                        }
+                        defaults=self.get_ballot_defaults(ballot)
                     )
 
-                    # try to link to an act
-                    self.logger.debug("act_descr: %s" % b.act_descr.strip())
-                    m = re.match(r"(.+?)-(.+)", b.act_descr.strip())
-                    if m:
-                        act_idnum = str(m.group(1))
-                        self.logger.debug("act_idnum: %s" % act_idnum)
-                        linked_act = Act.objects.get(idnum=act_idnum)
-                        if isinstance(linked_act, Act):
-                            try:
-                                b.act = linked_act.downcast()
-                                b.save()
-                                self.logger.info("act was linked: %s" % b.act)
-                            except ObjectDoesNotExist:
-                                self.logger.info("act was not linked")
+                # try to link to an act (links are written at the end of the sitting)
+                with profiler.stage('act_link'):
+                    self.resolve_act_link(b, act_links)
 
 
-                    if created:
-                        self.logger.debug("%s created in DB" % b)
+                if created:
+                    self.logger.debug("%s created in DB" % b)
 
-                    else:
-                        self.logger.debug("%s found in DB" % b)
+                else:
+                    self.logger.debug("%s found in DB" % b)
 
 
-                if self.dry_run:
-                    continue
+            if self.dry_run:
+                continue
 
-                for vote in ballot.votes:
-                    self.logger.debug("processing %s in Mdb" % vote)
-                    self.write_vote(vote, db_ballot=b)
+            with profiler.stage('votes'):
+                if self.bulk:
+                    self.write_votes_bulk(ballot.votes, b)
+                else:
+                    for vote in ballot.votes:
+                        self.logger.debug("processing %s in Mdb" % vote)
+                        self.write_vote(vote, db_ballot=b)
 
 
-                # since absences are not explicitly set
-                # they must be computed
+            # since absences are not explicitly set
+            # they must be computed
+            with profiler.stage('absences'):
                 self.compute_absences(b)
 
 
-                # TODO:
-                # remove Votation and skip this votation if
-                # sums are not verified
-                #
-                # if not b.verify_sums():
-                #   b.delete()
-                #   continue
+            # TODO:
+            # remove Votation and skip this votation if
+            # sums are not verified
+            #
+            # if not b.verify_sums():
+            #   b.delete()
+            #   continue
+
+            # compute and cache group votes into GroupVote
+            with profiler.stage('group_votes'):
+                group_votes = self.compute_group_votes(b)
+
+            # compute rebels caches, only if the sitting is not a Committee (no rebellions in committees)
+            if b.sitting.institution.institution_type != Institution.COMMITTEE:
+                with profiler.stage('rebels'):
+                    self.update_rebel_caches(b, group_votes)
 
-                # compute and cache group votes into GroupVote
-                self.compute_group_votes(b)
+            # presence caches of all voting charges are recomputed at the end
+            self.counters.add_votation(b.pk, b.chargevote_set.values_list('charge_id', flat=True))
 
-                # compute rebels caches, only if the sitting is not a Committee (no rebellions in committees)
-                if b.sitting.institution.institution_type != Institution.COMMITTEE:
-                    self.update_rebel_caches(b)
+            self.logger.info("caches for this votation updated.\n")
 
-                b.update_presence_caches()
+            self.ballot_journal.record(ballot_key, ballot_hash, b)
 
-                self.logger.info("caches for this votation updated.\n")
+        if not self.dry_run:
+            if act_links:
+                with profiler.stage('act_link'):
+                    self.link_ballots(act_links)
+            self.sitting_journal.record(str(sitting._id), sitting_hash, s)
+
+    def write(self):
+        self.setup()
+
+        self.n_written_rows = 0
+        started_at = time.time()
+
+        # membership, acts and charges may have changed since the last run
+        self._membership = None
+        self._act_map = None
+        self._charge_ids = None
+
+        # ballots whose act descriptor could not be resolved, as (ballot, descriptor, reason) tuples
+        self.unresolved_acts = []
+
+        # charges and votations whose cached counters must be recomputed
+        self.counters = DirtyCounters()
+
+        # journals of the previous imports; the full option forces a complete re-import
+        full = self.options.get('full', False)
+        self.sitting_journal = ImportJournal(ImportedElement.ELEMENT_TYPE.sitting, force=full, dry_run=self.dry_run)
+        self.ballot_journal = ImportJournal(ImportedElement.ELEMENT_TYPE.ballot, force=full, dry_run=self.dry_run)
+
+        try:
+            for sitting in profiler.iterate('sitting', self.sittings, unit=unicode):
+                # each sitting is written in its own transaction
+                with transaction.commit_on_success():
+                    self.write_sitting(sitting)
+        except:
+            exc_info = sys.exc_info()
+            self.logger.error("import failed; updating cached counters of the sittings written so far")
+            self.update_counters()
+            raise exc_info[0], exc_info[1], exc_info[2]
+        self.update_counters()
+
+        if self.unresolved_acts:
+            self.logger.warning("%d ballots could not be linked to acts:" % len(self.unresolved_acts))
+            for ballot, act_descr, reason in self.unresolved_acts:
+                self.logger.warning("  %s: %s (%s)" % (ballot, act_descr, reason))
+
+        if self.bulk:
+            elapsed = time.time() - started_at
+            self.logger.info("%d rows written in %.2fs (%.1f rows/sec)" %
+                             (self.n_written_rows, elapsed, self.n_written_rows / elapsed if elapsed else 0))
+
+
+    def update_counters(self):
+        """
+        Recomputes the cached counters made dirty by this run, or passes them
+        to the caller, if ``deferred_counters`` is set.
+        """
+        if self.deferred_counters is not None:
+            # counters are recomputed by the caller (see ``ImportVotationsCommand``)
+            self.deferred_counters.update(self.counters)
+        else:
+            recompute_counters(self.counters)
 
 
 class XMLVotationWriter(BaseVotationWriter, XMLWriter):
@@ -1,12 +1,11 @@
 from django.db import models
-from django.db.models.query import EmptyQuerySet
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch.dispatcher import receiver
 from django.utils.translation import ugettext_lazy as _
 
 from django.contrib.auth.models import User
-from open_municipio.acts.models import Act
 from open_municipio.monitoring.models import MonitorizedItem
+from open_municipio.newscache.models import News
 
 from open_municipio.om_utils.models import SlugModel
 
@@ -50,15 +49,7 @@ class Location(SlugModel, MonitorizedItem):
         News related to a location are the union of the news related to all the acts
         tagged with this location
         """
-        news = EmptyQuerySet()
-
-        tagged_acts = Act.objects.filter(
-            id__in=set([ta['act_id'] for ta in self.tagged_acts.values('act_id')])
-        )
-
-        for a in tagged_acts:
-            news |= a.downcast().related_news
-        return news
+        return News.objects.for_acts(self.tagged_acts.values('act'))
 
 
     @models.permalink
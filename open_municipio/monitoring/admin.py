@@ -6,4 +6,10 @@ class MonitoringAdmin(admin.ModelAdmin):
     pass
 
 
+class MonitoringCounterAdmin(admin.ModelAdmin):
+    list_display = ('content_type', 'object_pk', 'n_total', 'n_citizens', 'n_politicians')
+    list_filter = ('content_type',)
+
+
 admin.site.register(Monitoring, MonitoringAdmin)
+admin.site.register(MonitoringCounter, MonitoringCounterAdmin)
@@ -0,0 +1,100 @@
+"""
+Leaderboards of the most monitored objects.
+
+Rankings are read from the monitoring counters (see ``MonitoringCounter``),
+monitored objects are loaded with one query per content type, and results
+are cached, until monitorings change.
+
+Cached leaderboards are keyed by a version number, incremented when monitorings change.
+The version outlives the leaderboards, and if it is lost anyway (i.e. evicted), it restarts
+from a random number, so that leaderboards cached under older versions are not read again.
+
+Usage::
+
+    for el in top_monitored_objects((Tag, Category, Location), limit=5):
+        el['object'], el['n_monitoring']
+"""
+import random
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Count
+
+from open_municipio.monitoring.models import Monitoring, MonitoringCounter
+
+
+CACHE_TIMEOUT = 60 * 60
+VERSION_KEY = 'monitoring-leaderboard-version'
+# the longest timeout memcached accepts as relative (longer ones are taken as timestamps)
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, random.randint(1, 2 ** 30), VERSION_TIMEOUT)
+        # another process may have added it first
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_leaderboards():
+    """
+    Invalidates all the cached leaderboards (called when monitorings change).
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # the version is not in the cache: no leaderboard is, either
+        pass
+
+
+def top_monitored_objects(models, limit=10, user=None):
+    """
+    Given a list of models, returns a list of monitored objects, annotated with the number of monitoring users
+    The list is sorted by the number of monitoring users, descending order.
+
+    If a user is given, only the objects monitored by that user are considered (and results are not cached).
+    """
+    cts = ContentType.objects.get_for_models(*models).values()
+
+    if user is not None:
+        rows = Monitoring.objects.filter(content_type__in=cts, user=user).\
+            values('content_type', 'object_pk').\
+            annotate(n_monitoring=Count('object_pk')).\
+            order_by('-n_monitoring')[:limit]
+        return resolve_objects([(el['content_type'], el['object_pk'], el['n_monitoring']) for el in rows])
+
+    key = 'monitoring-leaderboard:%s:%s:%s' % (
+        get_version(), ','.join(str(ct_id) for ct_id in sorted(ct.pk for ct in cts)), limit
+    )
+    monitored_objects = cache.get(key)
+    if monitored_objects is None:
+        rows = MonitoringCounter.objects.filter(content_type__in=cts, n_total__gt=0).\
+            order_by('-n_total', 'pk').\
+            values_list('content_type', 'object_pk', 'n_total')[:limit]
+        monitored_objects = resolve_objects(list(rows))
+        cache.set(key, monitored_objects, CACHE_TIMEOUT)
+    return monitored_objects
+
+
+def resolve_objects(rows):
+    """
+    Converts (content type id, object pk, n. of monitorings) rows into the leaderboard's entries,
+    fetching objects with one query per content type; objects not found are skipped.
+    """
+    pks_by_ct = {}
+    for ct_id, pk, n in rows:
+        pks_by_ct.setdefault(ct_id, []).append(pk)
+    objects = {}
+    for ct_id, pks in pks_by_ct.items():
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        if model is None:
+            continue
+        for pk, obj in model._default_manager.in_bulk(pks).items():
+            objects[(ct_id, pk)] = obj
+
+    return [
+        {'content_type': ContentType.objects.get_for_id(ct_id), 'object': objects[(ct_id, pk)], 'n_monitoring': n}
+        for ct_id, pk, n in rows if (ct_id, pk) in objects
+    ]
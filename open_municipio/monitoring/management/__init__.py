@@ -0,0 +1,16 @@
+from django.db.models.signals import post_syncdb
+
+from open_municipio.monitoring import models as monitoring_models
+
+
+def populate_monitoring_counters(sender, created_models, verbosity=1, **kwargs):
+    """
+    Builds the monitoring counters out of existing monitorings,
+    when their table is created.
+    """
+    if monitoring_models.MonitoringCounter in created_models:
+        n = monitoring_models.MonitoringCounter.rebuild()
+        if verbosity >= 1:
+            print "%s monitoring counters built" % n
+
+post_syncdb.connect(populate_monitoring_counters, sender=monitoring_models)
@@ -0,0 +1,30 @@
+import logging
+from django.core.management.base import NoArgsCommand
+
+from open_municipio.monitoring.models import MonitoringCounter
+
+class Command(NoArgsCommand):
+    """
+    Rebuilds the monitoring counters of all objects out of ``Monitoring`` records,
+    repairing any drift of the counters kept by the signal handlers.
+
+    Counts are computed with two aggregate queries, and counters are rewritten
+    with a bulk insert, within a single transaction.
+    """
+    help = "Rebuild the counters of users monitoring each object"
+
+    logger = logging.getLogger('import')
+
+    def handle_noargs(self, **options):
+
+        # fix logger level according to verbosity
+        verbosity = options['verbosity']
+        if verbosity == '0':
+            self.logger.setLevel(logging.ERROR)
+        elif verbosity == '1':
+            self.logger.setLevel(logging.INFO)
+        elif verbosity >= '2':
+            self.logger.setLevel(logging.DEBUG)
+
+        n = MonitoringCounter.rebuild()
+        self.logger.info("%s monitoring counters rebuilt" % n)
@@ -1,10 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count
 from django.core.urlresolvers import reverse 
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.template.context import Context
 from open_municipio.newscache.models import News
@@ -55,6 +56,88 @@ class Monitoring(models.Model):
         return reverse('om_monitoring_url_redirect', args=(), kwargs=(self.content_type.pk, self.object_pk))
 
 
+class MonitoringCounter(models.Model):
+    """
+    The number of users monitoring a content object, split into citizens and politicians
+    (users whose profile is bound to a person).
+
+    Counters are kept up to date by ``Monitoring``'s signal handlers, which recompute
+    the counters of the monitored object, and by ``UserProfile``'s ones, which recompute
+    the counters of the objects monitored by users linked to (or unlinked from) a person.
+    They are built from scratch when the table is created (see ``monitoring.management``),
+    or by the ``rebuild_monitoring_counters`` command.
+    """
+    content_type   = models.ForeignKey(ContentType,
+                                       related_name="content_type_set_for_%(class)s")
+    object_pk      = models.PositiveIntegerField()
+
+    n_total        = models.PositiveIntegerField(default=0)
+    n_citizens     = models.PositiveIntegerField(default=0)
+    n_politicians  = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('content_type', 'object_pk'),)
+
+    def __unicode__(self):
+        return u'%s/%s monitored by %s users' % (self.content_type_id, self.object_pk, self.n_total)
+
+    @classmethod
+    def recompute(cls, content_type_id, object_pk):
+        """
+        Recomputes the counters of an object out of its ``Monitoring`` records,
+        so that counters never drift (i.e. when a monitoring user becomes a politician).
+        """
+        monitorings = Monitoring.objects.filter(content_type=content_type_id, object_pk=object_pk)
+        n_total = monitorings.count()
+        n_politicians = monitorings.filter(user__userprofile__person__isnull=False).count()
+        values = {'n_total': n_total, 'n_citizens': n_total - n_politicians, 'n_politicians': n_politicians}
+
+        updated = cls.objects.filter(content_type=content_type_id, object_pk=object_pk).update(**values)
+        if not updated and n_total:
+            cls.objects.create(content_type_id=content_type_id, object_pk=object_pk, **values)
+
+        from open_municipio.monitoring.leaderboard import invalidate_leaderboards
+        invalidate_leaderboards()
+
+    @classmethod
+    def recompute_for_user(cls, user_id):
+        """
+        Recomputes the counters of all the objects monitored by a user
+        (i.e. when the user's profile is linked to, or unlinked from, a person).
+        """
+        objects = Monitoring.objects.filter(user=user_id).values_list('content_type', 'object_pk').distinct()
+        for content_type_id, object_pk in objects:
+            cls.recompute(content_type_id, object_pk)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Rebuilds the counters of all objects out of ``Monitoring`` records,
+        with two aggregate queries and a bulk insert, within a single transaction;
+        returns the number of counters.
+        """
+        counters = {}
+        for m in Monitoring.objects.values('content_type', 'object_pk').annotate(n=Count('id')).order_by():
+            counters[(m['content_type'], m['object_pk'])] = cls(
+                content_type_id=m['content_type'], object_pk=m['object_pk'],
+                n_total=m['n'], n_citizens=m['n']
+            )
+        politicians = Monitoring.objects.filter(user__userprofile__person__isnull=False).\
+            values('content_type', 'object_pk').annotate(n=Count('id')).order_by()
+        for m in politicians:
+            counter = counters[(m['content_type'], m['object_pk'])]
+            counter.n_politicians = m['n']
+            counter.n_citizens -= m['n']
+
+        with transaction.commit_on_success():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(counters.values())
+
+        from open_municipio.monitoring.leaderboard import invalidate_leaderboards
+        invalidate_leaderboards()
+        return len(counters)
+
+
 class MonitorizedItem():
 
 
@@ -89,9 +172,26 @@ class MonitorizedItem():
         # monitoring users, so building a list in memory may result in a waste of resources).
         return [m.user for m in self.monitorings()]
 
+    @property
+    def monitoring_counter(self):
+        """
+        Returns the (cached) ``MonitoringCounter`` of this object,
+        or an unsaved one with zero counts, if no one is monitoring it.
+        """
+        if not hasattr(self, '_monitoring_counter'):
+            try:
+                type = ContentType.objects.get_for_model(self.downcast())
+            except AttributeError:
+                type = ContentType.objects.get_for_model(self)
+            try:
+                self._monitoring_counter = MonitoringCounter.objects.get(content_type=type, object_pk=self.pk)
+            except MonitoringCounter.DoesNotExist:
+                self._monitoring_counter = MonitoringCounter(content_type=type, object_pk=self.pk)
+        return self._monitoring_counter
+
     @property
     def all_monitoring_count(self):
-        return self.monitorings().count()
+        return self.monitoring_counter.n_total
 
     @property
     def monitoring_users(self):
@@ -106,7 +206,7 @@ class MonitorizedItem():
 
     @property
     def monitoring_users_count(self):
-        return self.monitorings(user_type='simple').count()
+        return self.monitoring_counter.n_citizens
 
     @property
     def monitoring_politicians(self):
@@ -118,7 +218,7 @@ class MonitorizedItem():
 
     @property
     def monitoring_politicians_count(self):
-        return self.monitorings(user_type='politician').count()
+        return self.monitoring_counter.n_politicians
 
     @property
     def content_type_id(self):
@@ -142,6 +242,8 @@ def new_monitoring(**kwargs):
         generating_item = kwargs['instance']
         monitored_object = generating_item.content_object
         monitoring_user = generating_item.user.get_profile()
+
+        MonitoringCounter.recompute(generating_item.content_type_id, generating_item.object_pk)
         # define context for textual representation of the news
         ctx = Context({ 'monitored_object': monitored_object, 'monitoring_user': monitoring_user })
 
@@ -192,3 +294,12 @@ def remove_monitoring(**kwargs):
             related_content_type=ContentType.objects.get_for_model(monitoring_user),
             related_object_pk=monitoring_user.pk
         ).delete()
+
+
+@receiver(post_delete, sender=Monitoring)
+def update_monitoring_counter(**kwargs):
+    """
+    recomputes the counters of the monitored object, once the monitoring is removed
+    """
+    monitoring = kwargs['instance']
+    MonitoringCounter.recompute(monitoring.content_type_id, monitoring.object_pk)
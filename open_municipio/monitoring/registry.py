@@ -0,0 +1,50 @@
+"""
+A per-user, per-request registry of monitored objects.
+
+Template tags and views asking whether the current user is monitoring an object
+share the registry memoized on the user instance (that is, on ``request.user``),
+so that the user's monitorings are read once per request, as
+(content type id, object pk) pairs, and no monitored object is ever loaded.
+
+Usage::
+
+    if obj in get_monitoring_registry(request.user):
+        ...
+"""
+from django.contrib.contenttypes.models import ContentType
+
+from open_municipio.monitoring.models import Monitoring
+
+
+class MonitoringRegistry(object):
+    """
+    The set of objects monitored by a user, as (content type id, object pk) pairs.
+    """
+    def __init__(self, user):
+        self.pairs = set(Monitoring.objects.filter(user=user).values_list('content_type', 'object_pk'))
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __contains__(self, obj):
+        model = obj.__class__
+        if (ContentType.objects.get_for_model(model).pk, obj.pk) in self.pairs:
+            return True
+        # objects may be monitored as instances of a subclass (acts are monitored downcast)
+        for ct_id, pk in self.pairs:
+            if pk == obj.pk:
+                monitored_model = ContentType.objects.get_for_id(ct_id).model_class()
+                if monitored_model is not None and issubclass(monitored_model, model):
+                    return True
+        return False
+
+
+def get_monitoring_registry(user):
+    """
+    Returns the monitoring registry of the given (authenticated) user,
+    built on first access and memoized on the user instance.
+    """
+    registry = getattr(user, '_monitoring_registry', None)
+    if registry is None:
+        registry = user._monitoring_registry = MonitoringRegistry(user)
+    return registry
@@ -0,0 +1,88 @@
+from datetime import date
+
+from django.contrib.auth.models import User, Group
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.test import TestCase
+
+from open_municipio.monitoring.leaderboard import VERSION_KEY, top_monitored_objects
+from open_municipio.monitoring.models import Monitoring, MonitoringCounter
+from open_municipio.people.models import Person
+from open_municipio.users.models import UserProfile
+
+
+class MonitoringCounterTest(TestCase):
+    def setUp(self):
+        # users are added to (or removed from) this group when their profiles are saved
+        Group.objects.create(name='politicians')
+        self.person = self.create_person('Nome')
+        self.citizen = self.create_user('citizen')
+        self.politician = self.create_user('politician', person=self.create_person('Politico'))
+
+    def create_person(self, first_name):
+        return Person.objects.create(first_name=first_name, last_name='Cognome',
+                                     birth_date=date(1960, 1, 1), sex=Person.MALE_SEX)
+
+    def create_user(self, username, person=None):
+        user = User.objects.create_user(username, '%s@example.com' % username, 'secret')
+        UserProfile.objects.create(user=user, person=person)
+        return user
+
+    def monitor(self, user):
+        return Monitoring.objects.create(content_object=self.person, user=user)
+
+    def get_counts(self):
+        counter = MonitoringCounter.objects.get(content_type=ContentType.objects.get_for_model(Person),
+                                                object_pk=self.person.pk)
+        return counter.n_total, counter.n_citizens, counter.n_politicians
+
+    def test_add_remove(self):
+        """Counters follow monitorings being added and removed"""
+        citizen_monitoring = self.monitor(self.citizen)
+        self.assertEqual(self.get_counts(), (1, 1, 0))
+        politician_monitoring = self.monitor(self.politician)
+        self.assertEqual(self.get_counts(), (2, 1, 1))
+
+        citizen_monitoring.delete()
+        self.assertEqual(self.get_counts(), (1, 0, 1))
+        politician_monitoring.delete()
+        self.assertEqual(self.get_counts(), (0, 0, 0))
+
+    def test_user_becomes_politician(self):
+        """Counters follow monitoring users being linked to, or unlinked from, a person"""
+        monitoring = self.monitor(self.citizen)
+        profile = self.citizen.get_profile()
+        profile.person = self.create_person('Eletto')
+        profile.save()
+        self.assertEqual(self.get_counts(), (1, 0, 1))
+
+        # profiles are reloaded, as in a later request
+        profile = UserProfile.objects.get(user=self.citizen)
+        profile.person = None
+        profile.save()
+        self.assertEqual(self.get_counts(), (1, 1, 0))
+
+        monitoring.delete()
+        self.assertEqual(self.get_counts(), (0, 0, 0))
+
+    def test_rebuild(self):
+        """Counters are rebuilt out of the monitorings"""
+        self.monitor(self.citizen)
+        self.monitor(self.politician)
+        MonitoringCounter.objects.all().delete()
+
+        self.assertEqual(MonitoringCounter.rebuild(), 1)
+        self.assertEqual(self.get_counts(), (2, 1, 1))
+
+    def test_leaderboard(self):
+        """Leaderboards cached before monitorings change are not read again, even if the version is lost"""
+        cache.clear()
+        self.monitor(self.citizen)
+        self.assertEqual([(el['object'], el['n_monitoring']) for el in top_monitored_objects([Person])],
+                         [(self.person, 1)])
+
+        self.monitor(self.politician)
+        self.assertEqual(top_monitored_objects([Person])[0]['n_monitoring'], 2)
+
+        cache.delete(VERSION_KEY)
+        self.assertEqual(top_monitored_objects([Person])[0]['n_monitoring'], 2)
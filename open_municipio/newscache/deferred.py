@@ -0,0 +1,182 @@
+"""
+Deferred generation of news.
+
+News are usually generated one at a time, by signal handlers, as soon as
+their generating objects are saved. Within a ``deferred_news()`` block
+(i.e. during imports), ``generate_news`` queues them, instead; on exit,
+queued news are deduplicated, rendered with compiled templates,
+and inserted with bulk writes.
+
+Usage::
+
+    with deferred_news():
+        for xml_act in acts:
+            ...  # signal handlers call generate_news()
+"""
+from contextlib import contextmanager
+from datetime import datetime
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.template.context import Context
+from django.template.loader import get_template
+
+from open_municipio.newscache.models import News
+
+
+# the queue of the current thread, if within a ``deferred_news()`` block
+_state = threading.local()
+
+
+def get_news_queue():
+    return getattr(_state, 'queue', None)
+
+
+@contextmanager
+def deferred_news():
+    """
+    Queues the news generated within the block, and writes them on exit
+    (unless the block raised an exception).
+
+    Nested blocks share the outermost queue.
+    """
+    queue = get_news_queue()
+    if queue is not None:
+        yield queue
+        return
+
+    queue = _state.queue = NewsQueue()
+    try:
+        yield queue
+        queue.flush()
+    finally:
+        _state.queue = None
+
+
+def generate_news(generating_object, related_object, priority, template_file, context):
+    """
+    Generates a news (if not already there), rendering ``template_file`` with
+    ``context`` (a dict, to which ``current_site`` is added).
+
+    Within a ``deferred_news()`` block, the news is only queued, and (None, False) is returned;
+    otherwise, the news is looked up or created, and returned as ``get_or_create`` does.
+
+    The date of a news already there is refreshed, if the generating object's date
+    has changed (i.e. a transition date corrected by a later import).
+    """
+    queue = get_news_queue()
+    if queue is not None:
+        queue.add(generating_object, related_object, priority, template_file, context)
+        return None, False
+
+    ctx = Context(dict(context, current_site=Site.objects.get_current()))
+    news, created = News.objects.get_or_create(
+        generating_object_pk=generating_object.pk,
+        generating_content_type=ContentType.objects.get_for_model(generating_object),
+        related_object_pk=related_object.pk,
+        related_content_type=ContentType.objects.get_for_model(related_object),
+        priority=priority,
+        text=News.get_text_for_news(ctx, template_file),
+        defaults={'news_date': News.get_date_for_object(generating_object, datetime.now())}
+    )
+    if not created:
+        news_date = News.get_date_for_object(generating_object)
+        if news_date is not None and news_date != news.news_date:
+            news.news_date = news_date
+            news.save()
+    return news, created
+
+
+def discard_news(generating_object):
+    """
+    Drops the queued news generated by an object being deleted, if any.
+    """
+    queue = get_news_queue()
+    if queue is not None:
+        queue.discard(generating_object)
+
+
+class NewsQueue(object):
+    """
+    News waiting to be rendered and written, keyed by generating and related object,
+    so that an object generating the same news more than once
+    (i.e. saved many times during an import) results in a single news.
+    """
+    # max number of news inserted by a single statement
+    batch_size = 500
+
+    def __init__(self):
+        self.items = {}
+        self.templates = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, generating_object, related_object, priority, template_file, context):
+        generating_ct = ContentType.objects.get_for_model(generating_object)
+        related_ct = ContentType.objects.get_for_model(related_object)
+        key = (generating_ct.pk, generating_object.pk, related_ct.pk, related_object.pk)
+        news_date = News.get_date_for_object(generating_object)
+        self.items[key] = (priority, template_file, context, news_date)
+
+    def discard(self, generating_object):
+        generating_ct = ContentType.objects.get_for_model(generating_object)
+        for key in [k for k in self.items if k[0:2] == (generating_ct.pk, generating_object.pk)]:
+            del self.items[key]
+
+    def get_template(self, template_file):
+        if template_file not in self.templates:
+            self.templates[template_file] = get_template(template_file)
+        return self.templates[template_file]
+
+    def flush(self):
+        """
+        Renders the queued news and inserts those not already in the DB,
+        refreshing the dates of the others, if changed;
+        returns the number of inserted news.
+        """
+        if not self.items:
+            return 0
+
+        current_site = Site.objects.get_current()
+        now = datetime.now()
+        news = {}
+        # the generating objects' dates (None if the objects have no date)
+        dates = {}
+        for (generating_ct_id, generating_pk, related_ct_id, related_pk), (priority, template_file, context, news_date) in self.items.items():
+            text = News.get_text_for_news(Context(dict(context, current_site=current_site)),
+                                          self.get_template(template_file))
+            key = (generating_ct_id, generating_pk, related_ct_id, related_pk, priority, text)
+            dates[key] = news_date
+            news[key] = News(
+                generating_content_type_id=generating_ct_id, generating_object_pk=generating_pk,
+                related_content_type_id=related_ct_id, related_object_pk=related_pk,
+                priority=priority, text=text, created=now, modified=now, news_date=news_date or now
+            )
+        self.items = {}
+
+        # skip news already in the DB (one query per generating content type),
+        # collecting those whose generating object's date has changed
+        generating_pks = {}
+        for generating_ct_id, generating_pk, related_ct_id, related_pk, priority, text in news.keys():
+            generating_pks.setdefault(generating_ct_id, set()).add(generating_pk)
+        changed_dates = {}
+        for generating_ct_id, pks in generating_pks.items():
+            existing = News.objects.filter(
+                generating_content_type=generating_ct_id, generating_object_pk__in=pks
+            ).values_list('pk', 'news_date', 'generating_content_type', 'generating_object_pk',
+                          'related_content_type', 'related_object_pk', 'priority', 'text')
+            for row in existing:
+                key, news_date = row[2:], dates.get(row[2:])
+                if news.pop(key, None) is not None and news_date not in (None, row[1]):
+                    changed_dates.setdefault(news_date, []).append(row[0])
+
+        # one update per distinct date
+        for news_date, pks in changed_dates.items():
+            News.objects.filter(pk__in=pks).update(news_date=news_date)
+
+        new_news = news.values()
+        for i in range(0, len(new_news), self.batch_size):
+            News.objects.bulk_create(new_news[i:i + self.batch_size])
+        return len(new_news)
@@ -0,0 +1,70 @@
+import logging
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from open_municipio.newscache.models import News, as_datetime
+
+class Command(BaseCommand):
+    """
+    Computes the ``news_date`` column of all cached news, out of their generating objects' dates
+    (see ``docs/dev/upgrade.rst``, for the upgrade of existing databases).
+
+    News are processed by generating content type, and generating objects' dates
+    are read in batches, so that no generating object is loaded singularly.
+    News whose generating object has no date, or does not exist anymore,
+    are dated by their creation date.
+    """
+    help = "Compute the date of all news"
+
+    logger = logging.getLogger('import')
+
+    # max number of generating objects read by a single query
+    batch_size = 500
+
+    def handle(self, *args, **options):
+
+        # fix logger level according to verbosity
+        verbosity = options['verbosity']
+        if verbosity == '0':
+            self.logger.setLevel(logging.ERROR)
+        elif verbosity == '1':
+            self.logger.setLevel(logging.INFO)
+        elif verbosity >= '2':
+            self.logger.setLevel(logging.DEBUG)
+
+        news = News.objects.all()
+
+        ct_ids = news.values_list('generating_content_type', flat=True).distinct()
+        for ct in ContentType.objects.filter(pk__in=list(ct_ids)):
+            ct_news = news.filter(generating_content_type=ct)
+            model = ct.model_class()
+            date_field = model is not None and News.get_date_field(model)
+            if not date_field:
+                n = ct_news.update(news_date=F('created'))
+                self.logger.info("%s: %s news dated by creation date" % (ct, n))
+                continue
+
+            pks = list(ct_news.values_list('generating_object_pk', flat=True).distinct())
+            n = 0
+            for i in range(0, len(pks), self.batch_size):
+                batch = pks[i:i + self.batch_size]
+                # group generating objects by date, to update news with one query per date
+                pks_by_date = {}
+                for pk, value in model._default_manager.filter(pk__in=batch).values_list('pk', date_field):
+                    pks_by_date.setdefault(value, []).append(pk)
+                # generating objects deleted in the meantime
+                found_pks = set(pk for date_pks in pks_by_date.values() for pk in date_pks)
+                missing_pks = [pk for pk in batch if pk not in found_pks]
+                if missing_pks:
+                    pks_by_date.setdefault(None, []).extend(missing_pks)
+                for value, date_pks in pks_by_date.items():
+                    date_news = ct_news.filter(generating_object_pk__in=date_pks)
+                    news_date = as_datetime(value)
+                    if news_date is None:
+                        n += date_news.update(news_date=F('created'))
+                    else:
+                        n += date_news.update(news_date=news_date)
+            self.logger.info("%s: %s news dated" % (ct, n))
+
+        self.logger.info("done")
@@ -0,0 +1,194 @@
+from datetime import datetime
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+
+class NewsQuerySet(QuerySet):
+    """
+    A custom ``QuerySet`` building news feeds with single queries.
+
+    News are selected by their targets (related objects), either given explicitly
+    (``for_objects``) or through a symbolic audience (``for_audience``);
+    feeds are sorted by date (newest first) and can be paginated with
+    a keyset (``before``), so that deep pages cost as much as the first one.
+
+    Example::
+
+        news = News.objects.for_objects(person.institutioncharge_set.all()).feed()[0:15]
+        older = News.objects.for_audience('politicians_council').feed(before=news[14])[0:15]
+
+    Generating and related objects of the fetched news can be loaded in batch,
+    with ``with_objects``.
+    """
+    # symbolic audiences, accepted by ``for_audience``
+    AUDIENCES = ('politicians_all', 'politicians_council', 'politicians_gov')
+
+    # generic relations to be loaded in batch, when the QuerySet is evaluated
+    _prefetch_objects = ()
+
+    def _clone(self, *args, **kwargs):
+        kwargs.setdefault('_prefetch_objects', self._prefetch_objects)
+        return super(NewsQuerySet, self)._clone(*args, **kwargs)
+
+    def iterator(self):
+        if not self._prefetch_objects:
+            for news in super(NewsQuerySet, self).iterator():
+                yield news
+            return
+        news_list = list(super(NewsQuerySet, self).iterator())
+        prefetch_generic_objects(news_list, self._prefetch_objects)
+        for news in news_list:
+            yield news
+
+    def with_objects(self, *fields):
+        """
+        Return a QuerySet loading the given generic relations of the news
+        (``generating_object`` and ``related_object``, by default) with one query
+        per content type, instead of one query per news.
+        """
+        return self._clone(_prefetch_objects=fields or ('generating_object', 'related_object'))
+
+    def for_objects(self, targets):
+        """
+        Return news related to any of the given targets.
+
+        Targets can be given as model instances, as (content type, pk) pairs,
+        or as QuerySets (selected as sub-queries, so that they are not evaluated).
+        """
+        if isinstance(targets, QuerySet):
+            targets = [targets]
+
+        pks_by_ct = {}
+        conditions = []
+        for target in targets:
+            if isinstance(target, QuerySet):
+                ct = ContentType.objects.get_for_model(target.model)
+                conditions.append(Q(related_content_type=ct, related_object_pk__in=target.values('pk')))
+            else:
+                if isinstance(target, tuple):
+                    ct, pk = target
+                else:
+                    ct, pk = ContentType.objects.get_for_model(target), target.pk
+                pks_by_ct.setdefault(getattr(ct, 'pk', ct), set()).add(pk)
+        for ct_id, pks in pks_by_ct.items():
+            conditions.append(Q(related_content_type=ct_id, related_object_pk__in=pks))
+
+        if not conditions:
+            # not ``none()``, which would lose this QuerySet's methods
+            return self.filter(pk__in=[])
+        return self.filter(reduce(lambda a, b: a | b, conditions))
+
+    def for_acts(self, act_ids):
+        """
+        Return news related to the given acts (a list of ids, or a QuerySet of ids),
+        whatever their concrete type.
+
+        News target concrete acts (i.e. a ``Deliberation``), which share the parent act's pk,
+        so acts need not be downcast.
+        """
+        from open_municipio.acts.models import Act
+
+        act_models = [Act]
+        for model in act_models:
+            act_models.extend(model.__subclasses__())
+        cts = [ContentType.objects.get_for_model(model) for model in act_models]
+        return self.filter(related_content_type__in=cts, related_object_pk__in=act_ids)
+
+    def for_audience(self, audience, moment=None):
+        """
+        Return news related to the charges of a symbolic audience:
+
+        * ``politicians_all``: all institution charges, current and past
+        * ``politicians_council``: current charges of the city council
+        * ``politicians_gov``: current charges of the city government
+        """
+        from open_municipio.people.models import Institution, InstitutionCharge
+
+        if audience == 'politicians_all':
+            ct = ContentType.objects.get_for_model(InstitutionCharge)
+            return self.filter(related_content_type=ct)
+        elif audience == 'politicians_council':
+            institution_type = Institution.COUNCIL
+        elif audience == 'politicians_gov':
+            institution_type = Institution.CITY_GOVERNMENT
+        else:
+            raise ValueError("Unknown news audience: %s" % audience)
+        return self.for_objects(
+            InstitutionCharge.objects.current(moment).filter(institution__institution_type=institution_type)
+        )
+
+    def feed(self, before=None):
+        """
+        Return news, newest first; if ``before`` is given (a news, or the
+        cursor of a news), only news coming after it in the feed are returned.
+        """
+        news = self.order_by('-news_date', '-pk')
+        if before is not None:
+            news = news.before(before)
+        return news
+
+    def before(self, cursor):
+        """
+        Return news older than the given one, in feed order (by date, then by pk).
+
+        The cursor may be a news, a (news_date, pk) pair or a string as returned by ``News.feed_cursor``.
+        """
+        if isinstance(cursor, basestring):
+            cursor = parse_feed_cursor(cursor)
+        elif not isinstance(cursor, tuple):
+            cursor = (cursor.news_date, cursor.pk)
+        news_date, pk = cursor
+        return self.filter(Q(news_date__lt=news_date) | Q(news_date=news_date, pk__lt=pk))
+
+
+def prefetch_generic_objects(news_list, fields=('generating_object', 'related_object')):
+    """
+    Load the objects pointed by the given generic relations of a list of news,
+    grouping them by content type, so that each type's objects are fetched with one query.
+
+    Acts are downcast to their concrete type (``select_subclasses``); other objects
+    are fetched along with their related objects (``select_related``).
+    """
+    if not news_list:
+        return news_list
+    gfks = dict((f.name, f) for f in news_list[0]._meta.virtual_fields)
+    for field_name in fields:
+        gfk = gfks[field_name]
+        ct_attname = news_list[0]._meta.get_field(gfk.ct_field).get_attname()
+
+        pks_by_ct = {}
+        for news in news_list:
+            pks_by_ct.setdefault(getattr(news, ct_attname), set()).add(getattr(news, gfk.fk_field))
+
+        objects = {}
+        for ct_id, pks in pks_by_ct.items():
+            model = ContentType.objects.get_for_id(ct_id).model_class()
+            if model is None:
+                continue
+            queryset = model._default_manager.filter(pk__in=pks)
+            if hasattr(queryset, 'select_subclasses'):
+                queryset = queryset.select_subclasses()
+            else:
+                queryset = queryset.select_related()
+            for obj in queryset:
+                objects[(ct_id, obj.pk)] = obj
+
+        for news in news_list:
+            setattr(news, gfk.cache_attr, objects.get((getattr(news, ct_attname), getattr(news, gfk.fk_field))))
+    return news_list
+
+
+CURSOR_DATE_FORMAT = "%Y%m%d%H%M%S%f"
+
+def format_feed_cursor(news_date, pk):
+    return "%s-%s" % (news_date.strftime(CURSOR_DATE_FORMAT), pk)
+
+def parse_feed_cursor(cursor):
+    """
+    Return the (news_date, pk) pair encoded in a cursor string;
+    raises ValueError if the cursor is not valid.
+    """
+    news_date, pk = cursor.split('-', 1)
+    return datetime.strptime(news_date, CURSOR_DATE_FORMAT), int(pk)
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from datetime import date, datetime
+
 from django.db import models
 from django.template.loader import get_template
 from django.utils.translation import ugettext_lazy as _
@@ -6,11 +8,26 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 
 from model_utils import Choices
+from model_utils.managers import PassThroughManager
 from model_utils.models import TimeStampedModel
 
+from open_municipio.newscache.managers import NewsQuerySet, format_feed_cursor
+
 
 import re
 
+
+def as_datetime(value, default=None):
+    """
+    Converts a date into a datetime (at midnight); returns default if value is not a date
+    """
+    if isinstance(value, datetime):
+        return value
+    elif isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    else:
+        return default
+
 #
 # Newscache
 #
@@ -53,6 +70,11 @@ class News(TimeStampedModel):
 
     text                      = models.TextField(verbose_name=_('text'), max_length=512)
 
+    # the generating object's date (see ``get_date_for_object``), stored to sort news in the DB;
+    # the news' creation date, if the generating object has no date, or does not exist
+    news_date                 = models.DateTimeField(_('news date'), blank=True, db_index=True)
+
+    objects = PassThroughManager.for_queryset_class(NewsQuerySet)()
 
     class Meta:
         verbose_name = _('cached news')
@@ -67,22 +89,44 @@ class News(TimeStampedModel):
                    (self.text)
 
     @property
-    def news_date(self):
+    def feed_cursor(self):
         """
-        Return the generating object's date, according to type of object
-        The date is used in the news
+        The keyset of this news in a feed, as a string (see ``NewsQuerySet.before``)
+        """
+        return format_feed_cursor(self.news_date, self.pk)
+
+    def save(self, *args, **kwargs):
+        if self.news_date is None:
+            self.news_date = self.get_date_for_object(self.generating_object, self.created or datetime.now())
+        super(News, self).save(*args, **kwargs)
+
+    @classmethod
+    def get_date_field(cls, model):
+        """
+        Return the name of the field holding the date of news generated by
+        objects of the given model, according to type of object,
+        or None if news' creation date is used
         """
         from open_municipio.acts.models import Act, ActSupport, Transition
 
-        generator = self.generating_object
-        if isinstance(generator, Act):
-            return generator.presentation_date
-        elif isinstance(generator, ActSupport):
-            return generator.support_date
-        elif isinstance(generator, Transition):
-            return generator.transition_date
+        if issubclass(model, Act):
+            return 'presentation_date'
+        elif issubclass(model, ActSupport):
+            return 'support_date'
+        elif issubclass(model, Transition):
+            return 'transition_date'
         else:
-            return self.created
+            return None
+
+    @classmethod
+    def get_date_for_object(cls, generator, default=None):
+        """
+        Return the generating object's date, as a datetime (default, if the
+        object has no date)
+        The date is used in the news
+        """
+        date_field = generator is not None and cls.get_date_field(generator.__class__)
+        return as_datetime(getattr(generator, date_field) if date_field else None, default)
 
 
 
@@ -92,11 +136,14 @@ class News(TimeStampedModel):
         Generic class-method that dispatches text generation for the news
         to the proper template, given a context.
 
-        Renders a template file, using a context, and returns it.
+        Renders a template file (or an already compiled template), using a context, and returns it.
         
         Used by signal handlers to generate textual representation of the news.
         """
-        template = get_template(template_file)
+        if isinstance(template_file, basestring):
+            template = get_template(template_file)
+        else:
+            template = template_file
         return re.sub("\s+", " ", template.render(context).strip())
 
 
@@ -1,9 +1,7 @@
 from django import template
 
 from open_municipio.newscache.models import News
-from open_municipio.people.models import Person, InstitutionCharge, municipality
-
-from django.db.models.query import EmptyQuerySet
+from open_municipio.people.models import Person
 
 register = template.Library()
 
@@ -28,23 +26,14 @@ class NewsForObjectNode(template.Node):
 
         # extract all news
         # if obect is a Person, extract news related to all current and past charges
+        # strings are symbolic audiences (politicians_all, politicians_council, politicians_gov)
         if isinstance(object, Person):
-            news = EmptyQuerySet()
-            for c in object.all_institution_charges:
-                news |= c.related_news
+            news = News.objects.for_objects(object.institutioncharge_set.all())
         elif isinstance(object, basestring):
-            if object == 'politicians_all':
-                news = EmptyQuerySet()
-                for c in InstitutionCharge.objects.all():
-                    news |= c.related_news
-            if object == 'politicians_council':
-                news = EmptyQuerySet()
-                for c in municipality.council.charges:
-                    news |= c.related_news
-            if object == 'politicians_gov':
-                news = EmptyQuerySet()
-                for c in municipality.gov.charges:
-                    news |= c.related_news
+            try:
+                news = News.objects.for_audience(object)
+            except ValueError:
+                return ''
         else:
             news = object.related_news
 
@@ -53,7 +42,8 @@ class NewsForObjectNode(template.Node):
             news = news.filter(news_type=self.news_type)
 
         # sort news by news_date, descending order
-        context[self.context_var] = sorted(news, key=lambda n: n.news_date, reverse=True)[0:15]
+        # related objects are loaded in batch, as some news lists show them
+        context[self.context_var] = news.order_by('-news_date', '-pk').with_objects('related_object')[0:15]
 
         return ''
 
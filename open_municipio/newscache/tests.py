@@ -5,8 +5,16 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+from datetime import date, datetime
+
 from django.test import TestCase
 
+from open_municipio.acts.models import Deliberation, Transition
+from open_municipio.newscache.deferred import deferred_news, discard_news, generate_news, get_news_queue
+from open_municipio.newscache.managers import format_feed_cursor, parse_feed_cursor
+from open_municipio.newscache.models import News, as_datetime
+from open_municipio.people.models import Institution, Person
+
 
 class SimpleTest(TestCase):
     def test_basic_addition(self):
@@ -14,3 +22,83 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class NewsDateTest(TestCase):
+    def test_as_datetime(self):
+        """Dates are stored as datetimes at midnight, datetimes are kept as they are"""
+        self.assertEqual(as_datetime(date(2012, 3, 29)), datetime(2012, 3, 29))
+        self.assertEqual(as_datetime(datetime(2012, 3, 29, 11, 11)), datetime(2012, 3, 29, 11, 11))
+        self.assertEqual(as_datetime(None, datetime(2012, 1, 1)), datetime(2012, 1, 1))
+
+
+class FeedCursorTest(TestCase):
+    def test_round_trip(self):
+        """Cursors encode news dates (microseconds included) and pks"""
+        news_date = datetime(2012, 3, 29, 11, 11, 11, 250)
+        self.assertEqual(parse_feed_cursor(format_feed_cursor(news_date, 42)), (news_date, 42))
+        self.assertRaises(ValueError, parse_feed_cursor, 'not-a-cursor')
+
+
+class DeferredNewsTest(TestCase):
+    def setUp(self):
+        self.person = Person.objects.create(first_name='Nome', last_name='Cognome',
+                                            birth_date=date(1960, 1, 1), sex=Person.FEMALE_SEX)
+        self.institution = Institution.objects.create(name='Consiglio comunale', institution_type=Institution.COUNCIL)
+
+    def generate(self):
+        return generate_news(self.person, self.institution, 2, 'newscache/person_signed.html', {})
+
+    def test_flush(self):
+        """Queued news are written once, on exit, and news already in the DB are skipped"""
+        with deferred_news() as queue:
+            self.assertEqual(self.generate(), (None, False))
+            self.generate()
+            self.assertEqual(len(queue), 1)
+            self.assertEqual(News.objects.count(), 0)
+        self.assertEqual(News.objects.count(), 1)
+
+        with deferred_news():
+            self.generate()
+        self.assertEqual(News.objects.count(), 1)
+
+    def test_rollback(self):
+        """News queued by a failing block, or discarded, are not written"""
+        try:
+            with deferred_news():
+                self.generate()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(get_news_queue(), None)
+        self.assertEqual(News.objects.count(), 0)
+
+        with deferred_news():
+            self.generate()
+            discard_news(self.person)
+        self.assertEqual(News.objects.count(), 0)
+
+    def test_immediate(self):
+        """Outside of deferred blocks, news are written at once"""
+        news, created = self.generate()
+        self.assertTrue(created)
+        self.assertEqual(self.generate(), (news, False))
+        self.assertEqual(News.objects.get().related_object, self.institution)
+
+    def test_date_refresh(self):
+        """News already there get the corrected date of their generating object"""
+        act = Deliberation.objects.create(idnum='2012/MX/00001', title='testActs',
+                                          emitting_institution=self.institution)
+        transition = Transition.objects.create(act=act, final_status='PRESENTED', transition_date=date(2012, 3, 21))
+        news, created = generate_news(transition, act, 2, 'newscache/person_signed.html', {})
+        self.assertEqual(news.news_date, datetime(2012, 3, 21))
+
+        transition.transition_date = date(2012, 3, 22)
+        news, created = generate_news(transition, act, 2, 'newscache/person_signed.html', {})
+        self.assertFalse(created)
+        self.assertEqual(News.objects.get(pk=news.pk).news_date, datetime(2012, 3, 22))
+
+        transition.transition_date = date(2012, 3, 23)
+        with deferred_news():
+            generate_news(transition, act, 2, 'newscache/person_signed.html', {})
+        self.assertEqual(News.objects.get(pk=news.pk).news_date, datetime(2012, 3, 23))
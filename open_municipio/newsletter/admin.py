@@ -5,4 +5,10 @@ from open_municipio.newsletter.models import *
 class NewsletterAdmin(admin.ModelAdmin):
     readonly_fields = ['started', 'finished']
 
+class DeliveryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'newsletter', 'status', 'n_news', 'sent_at')
+    list_filter = ('status',)
+    raw_id_fields = ('user', 'newsletter')
+
 admin.site.register(Newsletter, NewsletterAdmin)
+admin.site.register(Delivery, DeliveryAdmin)
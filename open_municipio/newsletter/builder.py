@@ -0,0 +1,89 @@
+from django.contrib.contenttypes.models import ContentType
+
+from open_municipio.monitoring.models import Monitoring
+from open_municipio.newscache.models import News, NewsTargetMixin
+
+
+class NewsletterBuilder(object):
+    """
+    Builds the lists of news to be sent to the newsletter's recipients.
+
+    Monitorings of all recipients are read at once, and inverted into an index
+    mapping each monitored object (as a content type id, pk pair) to its monitoring users;
+    news are then fetched once per monitored object, or once per content type
+    for objects news are directly related to (i.e. acts), and fanned out to users in memory.
+
+    Usage::
+
+        builder = NewsletterBuilder(profiles, from_date=from_date)
+        for profile, monitored, news in builder.build():
+            ...
+    """
+    def __init__(self, profiles, from_date=None):
+        self.profiles = profiles
+        self.from_date = from_date
+        # (content type id, pk) of monitored objects => ids of monitoring users
+        self.monitored = {}
+        # (content type id, pk) of monitored objects => news
+        self.news = {}
+
+    def filter_news(self, news):
+        """
+        Newsletters contain institutional news of highest priority, only,
+        created after ``from_date`` (if given).
+        """
+        news = news.filter(news_type=News.NEWS_TYPE.institutional, priority__lte=2)
+        if self.from_date:
+            news = news.filter(created__gt=self.from_date)
+        return news
+
+    def index_monitorings(self, user_ids):
+        self.monitored = {}
+        monitorings = Monitoring.objects.filter(user__in=user_ids).\
+            values_list('user', 'content_type', 'object_pk')
+        for user_id, ct_id, pk in monitorings:
+            self.monitored.setdefault((ct_id, pk), set()).add(user_id)
+        return self.monitored
+
+    def fetch_news(self):
+        self.news = {}
+        pks_by_ct = {}
+        for ct_id, pk in self.monitored:
+            pks_by_ct.setdefault(ct_id, set()).add(pk)
+
+        for ct_id, pks in pks_by_ct.items():
+            model = ContentType.objects.get_for_id(ct_id).model_class()
+            if model is None or not hasattr(model, 'related_news'):
+                continue
+            if model.related_news is NewsTargetMixin.related_news:
+                # news are related to the monitored objects themselves
+                news = self.filter_news(News.objects.filter(related_content_type=ct_id, related_object_pk__in=pks))
+                for n in news:
+                    self.news.setdefault((ct_id, n.related_object_pk), []).append(n)
+            else:
+                # news are related to other objects (i.e. a person's charges, a topic's acts)
+                for obj in model._default_manager.filter(pk__in=pks):
+                    self.news[(ct_id, obj.pk)] = list(self.filter_news(obj.related_news))
+        return self.news
+
+    def build(self):
+        """
+        Yields, for each profile, the list of objects (as content type id, pk pairs)
+        monitored by the user and the list of news about them, newest first.
+        """
+        profiles = list(self.profiles)
+        self.index_monitorings([p.user_id for p in profiles])
+        self.fetch_news()
+
+        monitored_by_user = {}
+        for key, user_ids in self.monitored.items():
+            for user_id in user_ids:
+                monitored_by_user.setdefault(user_id, []).append(key)
+
+        for profile in profiles:
+            monitored = monitored_by_user.get(profile.user_id, [])
+            user_news = {}
+            for key in monitored:
+                for n in self.news.get(key, ()):
+                    user_news[n.pk] = n
+            yield profile, monitored, sorted(user_news.values(), key=lambda n: (n.news_date, n.pk), reverse=True)
@@ -0,0 +1,122 @@
+import logging
+import time
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+from django.core.mail import get_connection
+from django.utils import translation
+
+from open_municipio.newsletter.models import Delivery
+
+
+class NewsletterSender(object):
+    """
+    Sends the mails of a newsletter, in batches, recording each recipient's
+    delivery state (see ``Delivery``).
+
+    Messages of a batch are rendered by a pool of worker threads, and
+    sent through a single connection to the mail server, kept open across batches.
+    An optional rate limit (in mails per second) throttles the delivery.
+
+    Delivery states are written once per batch, so that, if the process is killed,
+    at most one batch of mails is sent again on resume.
+
+    Usage::
+
+        sender = NewsletterSender(newsletter, render, batch_size=50, rate=5)
+        n_sent = sender.send((profile, news) for profile, news in ...)
+
+    where ``render(profile, news)`` returns the ``EmailMessage`` to be sent.
+    """
+    logger = logging.getLogger('import')
+
+    def __init__(self, newsletter, render, batch_size=50, workers=4, rate=None, backend=None, language='it'):
+        self.newsletter = newsletter
+        self.render = render
+        self.batch_size = batch_size
+        self.workers = workers
+        self.rate = rate
+        self.backend = backend
+        self.language = language
+        self.connection = None
+        # earliest time the next mail may be sent at, according to the rate limit
+        self.next_send_at = 0
+
+    def _render(self, job):
+        profile, news = job
+        return self.render(profile, news)
+
+    def open(self):
+        if self.connection is None:
+            self.connection = get_connection(self.backend)
+            self.connection.open()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+    def send(self, jobs):
+        """
+        Sends the mails for the given (profile, news) jobs; returns the number of mails sent.
+        """
+        n_sent = 0
+        # worker threads render templates in the newsletter's language
+        pool = ThreadPool(self.workers, initializer=translation.activate, initargs=(self.language,))
+        try:
+            batch = []
+            for job in jobs:
+                batch.append(job)
+                if len(batch) >= self.batch_size:
+                    n_sent += self.send_batch(batch, pool)
+                    batch = []
+            if batch:
+                n_sent += self.send_batch(batch, pool)
+        finally:
+            pool.close()
+            pool.join()
+            self.close()
+        return n_sent
+
+    def throttle(self):
+        if not self.rate:
+            return
+        now = time.time()
+        if self.next_send_at > now:
+            time.sleep(self.next_send_at - now)
+            now = self.next_send_at
+        self.next_send_at = now + 1.0 / self.rate
+
+    def send_batch(self, batch, pool):
+        users = dict((profile.user_id, news) for profile, news in batch)
+
+        # deliveries are recorded as pending, before sending
+        existing = set(self.newsletter.deliveries.filter(user__in=users.keys()).values_list('user', flat=True))
+        Delivery.objects.bulk_create([
+            Delivery(newsletter=self.newsletter, user_id=user_id, n_news=len(news))
+            for user_id, news in users.items() if user_id not in existing
+        ])
+
+        messages = pool.map(self._render, batch)
+
+        sent = []
+        for (profile, news), message in zip(batch, messages):
+            try:
+                self.throttle()
+                self.open()
+                self.connection.send_messages([message])
+            except Exception, e:
+                self.logger.error(u'mail to {0} not sent: {1}'.format(profile.user, e))
+                self.newsletter.deliveries.filter(user=profile.user_id).\
+                    update(status=Delivery.STATUS.failed, error=unicode(e))
+                # the connection may have been dropped
+                self.close()
+            else:
+                sent.append(profile.user_id)
+                self.logger.info(u'mail with {0} news sent to {1}'.format(len(news), profile.user))
+
+        self.newsletter.deliveries.filter(user__in=sent).\
+            update(status=Delivery.STATUS.sent, sent_at=datetime.now(), error='')
+        return len(sent)
@@ -1,9 +1,9 @@
 import logging
+import re
 from optparse import make_option
 from datetime import datetime
 from django.contrib.sites.models import Site
 from django.core.management.base import LabelCommand, BaseCommand, CommandError
-from django.db.models.query import EmptyQuerySet
 
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import get_template
@@ -11,8 +11,9 @@ from django.template import Context
 from django.conf import settings
 from django.utils import translation
 
-from open_municipio.newscache.models import News
-from open_municipio.newsletter.models import Newsletter
+from open_municipio.newsletter.builder import NewsletterBuilder
+from open_municipio.newsletter.delivery import NewsletterSender
+from open_municipio.newsletter.models import Newsletter, Delivery
 from open_municipio.users.models import UserProfile
 
 class Command(LabelCommand):
@@ -21,6 +22,15 @@ class Command(LabelCommand):
 
     The --dryrun option allows to preview which mails will be sent, without actually send them
 
+    News are fetched once per monitored object, and shared among all the users
+    monitoring it (see ``NewsletterBuilder``).
+
+    Mails are sent in batches, through a single connection, and the delivery state
+    of each recipient is recorded; the --resume option completes the last
+    interrupted newsletter, skipping users who already received it.
+    The --email-backend option allows to send mails through another backend
+    (i.e. django.core.mail.backends.console.EmailBackend, for testing).
+
     """
     help = "Fetch and send emails to subscribed users"
 
@@ -38,6 +48,30 @@ class Command(LabelCommand):
         make_option('--from-date',
                     dest='fromdate',
                     help='Fetches news from this date, overrides ordinary last newsletter date filtering'),
+        make_option('--resume',
+                    action='store_true',
+                    dest='resume',
+                    default=False,
+                    help='Resume the last interrupted newsletter, skipping users who already received it'),
+        make_option('--batch-size',
+                    dest='batch_size',
+                    type='int',
+                    default=50,
+                    help='Number of mails rendered and recorded together (default: 50)'),
+        make_option('--workers',
+                    dest='workers',
+                    type='int',
+                    default=4,
+                    help='Number of threads rendering mails (default: 4)'),
+        make_option('--rate',
+                    dest='rate',
+                    type='float',
+                    default=getattr(settings, 'NEWSLETTER_RATE_LIMIT', None),
+                    help='Max number of mails sent per second (default: no limit)'),
+        make_option('--email-backend',
+                    dest='email_backend',
+                    default=None,
+                    help='Email backend to use, overrides settings.EMAIL_BACKEND'),
     )
 
     args = '<user_email>'
@@ -68,20 +102,32 @@ class Command(LabelCommand):
             options['dryrun'] = True
             self.logger.setLevel(logging.DEBUG)
 
-        n_sent_mails = 0
-
-        nl = Newsletter()
-        if not options['dryrun']:
-            nl.save()
+        if options['resume']:
+            nls = Newsletter.objects.filter(finished__isnull=True).order_by('-started')
+            if not nls:
+                raise CommandError('There is no interrupted newsletter to resume')
+            nl = nls[0]
+            self.logger.info(u'resuming newsletter started at: {0}'.format(nl.started))
+        else:
+            nl = Newsletter()
+            if not options['dryrun']:
+                nl.save()
 
         if not labels:
             nlprofiles = UserProfile.objects.filter(wants_newsletter=True)
         else:
             nlprofiles = UserProfile.objects.filter(wants_newsletter=True, user__email__in=labels)
 
+        # skip users who already received the newsletter being resumed
+        if nl.pk:
+            nlprofiles = nlprofiles.exclude(
+                user__in=nl.deliveries.filter(status=Delivery.STATUS.sent).values('user')
+            )
 
-        # fetch last sent newsletter's timestamp
+        # fetch last sent newsletter's timestamp (the last one sent before, when resuming)
         nls = Newsletter.objects.filter(finished__isnull=False).order_by('-finished')
+        if nl.pk:
+            nls = nls.filter(started__lt=nl.started)
         if nls:
             from_date = nls[0].started
             # highjack fromdate options, if not already defined
@@ -91,8 +137,20 @@ class Command(LabelCommand):
         if options['fromdate']:
             self.logger.info('fetching news from: {0}'.format(options['fromdate']))
 
-        for profile in nlprofiles:
-            n_sent_mails += self.handle_label(profile, **options)
+        self.site_domain = Site.objects.get(pk=settings.SITE_ID)
+        builder = NewsletterBuilder(nlprofiles.select_related('user'), from_date=options['fromdate'])
+        jobs = (self.handle_label(profile, monitored=monitored, user_news=user_news, **options)
+                for profile, monitored, user_news in builder.build())
+        jobs = (job for job in jobs if job is not None)
+
+        if options['dryrun']:
+            n_sent_mails = len(list(jobs))
+        else:
+            sender = NewsletterSender(nl, self.render_message,
+                                      batch_size=options['batch_size'], workers=options['workers'],
+                                      rate=options['rate'], backend=options['email_backend'])
+            sender.send(jobs)
+            n_sent_mails = nl.deliveries.filter(status=Delivery.STATUS.sent).count()
 
         nl.n_mails = n_sent_mails
         nl.finished = datetime.now()
@@ -102,59 +160,44 @@ class Command(LabelCommand):
         translation.deactivate()
 
 
-    def handle_label(self, profile, **options):
+    def handle_label(self, profile, monitored=(), user_news=(), **options):
         """
-        fetch newsletter and send email to a single user
-        return the number of mail sent
+        prepare the email for a single user, with the news on the monitored objects
+        return a (profile, news) job for the sender, or None if there is nothing to send
         """
         self.logger.info('-------------')
         self.logger.info(u'user: {0}'.format(profile.user))
-        mos = profile.monitored_objects
-        if not mos:
+        if not monitored:
             self.logger.debug(u' not monitoring')
-            return 0
-        else:
-            self.logger.debug(u' monitoring these objects:')
-            # extract the news related to all objects that the user is monitoring
-            # filter: institutional news of highest priority, only
-            user_news = EmptyQuerySet()
-            for mo in mos:
-                related_news = mo.related_news.\
-                    filter(news_type=News.NEWS_TYPE.institutional).\
-                    filter(priority__lte=2)
-
-                # add date filter if required
-                if options['fromdate']:
-                    related_news = related_news.filter(created__gt=options['fromdate'])
-
-                # add objects related news to user news
-                user_news |= related_news
-
-                # log at debug level, for previewing
-                self.logger.debug(u' -{0}, with {1} news'.format(mo.__unicode__()[:60], related_news.count()))
-                for news in related_news:
-                    self.logger.debug(u'   *{0}'.format(news))
-
-            import re
-            site_domain = Site.objects.get(pk=settings.SITE_ID)
-
-            n_news = len(user_news)
-            if n_news:
-                if not options['dryrun']:
-                    d = Context({ 'profile': profile,
-                                  'city': settings.SITE_INFO['main_city'],
-                                  'user_news': [{'date': rn.news_date, 'text': re.sub('href=\"\/', 'href="http://{0}/'.format(site_domain), rn.text)} for rn in user_news]})
-
-                    subject, from_email, to = 'Monitoraggio Open Municipio', 'noreply@openmunicipio.it', profile.user.email
-                    text_content = self.plaintext_tpl.render(d)
-                    html_content = self.htmly_tpl.render(d)
-                    msg = EmailMultiAlternatives(subject, text_content, from_email, [to])
-                    msg.attach_alternative(html_content, "text/html")
-                    msg.send()
-                    self.logger.info(u'mail with {0} news sent'.format(n_news))
-                else:
-                    self.logger.info(u'mail with {0} news would be sent (dryrun)'.format(n_news))
-
-            else:
-                self.logger.info(u'no news to send')
-            return n_news > 0
+            return None
+
+        # log at debug level, for previewing
+        self.logger.debug(u' monitoring {0} objects'.format(len(monitored)))
+        for news in user_news:
+            self.logger.debug(u'   *{0}'.format(news))
+
+        if not user_news:
+            self.logger.info(u'no news to send')
+            return None
+
+        if options['dryrun']:
+            self.logger.info(u'mail with {0} news would be sent (dryrun)'.format(len(user_news)))
+        # the number of monitored objects is shown in the email
+        profile.n_monitored = len(monitored)
+        return profile, user_news
+
+    def render_message(self, profile, user_news):
+        """
+        render the email for a single user (called by the sender's worker threads)
+        """
+        d = Context({ 'profile': profile,
+                      'n_monitored': profile.n_monitored,
+                      'city': settings.SITE_INFO['main_city'],
+                      'user_news': [{'date': rn.news_date, 'text': re.sub('href=\"\/', 'href="http://{0}/'.format(self.site_domain), rn.text)} for rn in user_news]})
+
+        subject, from_email, to = 'Monitoraggio Open Municipio', 'noreply@openmunicipio.it', profile.user.email
+        text_content = self.plaintext_tpl.render(d)
+        html_content = self.htmly_tpl.render(d)
+        msg = EmailMultiAlternatives(subject, text_content, from_email, [to])
+        msg.attach_alternative(html_content, "text/html")
+        return msg
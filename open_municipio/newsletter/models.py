@@ -1,6 +1,10 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.utils.translation import ugettext_lazy as _
 from datetime import datetime
 
+from model_utils import Choices
+
 class Newsletter(models.Model):
     """
     A simple table, to keep track of the sent newsletter.
@@ -19,3 +23,32 @@ class Newsletter(models.Model):
 
     def __unicode__(self):
         return "inizio: {n.started}, fine: {n.finished}, n mail: {n.n_mails}".format(n=self)
+
+
+class Delivery(models.Model):
+    """
+    The delivery state of a newsletter, for a single recipient.
+
+    Records are created (as pending) before mails are sent, and updated
+    after each batch of mails, so that an interrupted newsletter
+    can be resumed, skipping users who already received it.
+    """
+    STATUS = Choices(
+        ('PENDING', 'pending', _('pending')),
+        ('SENT', 'sent', _('sent')),
+        ('FAILED', 'failed', _('failed')),
+    )
+
+    newsletter = models.ForeignKey(Newsletter, related_name='deliveries')
+    user = models.ForeignKey(User)
+    status = models.CharField(choices=STATUS, default=STATUS.pending, max_length=8, db_index=True)
+    n_news = models.IntegerField(default=0)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = (('newsletter', 'user'),)
+        verbose_name_plural = 'deliveries'
+
+    def __unicode__(self):
+        return u"{d.user}: {d.status}".format(d=self)
@@ -7,10 +7,10 @@ from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.core.management.base import LabelCommand, CommandError, BaseCommand
 from django.core.files import File
 
-from lxml import etree
 from os import path
 
 from open_municipio.om.management.commands.utils import netcat
+from open_municipio.data_import.utils import iterparse_elements, PeopleIndex
 from open_municipio.people.models import Person, municipality
 from open_municipio.acts.models import *
 
@@ -53,7 +53,7 @@ class Command(LabelCommand):
     help = "Import the act(s) of type act_type, contained in the specified XML document(s). Usese --people-file to lookup for charges."
     label = 'filename'
 
-    people_tree = None
+    people_index = None
 
     def lookupCharge(self, xml_chargexref, institution=None):
         """
@@ -61,16 +61,13 @@ class Command(LabelCommand):
         """
         try:
             file, charge_id = xml_chargexref.get(XLINK+"href").split("#")
-            people_charges = self.people_tree.xpath(
-                '//om:Person[@id="%s"]' % charge_id,
-                namespaces=NS
-            )
-            if len(people_charges):
-                om_id = people_charges[0].get('om_id')
+            person_entry = self.people_index.get(charge_id)
+            if person_entry is not None:
+                om_id = person_entry.om_id
                 if om_id is None:
                     self.stderr.write("Warning: charge with id %s has no om_id (past charge?). Skipping.\n" % charge_id)
                     return None
-                charge_type = people_charges[0].get('charge')
+                charge_type = person_entry.charge
                 if charge_type is None:
                     self.stderr.write("Warning: charge with id %s has no charge attribute. Skipping.\n" % charge_id)
                     return None
@@ -210,11 +207,8 @@ class Command(LabelCommand):
 
     def handle_deliberation(self, filename, **options):
 
-        tree = etree.parse(filename)
-
-        acts = tree.xpath("/om:CouncilDeliberation",namespaces=NS)
-        self.stdout.write("%d Deliberation to import\n" % len(acts))
-        for xml_act in acts:
+        self.stdout.write("importing Deliberation from %s\n" % filename)
+        for xml_act in iterparse_elements(filename, "CouncilDeliberation"):
 
             # get important attributes
             id = xml_act.get("id")
@@ -297,11 +291,8 @@ class Command(LabelCommand):
 
     def handle_interrogation(self, filename, **options):
 
-        tree = etree.parse(filename)
-
-        acts = tree.xpath("/om:Interrogation",namespaces=NS)
-        self.stdout.write("%d Interrogations to import\n" % len(acts))
-        for xml_act in acts:
+        self.stdout.write("importing Interrogations from %s\n" % filename)
+        for xml_act in iterparse_elements(filename, "Interrogation"):
 
             # get important attributes
             id = xml_act.get("id")
@@ -369,11 +360,8 @@ class Command(LabelCommand):
 
     def handle_motion(self, filename, **options):
 
-        tree = etree.parse(filename)
-
-        acts = tree.xpath("/om:Motion",namespaces=NS)
-        self.stdout.write("%d Motions to import\n" % len(acts))
-        for xml_act in acts:
+        self.stdout.write("importing Motions from %s\n" % filename)
+        for xml_act in iterparse_elements(filename, "Motion"):
 
             # get important attributes
             id = xml_act.get("id")
@@ -449,12 +437,12 @@ class Command(LabelCommand):
         if not labels:
             raise CommandError('Enter at least one %s.' % self.label)
 
-        # parse people xml file into an lxml.etree
+        # index people xml file (or read its cached index)
         people_file = options['people_file']
         if not path.isfile(people_file):
             raise IOError("File %s does not exist" % people_file)
 
-        self.people_tree = etree.parse(people_file)
+        self.people_index = PeopleIndex.load(people_file)
 
         # parse passed acts
         for label in labels:
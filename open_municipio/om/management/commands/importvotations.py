@@ -5,12 +5,12 @@ from optparse import make_option
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.core.management.base import LabelCommand, CommandError, BaseCommand
 
-from lxml import etree
 from os import path
 
 from open_municipio.people.models import Sitting, Institution, Person
 from open_municipio.votations.models import Votation, ChargeVote, InstitutionCharge
 from open_municipio import settings_import as settings
+from open_municipio.data_import.utils import iterparse_elements, PeopleIndex
 
 import logging
 
@@ -44,18 +44,15 @@ class Command(LabelCommand):
 
     logger = logging.getLogger('import')
 
-    people_tree = None
+    people_index = None
 
     def lookupCharge(self, om_id, **options):
         """
         look for the correct open municipio charge, or return None
         """
-        people_charges = self.people_tree.xpath(
-            '//om:Person[@om_id=%s]' % om_id,
-            namespaces={'om': "http://www.openmunicipio.it"}
-        )
+        people_charges = self.people_index.get_by_om_id(om_id)
         if len(people_charges) == 1:
-            id = people_charges[0].get('id')
+            id = people_charges[0].id
             if id is None:
                 if int(options['verbosity']) > 0:
                     self.logger.error(" charge with om_id %s has no id in people XML file. Skipping.\n" % om_id)
@@ -75,11 +72,8 @@ class Command(LabelCommand):
         if not path.isfile(filename):
             raise IOError("File %s does not exist" % filename)
 
-        tree = etree.parse(filename)
-
-        sittings = tree.xpath("/om:Sitting",namespaces=NS)
-        self.logger.debug("%d Sittings to import\n" % len(sittings))
-        for xml_sitting in sittings:
+        self.logger.debug("importing Sittings from %s\n" % filename)
+        for xml_sitting in iterparse_elements(filename, "Sitting"):
 
             # map the sitting site code into an Institution
             site = xml_sitting.get("site")
@@ -215,12 +209,12 @@ class Command(LabelCommand):
         if not labels:
             raise CommandError('Enter at least one %s.' % self.label)
 
-        # parse people xml file into an lxml.etree
+        # index people xml file (or read its cached index)
         people_file = options['people_file']
         if not path.isfile(people_file):
             raise IOError("File %s does not exist" % people_file)
 
-        self.people_tree = etree.parse(people_file)
+        self.people_index = PeopleIndex.load(people_file)
 
         # parse passed sittings
         for label in labels:
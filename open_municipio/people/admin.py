@@ -1,6 +1,7 @@
 from django.contrib import admin 
 from django.utils.translation import ugettext_lazy as _
 from open_municipio.people.models import *
+from open_municipio.people.statistics import UpdateStatisticsMixin
 from open_municipio.votations.admin import VotationsInline
 from sorl.thumbnail.admin import AdminImageMixin
 
@@ -16,7 +17,7 @@ class PersonResourceInline(admin.TabularInline):
     extra = 0
 
 
-class PersonAdminWithResources(AdminImageMixin, admin.ModelAdmin):
+class PersonAdminWithResources(UpdateStatisticsMixin, AdminImageMixin, admin.ModelAdmin):
     list_display = ('id', '__unicode__', 'has_current_charges', 'birth_date', 'birth_location' )
     list_display_links = ('__unicode__',)
     search_fields = ['^first_name', '^last_name']
@@ -136,7 +137,7 @@ class AdministrationChargeAdmin(ChargeAdmin):
     )
 
 
-class InstitutionChargeAdmin(ChargeAdmin):
+class InstitutionChargeAdmin(UpdateStatisticsMixin, ChargeAdmin):
     model = InstitutionCharge
     raw_id_fields = ('person', 'substitutes', 'substituted_by', 'original_charge')
     search_fields = ['^person__first_name', '^person__last_name']
@@ -175,7 +176,7 @@ class OfficeAdmin(BodyAdmin):
     inlines = [AdministrationChargeInline]
 
 
-class InstitutionAdmin(BodyAdmin):
+class InstitutionAdmin(UpdateStatisticsMixin, BodyAdmin):
 
     def get_urls(self):
         from django.conf.urls.defaults import patterns, url
@@ -0,0 +1,157 @@
+"""
+In-memory indexes over the timeframed records of the ``people`` app.
+
+They are meant to be built once (per import run, or per request) and then
+queried many times, replacing the per-object queries done through
+``TimeFramedQuerySet.current()``.
+"""
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+from open_municipio.people.models import Group, GroupCharge, Institution, InstitutionCharge
+
+
+def to_date(moment):
+    """
+    Converts a moment, expressed as a ``date``, a ``datetime``
+    or a string in the YYYY-MM-DD format, into a ``date``.
+
+    If moment is None, today's date is returned.
+    """
+    if moment is None:
+        return date.today()
+    if isinstance(moment, datetime):
+        return moment.date()
+    if isinstance(moment, date):
+        return moment
+    return datetime.strptime(moment[0:10], "%Y-%m-%d").date()
+
+
+class IntervalIndex(object):
+    """
+    Maps keys to the set of values that are valid for them at a given date.
+
+    Each value is added along with its validity interval (``start_date``, ``end_date``),
+    boundaries included, and an open interval when ``end_date`` is None,
+    just as ``TimeFramedQuerySet.current()`` does.
+
+    Once built, the timeline of every key is split into segments having
+    the same set of valid values, so that a lookup is a binary search over
+    the segments' starting dates.
+    """
+    def __init__(self):
+        self._intervals = {}
+        self._boundaries = {}
+        self._segments = {}
+
+    def add(self, key, start_date, end_date, value):
+        self._intervals.setdefault(key, []).append((start_date, end_date, value))
+
+    def build(self):
+        """
+        Computes the segments of all keys; must be called after all values have been added.
+        """
+        self._boundaries = {}
+        self._segments = {}
+        for key, intervals in self._intervals.items():
+            boundaries = set()
+            for start_date, end_date, value in intervals:
+                boundaries.add(start_date)
+                if end_date is not None:
+                    boundaries.add(end_date + timedelta(days=1))
+            boundaries = sorted(boundaries)
+            segments = []
+            for boundary in boundaries:
+                segments.append(frozenset(
+                    value for start_date, end_date, value in intervals
+                    if start_date <= boundary and (end_date is None or end_date >= boundary)
+                ))
+            self._boundaries[key] = boundaries
+            self._segments[key] = segments
+        return self
+
+    def at(self, key, moment=None):
+        """
+        Returns the (frozen) set of values valid for ``key`` at the given moment.
+        """
+        boundaries = self._boundaries.get(key)
+        if not boundaries:
+            return frozenset()
+        i = bisect_right(boundaries, to_date(moment))
+        if i == 0:
+            return frozenset()
+        return self._segments[key][i - 1]
+
+
+class MembershipIndex(object):
+    """
+    An in-memory index answering the questions:
+
+    * which group was a charge in, at a given date
+    * which charges sat in an institution, at a given date
+
+    Committee charges are resolved to groups through their original (council) charge,
+    and the group is the one of the council charge held by the same person
+    at the given date, as ``Person.get_current_group()`` does.
+
+    Usage::
+
+        index = MembershipIndex().build()
+        group = index.get_group(charge_id, '2012-03-21')
+        charge_ids = index.get_charges(institution_id, sitting.date)
+    """
+    def __init__(self):
+        self.groups = IntervalIndex()
+        self.members = IntervalIndex()
+        self.council_charges = IntervalIndex()
+        self.charge_persons = {}
+        self.original_charges = {}
+        self.group_objects = {}
+
+    def build(self):
+        for ic in InstitutionCharge.objects.values('id', 'person_id', 'institution_id', 'original_charge_id',
+                                                   'institution__institution_type', 'start_date', 'end_date'):
+            self.members.add(ic['institution_id'], ic['start_date'], ic['end_date'], ic['id'])
+            self.charge_persons[ic['id']] = ic['person_id']
+            if ic['original_charge_id'] is not None:
+                self.original_charges[ic['id']] = ic['original_charge_id']
+            if ic['institution__institution_type'] == Institution.COUNCIL:
+                self.council_charges.add(ic['person_id'], ic['start_date'], ic['end_date'], ic['id'])
+
+        group_ids = set()
+        for gc in GroupCharge.objects.values('charge_id', 'group_id', 'start_date', 'end_date'):
+            self.groups.add(gc['charge_id'], gc['start_date'], gc['end_date'], gc['group_id'])
+            group_ids.add(gc['group_id'])
+        self.group_objects = Group.objects.in_bulk(group_ids)
+
+        self.groups.build()
+        self.members.build()
+        self.council_charges.build()
+        return self
+
+    def get_group_id(self, charge_id, moment=None):
+        """
+        Returns the id of the group the charge was in at the given moment,
+        or None if it cannot be univocally determined.
+        """
+        charge_id = self.original_charges.get(charge_id, charge_id)
+        person_id = self.charge_persons.get(charge_id)
+        council_charges = self.council_charges.at(person_id, moment)
+        if len(council_charges) != 1:
+            return None
+        group_ids = self.groups.at(list(council_charges)[0], moment)
+        if len(group_ids) != 1:
+            return None
+        return list(group_ids)[0]
+
+    def get_group(self, charge_id, moment=None):
+        """
+        Returns the ``Group`` the charge was in at the given moment, or None.
+        """
+        return self.group_objects.get(self.get_group_id(charge_id, moment))
+
+    def get_charges(self, institution_id, moment=None):
+        """
+        Returns the set of ids of the charges sitting in the institution at the given moment.
+        """
+        return self.members.at(institution_id, moment)
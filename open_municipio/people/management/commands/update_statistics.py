@@ -0,0 +1,29 @@
+import logging
+from django.core.management.base import NoArgsCommand
+
+from open_municipio.people.statistics import update_statistics
+
+class Command(NoArgsCommand):
+    """
+    Recomputes the statistics snapshots of all current council charges, and of the council.
+
+    Importers recompute them after each run; this command is meant for the first
+    setup, and to refresh age distributions, which change with time.
+    """
+    help = "Recompute the statistics of council charges and of the council"
+
+    logger = logging.getLogger('import')
+
+    def handle_noargs(self, **options):
+
+        # fix logger level according to verbosity
+        verbosity = options['verbosity']
+        if verbosity == '0':
+            self.logger.setLevel(logging.ERROR)
+        elif verbosity == '1':
+            self.logger.setLevel(logging.INFO)
+        elif verbosity >= '2':
+            self.logger.setLevel(logging.DEBUG)
+
+        stats = update_statistics()
+        self.logger.info("statistics of %s counselors updated" % stats.n_counselors)
@@ -1,9 +1,16 @@
+import threading
+import time
+
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.db import models
 from django.db.models import permalink
-from django.db.models.query import EmptyQuerySet
+from django.db.models.query import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.datetime_safe import date
+from django.utils.datastructures import SortedDict
+from django.utils import simplejson as json
 from django.utils.translation import ugettext_lazy as _
 from django.template.defaultfilters import slugify
 from django.core.urlresolvers import reverse
@@ -15,7 +22,7 @@ from model_utils.managers import PassThroughManager
 from sorl.thumbnail import ImageField
 
 from open_municipio.monitoring.models import MonitorizedItem
-from open_municipio.newscache.models import NewsTargetMixin
+from open_municipio.newscache.models import News, NewsTargetMixin
 from open_municipio.people.managers import TimeFramedQuerySet
 from open_municipio.om_utils.models import SlugModel
 
@@ -219,10 +226,7 @@ class Person(models.Model, MonitorizedItem):
         News related to a politician are the union of the news related to allthe politician's
         current and past institution charges
         """
-        news = EmptyQuerySet()
-        for c in self.all_institution_charges:
-            news |= c.related_news
-        return news
+        return News.objects.for_objects(self.institutioncharge_set.all())
 
 
 class Resource(models.Model):
@@ -1109,8 +1113,136 @@ class SittingItem(models.Model):
         return u'%s - %s' % (self.sitting, self)
 
 
+#
+# Statistics
+#
+class ChargeStatistics(models.Model):
+    """
+    A snapshot of the statistics of a council charge (presences, absences,
+    rebellions and presented acts), recomputed after imports
+    (see ``open_municipio.people.statistics``), so that views need not compute them.
+    """
+    charge = models.OneToOneField(InstitutionCharge, related_name='statistics')
+    n_votations = models.IntegerField(default=0)
+    percentage_present = models.FloatField(default=0.0)
+    percentage_absent = models.FloatField(default=0.0)
+    percentage_rebel = models.FloatField(default=0.0)
+    n_presented_acts = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('charge statistics')
+        verbose_name_plural = _('charges statistics')
+
+    def __unicode__(self):
+        return u'%s' % self.charge
+
+
+class CouncilStatistics(models.Model):
+    """
+    A snapshot of the statistics of the city council: average presences,
+    absences and rebellions of counselors, gender and age distributions
+    of the council and government members, number of acts by type.
+
+    Distributions are stored as JSON lists of (label, value) pairs.
+    """
+    institution = models.OneToOneField('Institution', related_name='statistics')
+    n_counselors = models.IntegerField(default=0)
+    percentage_present_average = models.FloatField(default=0.0)
+    percentage_absent_average = models.FloatField(default=0.0)
+    percentage_rebel_average = models.FloatField(default=0.0)
+    gender_distribution = models.TextField(default='[]')
+    age_distribution = models.TextField(default='[]')
+    acts_distribution = models.TextField(default='[]')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('council statistics')
+        verbose_name_plural = _('council statistics')
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.institution, self.updated_at)
+
+    @property
+    def gender_stats(self):
+        return SortedDict(json.loads(self.gender_distribution))
+
+    @property
+    def age_stats(self):
+        return SortedDict(json.loads(self.age_distribution))
+
+    @property
+    def num_acts(self):
+        return dict(json.loads(self.acts_distribution))
+
+
 ## Private DB access API
 
+class MunicipalityCache(object):
+    """
+    An in-process cache of the records served by the ``municipality`` facade
+    (institutions, current charges and responsabilities, groups, majority records),
+    which change a few times a year, but are read on every page.
+
+    Values are computed on first access, and dropped when any of the people
+    models is saved or deleted (in this process), when the day changes
+    (*current* records depend on it) or, at the latest, after
+    ``settings.MUNICIPALITY_CACHE_TIMEOUT`` seconds (changes made by other processes).
+
+    QuerySets are cached evaluated: iterating them does not hit the DB,
+    while further filtering or ordering them does, as usual.
+    Cached instances are shared by all threads, and must not be modified.
+    """
+    def __init__(self, timeout=None):
+        self.timeout = timeout if timeout is not None else getattr(settings, 'MUNICIPALITY_CACHE_TIMEOUT', 60 * 60)
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+            self._filled_at = time.time()
+            self._day = date.today()
+            # values computed before a clear are not stored
+            self._generation = getattr(self, '_generation', 0) + 1
+
+    def get(self, key, compute):
+        """
+        Returns the cached value for key, computing it (with ``compute()``) if needed.
+        """
+        with self._lock:
+            if self._day != date.today() or time.time() - self._filled_at > self.timeout:
+                self.clear()
+            if key in self._values:
+                return self._values[key]
+            generation = self._generation
+
+        # queries run outside the lock, so that readers of other values are not blocked
+        value = compute()
+        if isinstance(value, QuerySet):
+            len(value)
+
+        with self._lock:
+            if generation == self._generation:
+                self._values.setdefault(key, value)
+                return self._values[key]
+        return value
+
+
+municipality_cache = MunicipalityCache()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_municipality_cache(sender, **kwargs):
+    """
+    Drops the municipality cache, when any of the people models changes.
+    """
+    if sender in (Person, Institution, InstitutionCharge, InstitutionResponsability,
+                  Group, GroupCharge, GroupResponsability, GroupIsMajority):
+        municipality_cache.clear()
+
+
 class Mayor(object):
     """
     A municipality mayor (both as a charge and an institution).
@@ -1121,15 +1253,19 @@ class Mayor(object):
         """
         A municipality mayor, as an *institution*.
         """
-        return Institution.objects.select_related().get(institution_type=Institution.MAYOR)
-    
+        def compute():
+            return Institution.objects.select_related().get(institution_type=Institution.MAYOR)
+        return municipality_cache.get('Mayor.as_institution', compute)
+
     @property
     def as_charge(self):
         """
         A municipality mayor, as a *charge*.
         """
-        return InstitutionCharge.objects.select_related().get(institution__institution_type=Institution.MAYOR)
-    
+        def compute():
+            return InstitutionCharge.objects.select_related().get(institution__institution_type=Institution.MAYOR)
+        return municipality_cache.get('Mayor.as_charge', compute)
+
     @property
     def acts(self):
         """
@@ -1147,15 +1283,19 @@ class CityCouncil(object):
         """
         A municipality council, as an *institution*.
         """
-        return Institution.objects.get(institution_type=Institution.COUNCIL)
-    
+        def compute():
+            return Institution.objects.get(institution_type=Institution.COUNCIL)
+        return municipality_cache.get('CityCouncil.as_institution', compute)
+
     @property
     def charges(self):
         """
         All current members of the municipality council (aka *counselors*), as charges.
         President and vice-presidents **included**.
         """
-        return self.as_institution.charges.select_related()
+        def compute():
+            return self.as_institution.charges.select_related()
+        return municipality_cache.get('CityCouncil.charges', compute)
 
     @property
     def president(self):
@@ -1163,7 +1303,9 @@ class CityCouncil(object):
         The current president of the city council as InstitutionResponsability
         None if not found.
         """
-        return  self.as_institution.president
+        def compute():
+            return  self.as_institution.president
+        return municipality_cache.get('CityCouncil.president', compute)
 
 
     @property
@@ -1173,7 +1315,9 @@ class CityCouncil(object):
 
         There can be more than one vicepresident
         """
-        return self.as_institution.vicepresidents.select_related()
+        def compute():
+            return self.as_institution.vicepresidents.select_related()
+        return municipality_cache.get('CityCouncil.vicepresidents', compute)
 
     @property
     def members(self):
@@ -1181,7 +1325,9 @@ class CityCouncil(object):
         Members of the municipality council (aka *counselors*), as charges.
         Current president and vice presidents **excluded**.
         """
-        return self.as_institution.members.select_related()
+        def compute():
+            return self.as_institution.members.select_related()
+        return municipality_cache.get('CityCouncil.members', compute)
 
     @property
     def majority_members(self):
@@ -1210,23 +1356,29 @@ class CityCouncil(object):
         """
         Groups of counselors within of a municipality council.
         """
-        return Group.objects.select_related().all()
-    
+        def compute():
+            return Group.objects.select_related().all()
+        return municipality_cache.get('CityCouncil.groups', compute)
+
     @property
     def majority_groups(self):
         """
         Counselors' groups belonging to majority.
         """
-        qs = Group.objects.select_related().filter(groupismajority__end_date__isnull=True).filter(groupismajority__is_majority=True)
-        return qs
-    
+        def compute():
+            qs = Group.objects.select_related().filter(groupismajority__end_date__isnull=True).filter(groupismajority__is_majority=True)
+            return qs
+        return municipality_cache.get('CityCouncil.majority_groups', compute)
+
     @property
     def minority_groups(self):
         """
         Counselors' groups belonging to minority.
         """
-        qs = Group.objects.select_related().filter(groupismajority__end_date__isnull=True).filter(groupismajority__is_majority=False)
-        return qs
+        def compute():
+            qs = Group.objects.select_related().filter(groupismajority__end_date__isnull=True).filter(groupismajority__is_majority=False)
+            return qs
+        return municipality_cache.get('CityCouncil.minority_groups', compute)
 
     @property
     def acts(self):
@@ -1285,28 +1437,36 @@ class CityGovernment(object):
         """
         A municipality government, as an *institution*.
         """
-        return Institution.objects.get(institution_type=Institution.CITY_GOVERNMENT)
-    
+        def compute():
+            return Institution.objects.get(institution_type=Institution.CITY_GOVERNMENT)
+        return municipality_cache.get('CityGovernment.as_institution', compute)
+
     @property
     def charges(self):
         """
         Members of a municipality government (mayor and first deputy included), as charges.
         """
-        return self.as_institution.charges.select_related()
+        def compute():
+            return self.as_institution.charges.select_related()
+        return municipality_cache.get('CityGovernment.charges', compute)
 
     @property
     def firstdeputy(self):
         """
         Returns the first deputy mayor, if existing, None if not existing
         """
-        return  self.as_institution.firstdeputy
+        def compute():
+            return  self.as_institution.firstdeputy
+        return municipality_cache.get('CityGovernment.firstdeputy', compute)
 
     @property
     def members(self):
         """
         Members of a municipality government (mayor and first deputy excluded), as charges.
         """
-        return self.as_institution.members.select_related()
+        def compute():
+            return self.as_institution.members.select_related()
+        return municipality_cache.get('CityGovernment.members', compute)
 
     @property
     def acts(self):
@@ -0,0 +1,199 @@
+"""
+Computation of the statistics snapshots (``ChargeStatistics`` and ``CouncilStatistics``).
+
+Statistics are recomputed when the objects they are computed from change:
+
+* by the votations and acts importers, at the end of each run (for the charges they touched);
+* by the ``update_votation_caches`` command, after rebuilding votation counters;
+* by the ``update_statistics`` command;
+* after changes made through the admin to people, charges, institutions and acts
+  (see ``UpdateStatisticsMixin``), for the charges they concern.
+
+Other changes (i.e. votes edited in the admin, which do not update votation counters either)
+are reflected by the next run of ``update_votation_caches``.
+Views just read the snapshots, computing them only if no snapshot exists yet.
+
+Usage::
+
+    update_statistics(charge_ids)   # after an import
+    stats = get_council_statistics()
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.utils import simplejson as json
+
+from open_municipio.acts.models import (Act, Deliberation, Motion, Interrogation, Interpellation, Agenda,
+                                        ActSupport)
+from open_municipio.people.models import (Institution, InstitutionCharge, Person, ChargeStatistics,
+                                          CouncilStatistics, municipality)
+
+
+# upper bounds (included) of the age classes, with their labels
+AGE_CLASSES = (
+    (25, 'ventenni'),
+    (35, 'trentenni'),
+    (45, 'quarantenni'),
+    (55, 'cinquantenni'),
+    (65, 'sessantenni'),
+    (None, 'seniores'),
+)
+
+ACT_TYPES = (Deliberation, Motion, Interrogation, Interpellation, Agenda)
+
+
+def percentage(n, total):
+    return 100.0 * n / total if total else 0.0
+
+
+def update_charge_statistics(charge_ids=None):
+    """
+    Recomputes the statistics of the given charges (of the current council charges, if None).
+    """
+    if charge_ids is None:
+        charges = municipality.council.charges
+    else:
+        charges = InstitutionCharge.objects.filter(pk__in=list(charge_ids))
+    charges = list(charges.values('id', 'n_present_votations', 'n_absent_votations', 'n_rebel_votations'))
+    ids = [c['id'] for c in charges]
+
+    n_acts = dict(
+        ActSupport.objects.filter(charge__in=ids, support_type=ActSupport.SUPPORT_TYPE.first_signer).
+        values('charge').annotate(n=Count('act')).values_list('charge', 'n')
+    )
+    existing = set(ChargeStatistics.objects.filter(charge__in=ids).values_list('charge', flat=True))
+
+    new_stats = []
+    with transaction.commit_on_success():
+        for c in charges:
+            n_votations = c['n_present_votations'] + c['n_absent_votations']
+            values = {
+                'n_votations': n_votations,
+                'percentage_present': percentage(c['n_present_votations'], n_votations),
+                'percentage_absent': percentage(c['n_absent_votations'], n_votations),
+                'percentage_rebel': percentage(c['n_rebel_votations'], c['n_present_votations']),
+                'n_presented_acts': n_acts.get(c['id'], 0),
+            }
+            if c['id'] in existing:
+                ChargeStatistics.objects.filter(charge=c['id']).update(**values)
+            else:
+                new_stats.append(ChargeStatistics(charge_id=c['id'], **values))
+        ChargeStatistics.objects.bulk_create(new_stats)
+
+
+def update_council_statistics():
+    """
+    Recomputes the statistics of the city council, and returns them.
+    """
+    council = municipality.council.as_institution
+
+    # averages of the counselors' percentages
+    counselors = list(council.charges.values('n_present_votations', 'n_absent_votations', 'n_rebel_votations'))
+    n_counselors = len(counselors)
+    present = absent = rebel = 0.0
+    for c in counselors:
+        n_votations = c['n_present_votations'] + c['n_absent_votations']
+        present += percentage(c['n_present_votations'], n_votations)
+        absent += percentage(c['n_absent_votations'], n_votations)
+        rebel += percentage(c['n_rebel_votations'], c['n_present_votations'])
+
+    # gender and age distributions of council and government members, and of the mayor
+    gender_stats = [['Donne', 0], ['Uomini', 0]]
+    age_stats = [[label, 0] for max_age, label in AGE_CLASSES]
+    all_members = set(list(municipality.council.members) + list(municipality.gov.members) +
+                      [municipality.mayor.as_charge])
+    for charge in all_members:
+        person = charge.person
+        if person.sex == Person.FEMALE_SEX:
+            gender_stats[0][1] += 1
+        elif person.sex == Person.MALE_SEX:
+            gender_stats[1][1] += 1
+
+        if person.birth_date is None:
+            continue
+        age = person.age
+        for i, (max_age, label) in enumerate(AGE_CLASSES):
+            if max_age is None or age <= max_age:
+                age_stats[i][1] += 1
+                break
+
+    num_acts = [
+        [act_type.__name__.lower(),
+         act_type.objects.filter(emitting_institution__institution_type=Institution.COUNCIL).count()]
+        for act_type in ACT_TYPES
+    ]
+
+    stats, created = CouncilStatistics.objects.get_or_create(institution=council)
+    stats.n_counselors = n_counselors
+    stats.percentage_present_average = present / n_counselors if n_counselors else 0.0
+    stats.percentage_absent_average = absent / n_counselors if n_counselors else 0.0
+    stats.percentage_rebel_average = rebel / n_counselors if n_counselors else 0.0
+    stats.gender_distribution = json.dumps(gender_stats)
+    stats.age_distribution = json.dumps(age_stats)
+    stats.acts_distribution = json.dumps(num_acts)
+    stats.save()
+    return stats
+
+
+def update_statistics(charge_ids=None):
+    """
+    Recomputes the statistics of the given charges (of all current council charges, if None),
+    and of the council.
+    """
+    update_charge_statistics(charge_ids)
+    return update_council_statistics()
+
+
+def get_statistics_charge_ids(obj):
+    """
+    Returns the ids of the charges whose statistics depend on ``obj``
+    (a person, a charge, an institution or an act).
+    """
+    if isinstance(obj, InstitutionCharge):
+        return [obj.pk]
+    elif isinstance(obj, Person):
+        return list(InstitutionCharge.objects.filter(person=obj).values_list('pk', flat=True))
+    elif isinstance(obj, Institution):
+        return list(InstitutionCharge.objects.filter(institution=obj).values_list('pk', flat=True))
+    elif isinstance(obj, Act):
+        return list(ActSupport.objects.filter(act=obj).values_list('charge', flat=True))
+    return []
+
+
+class UpdateStatisticsMixin(object):
+    """
+    A ``ModelAdmin`` mixin recomputing the statistics snapshots after changes
+    made through the admin, for the charges concerned by the changed object
+    (before and after the change), and for the council.
+    """
+    def save_related(self, request, form, formsets, change):
+        charge_ids = set(get_statistics_charge_ids(form.instance))
+        super(UpdateStatisticsMixin, self).save_related(request, form, formsets, change)
+        charge_ids.update(get_statistics_charge_ids(form.instance))
+        update_statistics(charge_ids)
+
+    def delete_model(self, request, obj):
+        # related charges and signatures are looked up before they are deleted along with obj
+        charge_ids = get_statistics_charge_ids(obj)
+        super(UpdateStatisticsMixin, self).delete_model(request, obj)
+        update_statistics(charge_ids)
+
+
+def get_council_statistics():
+    """
+    Returns the statistics of the city council, computing them if there is no snapshot yet.
+    """
+    try:
+        return CouncilStatistics.objects.get(institution__institution_type=Institution.COUNCIL)
+    except CouncilStatistics.DoesNotExist:
+        return update_council_statistics()
+
+
+def get_charge_statistics(charge):
+    """
+    Returns the statistics of a charge, computing them if there is no snapshot yet.
+    """
+    try:
+        return ChargeStatistics.objects.get(charge=charge)
+    except ChargeStatistics.DoesNotExist:
+        update_charge_statistics([charge.pk])
+        return ChargeStatistics.objects.get(charge=charge)
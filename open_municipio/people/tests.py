@@ -5,8 +5,15 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+from datetime import date
+
 from django.test import TestCase
 
+from open_municipio.people.indexes import IntervalIndex
+from open_municipio.people.models import Institution, InstitutionCharge, Person, ChargeStatistics
+from open_municipio.people.statistics import (percentage, update_statistics, get_charge_statistics,
+                                              get_council_statistics, get_statistics_charge_ids)
+
 
 class SimpleTest(TestCase):
     def test_basic_addition(self):
@@ -14,3 +21,83 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class IntervalIndexTest(TestCase):
+    def test_lookup(self):
+        """Values are found only within their (closed) validity intervals"""
+        index = IntervalIndex()
+        index.add('council', date(2008, 5, 1), date(2010, 12, 31), 1)
+        index.add('council', date(2008, 5, 1), None, 2)
+        index.add('council', date(2011, 1, 1), None, 3)
+        index.build()
+
+        self.assertEqual(index.at('council', '2008-04-30'), frozenset())
+        self.assertEqual(index.at('council', '2008-05-01'), frozenset([1, 2]))
+        self.assertEqual(index.at('council', date(2010, 12, 31)), frozenset([1, 2]))
+        self.assertEqual(index.at('council', '2011-01-01'), frozenset([2, 3]))
+        self.assertEqual(index.at('committee', '2011-01-01'), frozenset())
+
+
+class StatisticsTest(TestCase):
+    def test_percentage(self):
+        """Percentages of empty totals are zero"""
+        self.assertEqual(percentage(1, 4), 25.0)
+        self.assertEqual(percentage(3, 0), 0.0)
+
+
+class StatisticsSnapshotTest(TestCase):
+    def setUp(self):
+        def create_charge(institution, first_name, sex, **counters):
+            person = Person.objects.create(first_name=first_name, last_name='Cognome',
+                                           birth_date=date(1960, 1, 1), sex=sex)
+            return InstitutionCharge.objects.create(person=person, institution=institution,
+                                                    start_date=date(2008, 1, 1), **counters)
+
+        council = Institution.objects.create(name='Consiglio comunale', institution_type=Institution.COUNCIL)
+        gov = Institution.objects.create(name='Giunta comunale', institution_type=Institution.CITY_GOVERNMENT)
+        mayor = Institution.objects.create(name='Sindaco', institution_type=Institution.MAYOR)
+        self.counselors = [
+            create_charge(council, 'Primo', Person.MALE_SEX,
+                          n_present_votations=8, n_absent_votations=2, n_rebel_votations=2),
+            create_charge(council, 'Seconda', Person.FEMALE_SEX,
+                          n_present_votations=5, n_absent_votations=5, n_rebel_votations=0),
+        ]
+        create_charge(gov, 'Terza', Person.FEMALE_SEX)
+        create_charge(mayor, 'Quarto', Person.MALE_SEX)
+
+    def test_update(self):
+        """Charge and council statistics are computed out of the charges' counters"""
+        stats = update_statistics([c.pk for c in self.counselors])
+
+        charge_stats = ChargeStatistics.objects.get(charge=self.counselors[0])
+        self.assertEqual((charge_stats.n_votations, charge_stats.percentage_present,
+                          charge_stats.percentage_absent, charge_stats.percentage_rebel), (10, 80.0, 20.0, 25.0))
+        self.assertEqual(stats.n_counselors, 2)
+        self.assertEqual((stats.percentage_present_average, stats.percentage_absent_average,
+                          stats.percentage_rebel_average), (65.0, 35.0, 12.5))
+        # council and government members, and the mayor
+        self.assertEqual(stats.gender_stats, {'Donne': 2, 'Uomini': 2})
+        self.assertEqual(sum(stats.age_stats.values()), 4)
+        self.assertEqual(stats.num_acts['deliberation'], 0)
+
+    def test_snapshots(self):
+        """Snapshots are computed when missing, and refreshed only by updates"""
+        charge = self.counselors[0]
+        self.assertEqual(get_charge_statistics(charge).percentage_present, 80.0)
+        self.assertEqual(get_council_statistics().percentage_present_average, 65.0)
+
+        InstitutionCharge.objects.filter(pk=charge.pk).update(n_present_votations=10, n_absent_votations=0)
+        self.assertEqual(get_charge_statistics(charge).percentage_present, 80.0)
+
+        update_statistics([charge.pk])
+        self.assertEqual(get_charge_statistics(charge).percentage_present, 100.0)
+        self.assertEqual(get_council_statistics().percentage_present_average, 75.0)
+
+    def test_charge_ids(self):
+        """Changes to charges, people and institutions concern their own charges only"""
+        charge = self.counselors[0]
+        self.assertEqual(get_statistics_charge_ids(charge), [charge.pk])
+        self.assertEqual(get_statistics_charge_ids(charge.person), [charge.pk])
+        self.assertEqual(sorted(get_statistics_charge_ids(charge.institution)),
+                         sorted(c.pk for c in self.counselors))
@@ -7,8 +7,10 @@ from django.core.exceptions import ObjectDoesNotExist
 
 from open_municipio.people.models import Institution, InstitutionCharge, Person, municipality, InstitutionResponsability, Group
 from open_municipio.monitoring.forms import MonitoringForm
+from open_municipio.monitoring.registry import get_monitoring_registry
 from open_municipio.acts.models import Act, Deliberation, Interrogation, Interpellation, Motion, Agenda, ActSupport
 from open_municipio.events.models import Event
+from open_municipio.people.statistics import get_council_statistics, get_charge_statistics
 
 from django.core import serializers
 
@@ -284,39 +286,24 @@ class PoliticianDetailView(DetailView):
         # Is politician a counselor? If so, we show present/absent
         # graph
         if context['is_counselor']:
-            # Calculate average present/absent for counselors
-            percentage_present = 0
-            percentage_absent = 0
-            n_counselors = len(municipality.council.charges)
-            for counselor in municipality.council.charges:
-                n_votations = counselor.n_present_votations \
-                    + counselor.n_absent_votations
-                if n_votations > 0:
-                    percentage_present += \
-                        float(counselor.n_present_votations) / n_votations
-                    percentage_absent += \
-                        float(counselor.n_absent_votations) / n_votations
-            # Empty city council? That can't be the case!
-            # n_counselors is supposed to be > 0
+            # average present/absent for counselors, from the council statistics snapshot
+            council_stats = get_council_statistics()
             context['percentage_present_votations_average'] = \
-                "%.1f" % (float(percentage_present) / n_counselors * 100)
+                "%.1f" % council_stats.percentage_present_average
             context['percentage_absent_votations_average'] = \
-                "%.1f" % (float(percentage_absent) / n_counselors * 100)
+                "%.1f" % council_stats.percentage_absent_average
 
-            # Calculate present/absent for current counselor
+            # present/absent for current counselor, from the charge statistics snapshot
             charge = context['current_counselor_charge']
             charge.percentage_present_votations = charge.percentage_absent_votations = 0.0
+            charge_stats = get_charge_statistics(charge)
 
-            if charge.n_present_votations + charge.n_absent_votations > 0:
-                context['n_total_votations'] = charge.n_present_votations + charge.n_absent_votations
-                context['percentage_present_votations'] = \
-                    "%.1f" % (float(charge.n_present_votations) /\
-                              context['n_total_votations'] * 100.00)
-                context['percentage_absent_votations'] = \
-                    "%.1f" % (float(charge.n_absent_votations) /\
-                              context['n_total_votations'] * 100.00)
+            if charge_stats.n_votations > 0:
+                context['n_total_votations'] = charge_stats.n_votations
+                context['percentage_present_votations'] = "%.1f" % charge_stats.percentage_present
+                context['percentage_absent_votations'] = "%.1f" % charge_stats.percentage_absent
 
-            context['percentage_rebel_votations'] = "%.1f" % (float(100 * charge.n_rebel_votations / charge.n_present_votations))
+            context['percentage_rebel_votations'] = "%.1f" % charge_stats.percentage_rebel
 
         # Current politician's charge votes for key votations
         # last 10 are passed to template
@@ -345,7 +332,7 @@ class PoliticianDetailView(DetailView):
                     'user_id': self.request.user.id
                 })
 
-                if context['person'] in self.request.user.get_profile().monitored_objects:
+                if context['person'] in get_monitoring_registry(self.request.user):
                     context['is_user_monitoring'] = True
         except ObjectDoesNotExist:
             context['is_user_monitoring'] = False
@@ -435,54 +422,13 @@ class PoliticianListView(TemplateView):
         ).filter(end_date__isnull=False).order_by('-end_date')[0:3]]
         """
 
-        # statistics
-        from django.utils.datastructures import SortedDict
-
-        context['gender_stats'] = SortedDict()
-        context['gender_stats']['Donne'] = 0
-        context['gender_stats']['Uomini'] = 0
-
-        context['age_stats'] = SortedDict()
-        context['age_stats']['ventenni'] = 0
-        context['age_stats']['trentenni'] = 0
-        context['age_stats']['quarantenni'] = 0
-        context['age_stats']['cinquantenni'] = 0
-        context['age_stats']['sessantenni'] = 0
-        context['age_stats']['seniores'] = 0
-
-        all_members = set(list(municipality.council.members) + list(municipality.gov.members) + [municipality.mayor.as_charge,])
-        for charge in all_members:
-            if charge.person.sex == Person.MALE_SEX:
-                context['gender_stats']['Uomini'] += 1
-            elif charge.person.sex == Person.FEMALE_SEX:
-                context['gender_stats']['Donne'] += 1
-
-            if charge.person.age <= 25:
-                context['age_stats']['ventenni'] += 1
-            if 25 < charge.person.age <= 35:
-                context['age_stats']['trentenni'] += 1
-            if 35 < charge.person.age <= 45:
-                context['age_stats']['quarantenni'] += 1
-            if 45 < charge.person.age <= 55:
-                context['age_stats']['cinquantenni'] += 1
-            if 55 < charge.person.age <= 65:
-                context['age_stats']['sessantenni'] += 1
-            if 65 < charge.person.age:
-                context['age_stats']['seniores'] += 1
-
-        context['gender_stats'] = context['gender_stats']
-        context['age_stats'] = context['age_stats']
+        # statistics, from the council statistics snapshot
+        council_stats = get_council_statistics()
+        context['gender_stats'] = council_stats.gender_stats
+        context['age_stats'] = council_stats.age_stats
 
         # number of different acts
-        num_acts = dict()
-        act_types = [
-            Deliberation, Motion, Interrogation, Interpellation, Agenda
-        ]
-        for act_type in act_types:
-            num_acts[act_type.__name__.lower()] = act_type.objects.filter(
-                emitting_institution__institution_type=Institution.COUNCIL
-            ).count()
-        context['num_acts'] = num_acts
+        context['num_acts'] = council_stats.num_acts
 
         return context
 
@@ -1,6 +1,5 @@
 from django.db import models
 from django.db.models import permalink
-from django.db.models.query import EmptyQuerySet
 from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch.dispatcher import receiver
 from django.utils.translation import ugettext_lazy as _, ugettext
@@ -9,10 +8,9 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes import generic
 
 from taggit.models import TagBase, ItemBase
-from open_municipio.acts.models import Act
 
 from open_municipio.monitoring.models import MonitorizedItem
-from open_municipio.newscache.models import NewsTargetMixin
+from open_municipio.newscache.models import News, NewsTargetMixin
 from open_municipio.om_utils.models import SlugModel
 from open_municipio.taxonomy.managers import post_tagging, post_untagging
 
@@ -41,15 +39,7 @@ class Tag(TagBase, MonitorizedItem):
         News related to a tag are the union of the news related to all the acts
         tagged with this tag
         """
-        news = EmptyQuerySet()
-
-        tagged_acts = Act.objects.filter(
-            id__in=set([ta['content_object_id'] for ta in self.tagged_acts.values('content_object_id')])
-        )
-
-        for a in tagged_acts:
-            news |= a.downcast().related_news
-        return news
+        return News.objects.for_acts(self.tagged_acts.values('content_object'))
 
 
 class Category(SlugModel, NewsTargetMixin, MonitorizedItem):
@@ -97,15 +87,8 @@ class Category(SlugModel, NewsTargetMixin, MonitorizedItem):
         News related to a category are the union of the news related to all the acts
         tagged with ther category and all the tags contained in the category
         """
-        news = EmptyQuerySet()
-
-        # fetch all acts tagget with the category
-        tagged_acts = Act.objects.filter(
-            id__in=set([ta['content_object_id'] for ta in self.tagged_acts.values('content_object_id')])
-        )
-        for a in tagged_acts:
-            news |= a.downcast().related_news
-        return news
+        # acts tagged with the category are selected through a sub-query
+        return News.objects.for_acts(self.tagged_acts.values('content_object'))
 
 
 class TaggedAct(ItemBase):
@@ -1,9 +1,7 @@
-from django.contrib.contenttypes.models import ContentType
-from django.db.models import Count
 from django.views.generic import DetailView, ListView
 from open_municipio.acts.models import Deliberation, Interpellation, Interrogation, Calendar, Motion, CGDeliberation
 from open_municipio.locations.models import Location
-from open_municipio.monitoring.models import Monitoring
+from open_municipio.monitoring.leaderboard import top_monitored_objects
 
 from open_municipio.taxonomy.models import Tag, Category, TaggedAct
 
@@ -24,26 +22,10 @@ class TopicListView(ListView):
         import random
         random.shuffle(context['tags_to_cloud'], lambda : 0.5)
 
-        # collect content type ids
-        type_id_list = []
-        if context['categories']:
-            type_id_list.append(context['categories'][0].content_type_id)
-        if context['tags']:
-            type_id_list.append(context['tags'][0].content_type_id)
-        if context['locations']:
-            type_id_list.append(context['locations'][0].content_type_id)
-
-        if type_id_list:
-            # create rank of monitorized items
-            context['top_monitorized_tags'] = [
-                ContentType.objects.get_for_id(m['content_type'])
-                    .get_object_for_this_type(pk=m['object_pk'])
-                for m in Monitoring.objects
-                    .filter(content_type__in=type_id_list)
-                    .values('object_pk', 'content_type')
-                    .annotate(n_monitoring=Count('object_pk'))
-                    .order_by('-n_monitoring')[:10]
-            ]
+        # create rank of monitorized items
+        context['top_monitorized_tags'] = [
+            m['object'] for m in top_monitored_objects((Category, Tag, Location), limit=10)
+        ]
         return context
     
     
@@ -5,7 +5,7 @@ from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.db.models import permalink
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save
 from django.dispatch.dispatcher import receiver
 from django.utils.translation import ugettext_lazy as _
 
@@ -13,7 +13,7 @@ from django.contrib.auth.models import User, Group
 
 from model_utils import Choices
 from open_municipio.locations.models import Location
-from open_municipio.monitoring.models import Monitoring
+from open_municipio.monitoring.models import Monitoring, MonitoringCounter
 from open_municipio.newscache.models import NewsTargetMixin
 from open_municipio.people.models import Person
 
@@ -131,3 +131,28 @@ def update_group(**kwargs):
         profile.user.groups.remove(politician_group)
     else:
         profile.user.groups.add(politician_group)
+
+
+@receiver(post_init, sender=UserProfile)
+def store_loaded_person(**kwargs):
+    """
+    keeps track of the person the profile was linked to, when loaded,
+    so that changes can be detected on save
+    """
+    profile = kwargs['instance']
+    profile._loaded_person_id = profile.person_id
+
+
+@receiver(post_save, sender=UserProfile)
+def update_monitoring_counters(**kwargs):
+    """
+    see if user has been linked/unlinked to a politician and
+    recompute the counters of the objects monitored by the user,
+    which split citizens from politicians
+    """
+    profile = kwargs['instance']
+    was_politician = profile._loaded_person_id is not None
+    profile._loaded_person_id = profile.person_id
+
+    if not kwargs.get('raw', False) and was_politician != (profile.person_id is not None):
+        MonitoringCounter.recompute_for_user(profile.user_id)
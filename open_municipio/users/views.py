@@ -7,6 +7,7 @@ from django.views.generic import DetailView
 from django.views.generic.list import ListView
 from open_municipio.acts.models import Deliberation, Motion, Interpellation, Amendment, Agenda, Interrogation
 from open_municipio.locations.models import Location
+from open_municipio.monitoring.leaderboard import top_monitored_objects
 from open_municipio.monitoring.models import Monitoring
 from open_municipio.people.models import Person, GroupCharge
 from open_municipio.taxonomy.models import Category, Tag
@@ -90,26 +91,10 @@ def extract_top_monitored_objects(*models, **kwargs):
     The list is sorted by the number of monitoring users, descending order.
 
     The last kwargs['qnt'] results are returned, with qnt set to 10 by default
-    """
 
-    query = dict(content_type__in=ContentType.objects.get_for_models(*models).values())
-    if kwargs.get('user'):
-        query['user'] = kwargs.get('user')
-
-    # what TOP means
-    limit = kwargs.get('qnt', 10)
-
-    monitored_objects = []
-    for el in Monitoring.objects.\
-            filter(**query).\
-            values('content_type', 'object_pk').distinct().\
-            annotate(n_monitoring=Count('object_pk')).\
-            order_by('-n_monitoring')[:limit]:
-        ct = ContentType.objects.get(pk=el['content_type'])
-        object = ct.get_object_for_this_type(pk=el['object_pk'])
-        monitored_objects.append({'content_type': ct, 'object': object, 'n_monitoring': el['n_monitoring']})
-
-    return monitored_objects
+    See ``open_municipio.monitoring.leaderboard.top_monitored_objects``.
+    """
+    return top_monitored_objects(models, limit=kwargs.get('qnt', 10), user=kwargs.get('user'))
 
 def calculate_top_monitorings(*models, **kwargs):
     if len(models):
@@ -0,0 +1,122 @@
+"""
+Maintenance of the cached counters computed out of ``ChargeVote`` records:
+
+* ``InstitutionCharge.n_rebel_votations``
+* ``InstitutionCharge.n_present_votations``
+* ``InstitutionCharge.n_absent_votations``
+* ``Votation.n_rebels``
+
+Counters are recomputed with aggregate UPDATE statements, either for a given set
+of charges and votations, or for the whole DB.
+"""
+from django.db import connection, transaction
+
+from open_municipio.people.models import InstitutionCharge
+from open_municipio.votations.models import Votation, ChargeVote
+
+
+# max number of ids passed to a single UPDATE statement
+UPDATE_BATCH_SIZE = 500
+
+
+def _execute_update(sql, params, ids=None):
+    """
+    Executes an UPDATE statement, restricted to the given ids (all rows, if ids is None).
+    """
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    if ids is None:
+        cursor.execute(sql, params)
+    else:
+        ids = list(ids)
+        for i in range(0, len(ids), UPDATE_BATCH_SIZE):
+            batch = ids[i:i + UPDATE_BATCH_SIZE]
+            cursor.execute(
+                "%s WHERE %s IN (%s)" % (sql, qn('id'), ", ".join(["%s"] * len(batch))),
+                list(params) + batch
+            )
+    transaction.commit_unless_managed()
+
+
+def update_charge_counters(charge_ids=None):
+    """
+    Recomputes rebellion and presence counters of the given charges (all charges, if None).
+    """
+    qn = connection.ops.quote_name
+    charge_table = qn(InstitutionCharge._meta.db_table)
+    count_sql = "(SELECT COUNT(*) FROM %(cv)s WHERE %(cv)s.%(charge_id)s = %(charge)s.%(id)s AND %%s)" % {
+        'cv': qn(ChargeVote._meta.db_table), 'charge_id': qn('charge_id'), 'charge': charge_table, 'id': qn('id'),
+    }
+    sql = "UPDATE %(charge)s SET %(rebel)s = %(rebel_count)s, %(present)s = %(present_count)s, %(absent)s = %(absent_count)s" % {
+        'charge': charge_table,
+        'rebel': qn('n_rebel_votations'),
+        'rebel_count': count_sql % ("%s = %%s" % qn('is_rebel')),
+        'present': qn('n_present_votations'),
+        'present_count': count_sql % ("%s <> %%s" % qn('vote')),
+        'absent': qn('n_absent_votations'),
+        'absent_count': count_sql % ("%s = %%s" % qn('vote')),
+    }
+    absent = ChargeVote.VOTES.absent
+    _execute_update(sql, [True, absent, absent], charge_ids)
+
+
+def update_votation_counters(votation_ids=None):
+    """
+    Recomputes the number of rebels of the given votations (all votations, if None).
+    """
+    qn = connection.ops.quote_name
+    votation_table = qn(Votation._meta.db_table)
+    cv_table = qn(ChargeVote._meta.db_table)
+    sql = "UPDATE %(votation)s SET %(rebels)s = " \
+          "(SELECT COUNT(*) FROM %(cv)s WHERE %(cv)s.%(votation_id)s = %(votation)s.%(id)s AND %(cv)s.%(is_rebel)s = %%s)" % {
+        'votation': votation_table, 'rebels': qn('n_rebels'), 'cv': cv_table,
+        'votation_id': qn('votation_id'), 'id': qn('id'), 'is_rebel': qn('is_rebel'),
+    }
+    _execute_update(sql, [True], votation_ids)
+
+
+class DirtyCounters(object):
+    """
+    Keeps track of the charges and votations whose cached counters went dirty
+    (i.e. during an import), so that they can be recomputed only once, at the end.
+
+    Usage::
+
+        counters = DirtyCounters()
+        ...
+        counters.add_votation(votation.pk, votation.chargevote_set.values_list('charge_id', flat=True))
+        ...
+        counters.recompute()
+    """
+    def __init__(self):
+        self.charge_ids = set()
+        self.votation_ids = set()
+
+    def add_charges(self, charge_ids):
+        self.charge_ids.update(charge_ids)
+
+    def add_votation(self, votation_id, charge_ids=()):
+        self.votation_ids.add(votation_id)
+        self.charge_ids.update(charge_ids)
+
+    def update(self, other):
+        """
+        Merges the dirty records of another ``DirtyCounters`` instance into this one.
+        """
+        self.charge_ids.update(other.charge_ids)
+        self.votation_ids.update(other.votation_ids)
+
+    @property
+    def is_dirty(self):
+        return bool(self.charge_ids or self.votation_ids)
+
+    def recompute(self):
+        """
+        Recomputes all dirty counters and resets the dirty sets.
+        """
+        if self.charge_ids:
+            update_charge_counters(self.charge_ids)
+        if self.votation_ids:
+            update_votation_counters(self.votation_ids)
+        self.charge_ids = set()
+        self.votation_ids = set()
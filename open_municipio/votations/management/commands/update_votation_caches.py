@@ -0,0 +1,55 @@
+import logging
+from optparse import make_option
+from django.core.management.base import BaseCommand
+
+from open_municipio.people.statistics import update_statistics
+from open_municipio.votations.caches import update_charge_counters, update_votation_counters
+
+class Command(BaseCommand):
+    """
+    Recomputes, for the whole DB, the counters cached out of charges' votes:
+    rebellions and presences of institution charges, and rebels of votations.
+
+    Each counter is rebuilt with a single aggregate UPDATE statement; statistics
+    snapshots of the council and of its charges are recomputed afterwards.
+    """
+    help = "Recompute rebellion and presence counters of all charges and votations"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--charges-only',
+                    action='store_true',
+                    dest='charges_only',
+                    default=False,
+                    help='Only recompute charges counters'),
+        make_option('--votations-only',
+                    action='store_true',
+                    dest='votations_only',
+                    default=False,
+                    help='Only recompute votations counters'),
+    )
+
+    logger = logging.getLogger('import')
+
+    def handle(self, *args, **options):
+
+        # fix logger level according to verbosity
+        verbosity = options['verbosity']
+        if verbosity == '0':
+            self.logger.setLevel(logging.ERROR)
+        elif verbosity == '1':
+            self.logger.setLevel(logging.INFO)
+        elif verbosity >= '2':
+            self.logger.setLevel(logging.DEBUG)
+
+        if not options['votations_only']:
+            self.logger.info("updating charges counters")
+            update_charge_counters()
+
+        if not options['charges_only']:
+            self.logger.info("updating votations counters")
+            update_votation_counters()
+
+        self.logger.info("updating statistics")
+        update_statistics()
+
+        self.logger.info("done")
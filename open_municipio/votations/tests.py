@@ -5,8 +5,14 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+from datetime import date
+
 from django.test import TestCase
 
+from open_municipio.people.models import Institution, InstitutionCharge, Person, Sitting
+from open_municipio.votations.caches import DirtyCounters, update_charge_counters, update_votation_counters
+from open_municipio.votations.models import Votation, ChargeVote
+
 
 class SimpleTest(TestCase):
     def test_basic_addition(self):
@@ -14,3 +20,46 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        council = Institution.objects.create(name='Consiglio comunale', institution_type=Institution.COUNCIL)
+        self.charges = []
+        for i in range(3):
+            person = Person.objects.create(first_name='Nome%d' % i, last_name='Cognome',
+                                           birth_date=date(1960, 1, 1), sex=Person.MALE_SEX)
+            self.charges.append(InstitutionCharge.objects.create(person=person, institution=council,
+                                                                 start_date=date(2008, 1, 1)))
+        sitting = Sitting.objects.create(date=date(2012, 3, 21), institution=council)
+        self.votation = Votation.objects.create(sitting=sitting, idnum='1')
+        for charge, vote, is_rebel in zip(self.charges,
+                                          (ChargeVote.VOTES.yes, ChargeVote.VOTES.no, ChargeVote.VOTES.absent),
+                                          (False, True, False)):
+            ChargeVote.objects.create(votation=self.votation, charge=charge, vote=vote, is_rebel=is_rebel)
+
+    def get_counters(self):
+        charges = InstitutionCharge.objects.in_bulk([c.pk for c in self.charges])
+        return [(charges[c.pk].n_present_votations, charges[c.pk].n_absent_votations, charges[c.pk].n_rebel_votations)
+                for c in self.charges]
+
+    def test_recompute(self):
+        """Only dirty counters are recomputed, out of the charge votes"""
+        counters = DirtyCounters()
+        counters.add_charges([self.charges[0].pk, self.charges[1].pk])
+        counters.recompute()
+        self.assertEqual(self.get_counters(), [(1, 0, 0), (1, 0, 1), (0, 0, 0)])
+        self.assertEqual(Votation.objects.get(pk=self.votation.pk).n_rebels, 0)
+
+        counters.add_votation(self.votation.pk, [self.charges[2].pk])
+        counters.recompute()
+        self.assertEqual(self.get_counters(), [(1, 0, 0), (1, 0, 1), (0, 1, 0)])
+        self.assertEqual(Votation.objects.get(pk=self.votation.pk).n_rebels, 1)
+        self.assertFalse(counters.is_dirty)
+
+    def test_recompute_all(self):
+        """Counters of all charges and votations are recomputed, when no ids are given"""
+        update_charge_counters()
+        update_votation_counters()
+        self.assertEqual(self.get_counters(), [(1, 0, 0), (1, 0, 1), (0, 1, 0)])
+        self.assertEqual(Votation.objects.get(pk=self.votation.pk).n_rebels, 1)